@@ -0,0 +1,42 @@
+"""
+Standalone benchmarks for the social media tool.
+
+Each module is runnable from the repository root, e.g.
+``python -m benchmarks.batch_create``. By default they run against an
+in-memory SQLite database; export ``DATABASE_URL`` to point them at a local
+Postgres instead.
+"""
+
+import logging
+import os
+
+BENCH_ENV = {
+    "SECRET_KEY": "benchmark-secret-key",
+    "DATABASE_URL": "sqlite://:memory:",
+    "SMTP_HOST": "localhost",
+    "SMTP_PORT": "25",
+    "SMTP_USERNAME": "",
+    "SMTP_PASSWORD": "",
+    "TWITTER_CLIENT_ID": "benchmark",
+    "TWITTER_CLIENT_SECRET": "benchmark",
+    "TWITTER_CONSUMER_API_KEY": "benchmark",
+    "TWITTER_CONSUMER_API_KEY_SECRET": "benchmark",
+    "TWITTER_REDIRECT_URI": "http://localhost/callback",
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+}
+
+
+def setup_django():
+    """Configure Django for benchmarking and create the schema."""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_media.settings")
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    # Per-post log lines would dominate the timings
+    logging.disable(logging.INFO)
+    call_command("migrate", run_syncdb=True, verbosity=0)
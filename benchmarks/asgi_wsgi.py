@@ -0,0 +1,167 @@
+"""
+Throughput of slow Twitter OAuth callbacks under WSGI and ASGI.
+
+Each request hits ``/api/users/social/twitter-callback``, whose token
+exchange goes to a local fake Twitter API answering after ``--latency``
+seconds. The WSGI run pushes requests through the synchronous views from
+``--wsgi-threads`` worker threads, like a threaded WSGI server; the ASGI run
+serves the async views from one event loop with up to ``--concurrency``
+requests in flight. Both run in-process through Django's test clients, each
+mode in its own subprocess with a fresh SQLite database.
+
+Usage: ``python -m benchmarks.asgi_wsgi [--requests N] [--latency S]``
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup_django
+from benchmarks.fake_twitter import FakeTwitterServer
+from benchmarks.suite import percentile
+
+CALLBACK = "/api/users/social/twitter-callback?oauth_token=request&oauth_verifier=ok"
+
+
+def prepare_sessions(count):
+    """Create a user and ``count`` sessions that are mid-way through the OAuth flow."""
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+
+    user = User.objects.create_user(username="bench", password="bench")
+    keys = []
+    for _ in range(count):
+        session = SessionStore()
+        session.update(
+            {"oauth_token": "request", "oauth_token_secret": "s", "user_id": user.id}
+        )
+        session.create()
+        keys.append(session.session_key)
+    return keys
+
+
+def run_wsgi(keys, threads):
+    from django.conf import settings
+    from django.test import Client
+
+    def callback(key):
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = key
+        start = time.perf_counter()
+        status = client.get(CALLBACK).status_code
+        return status, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(callback, keys))
+
+
+def run_asgi(keys, concurrency):
+    import asyncio
+
+    from django.conf import settings
+    from django.test import AsyncClient
+
+    async def callback(semaphore, key):
+        async with semaphore:
+            client = AsyncClient()
+            client.cookies[settings.SESSION_COOKIE_NAME] = key
+            start = time.perf_counter()
+            response = await client.get(CALLBACK)
+            return response.status_code, time.perf_counter() - start
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(callback(semaphore, key) for key in keys))
+
+    return asyncio.run(main())
+
+
+def child(args):
+    from django.test.utils import setup_test_environment
+
+    setup_django()
+    # Lets the test clients' ``testserver`` host through ALLOWED_HOSTS
+    setup_test_environment()
+    keys = prepare_sessions(args.requests)
+
+    start = time.perf_counter()
+    if args.mode == "wsgi":
+        results = run_wsgi(keys, args.wsgi_threads)
+    else:
+        results = run_asgi(keys, args.concurrency)
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for _, latency in results]
+    print(
+        json.dumps(
+            {
+                "mode": args.mode,
+                "requests": len(results),
+                "ok": sum(1 for status, _ in results if status == 200),
+                "requests_per_second": round(len(results) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Fake Twitter response delay (s)."
+    )
+    parser.add_argument("--wsgi-threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--mode", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return child(args)
+
+    server = FakeTwitterServer(
+        ("127.0.0.1", 0),
+        latency=args.latency,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=(10**9, 900),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'mode':6} {'ok':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for mode in ("wsgi", "asgi"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+                "TWITTER_API_BASE_URL": base_url,
+                "API_ASYNC_VIEWS": "true" if mode == "asgi" else "false",
+            }
+            output = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.asgi_wsgi", "--mode", mode]
+                + [f"--requests={args.requests}"]
+                + [f"--wsgi-threads={args.wsgi_threads}"]
+                + [f"--concurrency={args.concurrency}"],
+                env=env,
+                text=True,
+            )
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{mode:6} {result['ok']:6d} {result['requests_per_second']:9.1f} "
+            f"{result['p50_ms']:9.1f} {result['p95_ms']:9.1f}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
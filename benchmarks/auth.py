@@ -0,0 +1,66 @@
+"""
+Microbenchmark of JWT authentication per API request.
+
+Compares the original ``AuthBearer`` (a new ``JWTAuth`` per request, token
+verification and a user query every time) with the shared
+``CachedJWTAuth``, cold (every cache cleared before each call) and warm.
+
+Usage: ``python -m benchmarks.auth [--number N]``
+"""
+
+import argparse
+import timeit
+
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from ninja_jwt.authentication import JWTAuth
+    from ninja_jwt.tokens import RefreshToken
+    from social_media.auth import CachedJWTAuth
+
+    user = User.objects.create_user(username="bench", password="bench")
+    token = str(RefreshToken.for_user(user).access_token)
+    request = RequestFactory().get("/")
+    cached = CachedJWTAuth()
+
+    def original():
+        JWTAuth().authenticate(request, token)
+
+    def cold():
+        cached._claims.clear()
+        cache.clear()
+        cached.authenticate(request, token)
+
+    def warm():
+        cached.authenticate(request, token)
+
+    print(f"{'case':16} {'us/call':>10} {'queries':>8}")
+    for name, func in (
+        ("original", original),
+        ("cached, cold", cold),
+        ("cached, warm", warm),
+    ):
+        func()
+        # The query log is capped; start from empty so the capture is accurate
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            func()
+        queries = len(captured)
+        elapsed = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"{name:16} {elapsed / args.number * 1e6:10.2f} {queries:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare post creation throughput of ``create_post`` and the batch endpoint.
+
+Usage: ``python -m benchmarks.batch_create [--posts N] [--batch-size N]``
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from django.test import RequestFactory
+    from django.utils import timezone
+    from posts.api import create_post
+    from posts.batch import create_batch
+    from posts.schema import PostCreateSchema
+
+    user = User.objects.create_user(username="bench", password="bench")
+    scheduled_time = (timezone.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+    item = {
+        "content": "Benchmark post",
+        "scheduled_time": scheduled_time,
+        "timezone": "UTC",
+    }
+
+    request = RequestFactory().post("/api/posts/")
+    request.user = user
+    payload = PostCreateSchema(**item)
+    start = time.perf_counter()
+    for _ in range(args.posts):
+        create_post(request, image_file=None, payload=payload)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, args.posts, args.batch_size):
+        create_batch(user, [item] * min(args.batch_size, args.posts - offset))
+    batch = time.perf_counter() - start
+
+    print(f"posts:        {args.posts}")
+    print(f"single-post:  {args.posts / single:10.1f} rows/s ({single:.3f}s)")
+    print(
+        f"batch ({args.batch_size}): {args.posts / batch:10.1f} rows/s ({batch:.3f}s)"
+    )
+    print(f"speed-up:     {single / batch:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
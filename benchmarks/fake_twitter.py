@@ -0,0 +1,222 @@
+"""
+Local stand-in for the X/Twitter API, for end-to-end load tests.
+
+Implements the endpoints the project calls:
+
+- ``POST /2/tweets`` (create_tweet)
+- ``POST /1.1/media/upload.json`` (simple and chunked INIT/APPEND/FINALIZE)
+- ``POST /oauth/request_token`` and ``POST /oauth/access_token`` (OAuth 1.0a)
+
+Every response carries ``x-rate-limit-*`` headers. Latency, error rate and
+the per-token rate limit are configurable. Point the project at it with::
+
+    python -m benchmarks.fake_twitter --port 8765 --latency 0.05
+    export TWITTER_API_BASE_URL=http://127.0.0.1:8765
+    export TWITTER_UPLOAD_BASE_URL=http://127.0.0.1:8765
+
+The server needs neither Django nor network access.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+MULTIPART_FIELD = re.compile(rb'name="(\w+)"\r\n\r\n([^\r]*)\r\n')
+OAUTH_TOKEN = re.compile(r'oauth_token="([^"]*)"')
+
+
+class RateLimiter:
+    """Fixed-window request limit per access token."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key):
+        """Count one request; return ``(allowed, remaining, reset_epoch)``."""
+        now = time.time()
+        with self.lock:
+            reset, used = self.windows.get(key, (now + self.window, 0))
+            if now >= reset:
+                reset, used = now + self.window, 0
+            used += 1
+            self.windows[key] = (reset, used)
+        return used <= self.limit, max(0, self.limit - used), int(reset)
+
+
+class FakeTwitterServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Concurrent clients would overflow the default listen backlog of 5
+    request_queue_size = 1024
+
+    def __init__(self, address, latency, jitter, error_rate, rate_limit):
+        super().__init__(address, FakeTwitterHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(*rate_limit)
+        self.ids = itertools.count(1)
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+
+    def count(self, outcome):
+        with self.counts_lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        time.sleep(max(0.0, delay))
+
+        match = OAUTH_TOKEN.search(self.headers.get("Authorization", ""))
+        token = match.group(1) if match else "anonymous"
+        allowed, remaining, reset = server.limiter.hit(token)
+        headers = {
+            "x-rate-limit-limit": str(server.limiter.limit),
+            "x-rate-limit-remaining": str(remaining),
+            "x-rate-limit-reset": str(reset),
+        }
+
+        if not allowed:
+            server.count("rate_limited")
+            return self.reply(429, {"title": "Too Many Requests"}, headers)
+        if random.random() < server.error_rate:
+            server.count("error")
+            return self.reply(503, {"title": "Service Unavailable"}, headers)
+
+        path = self.path.split("?")[0]
+        if path == "/2/tweets":
+            text = json.loads(body or b"{}").get("text", "")
+            server.count("tweet")
+            tweet_id = str(next(server.ids))
+            return self.reply(201, {"data": {"id": tweet_id, "text": text}}, headers)
+        if path == "/1.1/media/upload.json":
+            return self.media_upload(body, headers)
+        if path == "/oauth/access_token":
+            server.count("access_token")
+            user_id = next(server.ids)
+            payload = (
+                f"oauth_token={user_id}-fake&oauth_token_secret=fake-secret"
+                f"&user_id={user_id}&screen_name=fake{user_id}"
+            )
+            return self.reply(200, payload, headers)
+        if path == "/oauth/request_token":
+            server.count("request_token")
+            payload = (
+                f"oauth_token=request-{next(server.ids)}&oauth_token_secret=fake-secret"
+                "&oauth_callback_confirmed=true"
+            )
+            return self.reply(200, payload, headers)
+
+        server.count("not_found")
+        return self.reply(404, {"title": "Not Found"}, headers)
+
+    def media_upload(self, body, headers):
+        if self.headers.get("Content-Type", "").startswith("multipart/"):
+            fields = {
+                name.decode(): value.decode()
+                for name, value in MULTIPART_FIELD.findall(body)
+            }
+        else:
+            fields = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+        command = fields.get("command")
+        if command == "APPEND":
+            self.server.count("media_append")
+            return self.reply(204, None, headers)
+
+        outcomes = {"INIT": "media_init", "FINALIZE": "media_finalize"}
+        self.server.count(outcomes.get(command, "media"))
+        media_id = int(fields.get("media_id") or next(self.server.ids))
+        media = {
+            "media_id": media_id,
+            "media_id_string": str(media_id),
+            "expires_after_secs": 86400,
+        }
+        return self.reply(200 if command != "INIT" else 202, media, headers)
+
+    def reply(self, status, payload, headers):
+        if payload is None:
+            data = b""
+        elif isinstance(payload, str):
+            data = payload.encode()
+        else:
+            data = json.dumps(payload).encode()
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if data:
+            content_type = (
+                "text/plain" if isinstance(payload, str) else "application/json"
+            )
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_rate(value):
+    limit, window = value.split("/")
+    return int(limit), float(window)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Mean response delay (s)."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.01, help="Uniform +/- delay jitter (s)."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 503 responses."
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=parse_rate,
+        default="300/900",
+        help='Per-token limit as "<requests>/<seconds>".',
+    )
+    args = parser.parse_args()
+
+    server = FakeTwitterServer(
+        (args.host, args.port),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    print(f"Fake Twitter API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.counts, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of the logging cost per published post.
+
+Publishes posts with ``post_to_twitter`` (against stubbed tweepy clients)
+with logging disabled, with JSON records written synchronously to a file, and
+with the same handler behind the log queue of ``social_media.log``. Each mode
+reports the records written per post, the fastest publish time per post over
+``--rounds`` rounds, its overhead over the runs without logging and, for the
+queue, the time the listener thread took to drain it afterwards.
+
+Publishing is dominated by database work, so the per-post overhead is only
+approximate; a second table times ``--records`` records logged in a loop,
+which is the cost each mode puts on the publishing thread.
+
+Usage: ``python -m benchmarks.logging_overhead [--posts N] [--rounds N] [--level DEBUG]``
+"""
+
+import argparse
+import logging
+import logging.config
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+def logging_config(path, level):
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "filters": {"context": {"()": "social_media.log.ContextFilter"}},
+        "formatters": {"json": {"()": "social_media.log.JSONFormatter"}},
+        "handlers": {
+            "file": {
+                "class": "logging.FileHandler",
+                "filename": path,
+                "formatter": "json",
+                "filters": ["context"],
+            }
+        },
+        "root": {"handlers": ["file"], "level": level},
+    }
+
+
+def publish(user, count):
+    """Publish ``count`` new posts one by one; return the seconds taken."""
+    from django.utils import timezone
+    from posts.models import Post
+    from posts.tasks import post_to_twitter
+
+    now = timezone.now()
+    posts = Post.objects.bulk_create(
+        [
+            Post(user=user, content=f"Benchmark post {i}", scheduled_time=now)
+            for i in range(count)
+        ]
+    )
+    start = time.perf_counter()
+    for post in posts:
+        post_to_twitter(post.id)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=500, help="Posts per round.")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument(
+        "--records", type=int, default=20000, help="Records timed per mode."
+    )
+    parser.add_argument(
+        "--level", default="INFO", help="Root level while logging is enabled."
+    )
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from social_media import log
+    from users.models import TwitterAccount
+
+    from benchmarks import stubs
+
+    stubs.install()
+    user = User.objects.create_user(username="bench", password="bench")
+    TwitterAccount.objects.create(
+        user=user, access_token="token", access_token_secret="secret"
+    )
+    # Warm up the client registry, query compilation and the imports
+    publish(user, 50)
+
+    directory = tempfile.mkdtemp()
+    modes = ("disabled", "sync", "queue")
+    timings = {mode: [] for mode in modes}
+    records = {}
+    drains = {mode: [] for mode in modes}
+    # Modes take turns, so drift in the database or the machine hits them all
+    for round_number in range(args.rounds):
+        for mode in modes:
+            path = os.path.join(directory, f"{mode}-{round_number}.log")
+            logging.config.dictConfig(logging_config(path, args.level))
+            logging.disable(logging.CRITICAL if mode == "disabled" else logging.NOTSET)
+            if mode == "queue":
+                log.use_queue(10 * args.posts)
+
+            timings[mode].append(publish(user, args.posts) / args.posts)
+            start = time.perf_counter()
+            if mode == "queue":
+                while not log._listener.queue.empty():
+                    time.sleep(0.001)
+            drains[mode].append(time.perf_counter() - start)
+            logging.shutdown()
+            with open(path) as f:
+                records[mode] = sum(1 for _ in f) / args.posts
+
+    # The minimum is the run least disturbed by the rest of the machine
+    baseline = min(timings["disabled"])
+    print(
+        f"{'mode':10} {'records/post':>12} {'us/post':>9} {'overhead us':>12} "
+        f"{'drain ms':>9}"
+    )
+    for mode in modes:
+        per_post = min(timings[mode])
+        print(
+            f"{mode:10} {records[mode]:12.2f} {per_post * 1e6:9.1f} "
+            f"{(per_post - baseline) * 1e6:+12.1f} "
+            f"{statistics.median(drains[mode]) * 1000:9.1f}"
+        )
+
+    # Publishing spends milliseconds in the ORM, which hides most of the
+    # logging cost in the noise; time the logging thread's share directly
+    print(f"\n{'mode':10} {'us/record':>9} {'us/post':>9}")
+    logger = logging.getLogger("posts.tasks")
+    for mode in ("sync", "queue"):
+        path = os.path.join(directory, f"{mode}-records.log")
+        logging.config.dictConfig(logging_config(path, args.level))
+        logging.disable(logging.NOTSET)
+        if mode == "queue":
+            log.use_queue(10 * args.records)
+        with log.log_context(post_id=1, user_id=1, account=1):
+            start = time.perf_counter()
+            for _ in range(args.records):
+                logger.info("Post published.")
+            per_record = (time.perf_counter() - start) / args.records
+        if mode == "queue":
+            while not log._listener.queue.empty():
+                time.sleep(0.001)
+        logging.shutdown()
+        print(
+            f"{mode:10} {per_record * 1e6:9.2f} {per_record * records[mode] * 1e6:9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Microbenchmark of API response rendering.
+
+Renders payloads shaped like a full ``list_posts`` page and a large
+``get_users`` response with ninja's default ``JSONRenderer`` and with the
+project's ``ORJSONRenderer``.
+
+Usage: ``python -m benchmarks.serialization [--users N] [--number N]``
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from ninja.renderers import JSONRenderer
+    from posts.pagination import MAX_PAGE_SIZE
+    from social_media.renderers import ORJSONRenderer
+
+    start = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+    list_posts = {
+        "items": [
+            {
+                "id": i,
+                "content": f"Scheduled post number {i} with some text",
+                "status": "scheduled",
+                "scheduled_time": start + timedelta(minutes=i),
+            }
+            for i in range(MAX_PAGE_SIZE)
+        ],
+        "next_cursor": "WyIyMDMwLTAxLTAxVDEzOjIwOjAwKzAwOjAwIiwgMjAwXQ",
+    }
+    get_users = [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com"}
+        for i in range(args.users)
+    ]
+
+    print(f"{'payload':24} {'renderer':10} {'ms/call':>9} {'bytes':>9}")
+    for label, payload in (
+        (f"list_posts[{MAX_PAGE_SIZE}]", list_posts),
+        (f"get_users[{args.users}]", get_users),
+    ):
+        for name, renderer in (("json", JSONRenderer()), ("orjson", ORJSONRenderer())):
+            size = len(renderer.render(None, payload, response_status=200))
+            elapsed = min(
+                timeit.repeat(
+                    lambda: renderer.render(None, payload, response_status=200),
+                    number=args.number,
+                    repeat=3,
+                )
+            )
+            print(f"{label:24} {name:10} {elapsed / args.number * 1000:9.3f} {size:9d}")
+
+
+if __name__ == "__main__":
+    main()
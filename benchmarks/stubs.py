@@ -0,0 +1,29 @@
+"""
+In-process stand-ins for the Twitter clients used by ``posts.tasks``.
+
+``install()`` makes the client registry hand out stubs, so publishing can be
+timed without any network access.
+"""
+
+from types import SimpleNamespace
+
+import tweepy
+
+
+class StubClient:
+    def create_tweet(self, text=None, media_ids=None, **kwargs):
+        return tweepy.Response(
+            data={"id": "1", "text": text}, includes={}, errors=[], meta={}
+        )
+
+
+class StubAPI:
+    def media_upload(self, filename, **kwargs):
+        return SimpleNamespace(media_id_string="1", expires_after_secs=86400)
+
+
+def install():
+    from posts.clients import twitter_clients
+
+    twitter_clients.clear()
+    twitter_clients._build_clients = lambda *tokens: (StubClient(), StubAPI())
@@ -0,0 +1,307 @@
+"""
+Microbenchmark suite for the API and task hot paths.
+
+Times ``create_post``, ``retrieve_post``, ``list_posts`` at several table
+sizes (read from the database, bypassing the posts cache, and again as cache
+hits), ``get_users``, JWT authentication through ``AuthBearer``, and
+``post_to_twitter`` and ``post_to_twitter_batch`` end to end (against stubbed
+tweepy clients). Each case reports ops/sec, p50/p99 latency and queries per
+call.
+
+Usage::
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --compare results.json
+
+``--compare`` prints the change against an earlier run and exits non-zero
+when a case got slower than ``--threshold``.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+HOST = "localhost"
+# Posts per post_to_twitter_batch call
+PUBLISH_BATCH = 20
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(name, func, iterations, warmup=5, **labels):
+    """Time ``func(i)`` per call and count the queries of one extra call."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for i in range(warmup):
+        func(i)
+
+    with CaptureQueriesContext(connection) as captured:
+        func(warmup)
+    # Read now: the log is reset by the next request
+    queries = len(captured)
+
+    samples = []
+    for i in range(warmup + 1, warmup + 1 + iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+
+    total = sum(samples)
+    return {
+        "name": name,
+        **labels,
+        "iterations": iterations,
+        "ops_per_second": round(iterations / total, 2),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+        "queries": queries,
+    }
+
+
+def bypass_post_cache():
+    """Swap the posts cache for a dummy one, so every read goes to the database."""
+    from django.conf import settings
+    from django.test import override_settings
+
+    return override_settings(
+        CACHES={
+            **settings.CACHES,
+            "posts": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+        }
+    )
+
+
+def seed_posts(user, count):
+    from django.utils import timezone
+    from posts.models import Post
+
+    now = timezone.now()
+    Post.objects.bulk_create(
+        [
+            Post(
+                user=user,
+                content=f"Benchmark post {i}",
+                scheduled_time=now + timedelta(minutes=i),
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def run(iterations, sizes):
+    from django.contrib.auth.models import User
+    from django.test import Client, RequestFactory
+    from django.utils import timezone
+    from ninja_jwt.tokens import RefreshToken
+    from posts.cache import post_cache
+    from posts.models import Post
+    from posts.tasks import post_to_twitter, post_to_twitter_batch
+    from social_media.urls import AuthBearer
+    from users.models import TwitterAccount
+
+    from benchmarks import stubs
+
+    stubs.install()
+
+    user = User.objects.create_user(username="bench", password="bench")
+    TwitterAccount.objects.create(
+        user=user, access_token="token", access_token_secret="secret"
+    )
+    User.objects.bulk_create(
+        [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(1000)]
+    )
+    token = str(RefreshToken.for_user(user).access_token)
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {token}", HTTP_HOST=HOST)
+
+    results = []
+    scheduled_time = (timezone.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+    form = {"content": "Benchmark", "scheduled_time": scheduled_time, "timezone": "UTC"}
+    results.append(
+        measure("create_post", lambda i: client.post("/api/posts/", form), iterations)
+    )
+
+    post_id = Post.objects.filter(user=user).values_list("id", flat=True).first()
+    with bypass_post_cache():
+        results.append(
+            measure(
+                "retrieve_post",
+                lambda i: client.get(f"/api/posts/{post_id}/"),
+                iterations,
+            )
+        )
+    post_cache.cache.clear()
+    results.append(
+        measure(
+            "retrieve_post_cached",
+            lambda i: client.get(f"/api/posts/{post_id}/"),
+            iterations,
+        )
+    )
+
+    seeded = Post.objects.filter(user=user).count()
+    for size in sizes:
+        seed_posts(user, size - seeded)
+        seeded = size
+        with bypass_post_cache():
+            results.append(
+                measure(
+                    "list_posts",
+                    lambda i: client.get("/api/posts/"),
+                    iterations,
+                    table_rows=size,
+                )
+            )
+        # bulk_create does not invalidate, so drop the pages cached before seeding
+        post_cache.cache.clear()
+        results.append(
+            measure(
+                "list_posts_cached",
+                lambda i: client.get("/api/posts/"),
+                iterations,
+                table_rows=size,
+            )
+        )
+
+    results.append(
+        measure("get_users", lambda i: client.get("/api/users/"), iterations)
+    )
+
+    auth = AuthBearer()
+    request = RequestFactory().get("/", HTTP_HOST=HOST)
+    results.append(
+        measure(
+            "jwt_auth", lambda i: auth.authenticate(request, token), iterations * 10
+        )
+    )
+
+    due = list(
+        Post.objects.filter(user=user)
+        .order_by("id")
+        .values_list("id", flat=True)[: iterations + 6]
+    )
+    results.append(
+        measure("post_to_twitter", lambda i: post_to_twitter(due[i]), iterations)
+    )
+
+    count = (iterations + 6) * PUBLISH_BATCH
+    seed_posts(user, count)
+    fresh = list(
+        Post.objects.filter(user=user)
+        .order_by("-id")
+        .values_list("id", flat=True)[:count]
+    )
+    results.append(
+        measure(
+            "post_to_twitter_batch",
+            lambda i: post_to_twitter_batch(
+                fresh[i * PUBLISH_BATCH : (i + 1) * PUBLISH_BATCH]
+            ),
+            iterations,
+            batch_size=PUBLISH_BATCH,
+        )
+    )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(result):
+    return (result["name"], result.get("table_rows"))
+
+
+def compare(results, baseline_path, threshold):
+    """Print the ops/sec change per case; return the cases slower than ``threshold``."""
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(case_key(result))
+        if before is None:
+            continue
+        change = result["ops_per_second"] / before["ops_per_second"] - 1
+        label = result["name"] + (
+            f"[{result['table_rows']}]" if "table_rows" in result else ""
+        )
+        queries = f"{before['queries']} -> {result['queries']}"
+        print(f"{label:28} {change:+8.1%}  queries {queries}")
+        if change < -threshold:
+            regressions.append(label)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[100, 1000, 10000],
+        help="Comma-separated post table sizes for list_posts.",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative ops/sec drop reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    results = run(args.iterations, args.sizes)
+
+    print(f"{'case':28} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for result in results:
+        label = result["name"] + (
+            f"[{result['table_rows']}]" if "table_rows" in result else ""
+        )
+        print(
+            f"{label:28} {result['ops_per_second']:10.1f} {result['p50_ms']:9.3f} "
+            f"{result['p99_ms']:9.3f} {result['queries']:8d}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "database": connection.vendor,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
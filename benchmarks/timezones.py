@@ -0,0 +1,74 @@
+"""
+Microbenchmark of scheduled-time parsing and UTC conversion.
+
+Compares the original per-request path (two parses, ``pytz`` lookup,
+``localize`` and ``astimezone``) with the cached zoneinfo registry, and a
+per-item batch loop with ``to_utc_many``.
+
+Usage: ``python -m benchmarks.timezones [--number N] [--batch-size N]``
+"""
+
+import argparse
+import timeit
+from datetime import datetime
+
+from benchmarks import setup_django
+
+ZONES = ["UTC", "Europe/Paris", "America/New_York", "Asia/Tokyo", "Australia/Sydney"]
+VALUE = "2030-01-01 10:00"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    import pytz
+    from django.utils import timezone
+    from posts.timezones import parse_local_time, to_utc, to_utc_many
+
+    def original():
+        # Schema validator
+        timezone.make_aware(datetime.strptime(VALUE, "%Y-%m-%d %H:%M"))
+        # create_post
+        scheduled_time = datetime.strptime(VALUE, "%Y-%m-%d %H:%M")
+        pytz.timezone("Europe/Paris").localize(scheduled_time).astimezone(pytz.utc)
+
+    def current():
+        to_utc(parse_local_time(VALUE), "Europe/Paris")
+
+    naive = [parse_local_time(VALUE)] * args.batch_size
+    zones = [ZONES[i % len(ZONES)] for i in range(args.batch_size)]
+
+    def batch_loop():
+        for value, zone in zip(naive, zones):
+            pytz.timezone(zone).localize(value).astimezone(pytz.utc)
+
+    def batch_vectorised():
+        to_utc_many(naive, zones)
+
+    for name, func, number, per in (
+        ("single, original", original, args.number, 1),
+        ("single, registry", current, args.number, 1),
+        (
+            "batch, pytz loop",
+            batch_loop,
+            args.number // args.batch_size,
+            args.batch_size,
+        ),
+        (
+            "batch, to_utc_many",
+            batch_vectorised,
+            args.number // args.batch_size,
+            args.batch_size,
+        ),
+    ):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:20} {elapsed / (number * per) * 1e6:8.3f} us/item")
+
+
+if __name__ == "__main__":
+    main()
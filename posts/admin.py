@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Post
+from .models import MediaAsset, Post, PostDelivery, RemoteMedia
 
 
 admin.site.register(Post)
+admin.site.register(PostDelivery)
+admin.site.register(MediaAsset)
+admin.site.register(RemoteMedia)
@@ -1,99 +1,251 @@
 from ninja import Router, UploadedFile, Form, File
-from django.utils import timezone
 from .models import Post
-from .schema import PostCreateSchema
+from .schema import PostCreateSchema, PostScheduleSchema
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from typing import Optional
-from django.http import JsonResponse
+from typing import Literal, Optional
 from datetime import datetime
+from django.utils import timezone
 import logging
-from django_q.models import Schedule
-import pytz
+from .batch import create_batch, parse_batch_request
+from .cache import post_cache
+from .media import discard_uploads, enqueue_media_preparation, store_upload
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+from .scheduling import reschedule_post, schedule_posts
+from .spreading import default_spread_window, load_histogram, place_posts
+from social_media.export import stream_export
+from social_media.queries import query_budget
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+EXPORT_FIELDS = (
+    "id",
+    "content",
+    "status",
+    "scheduled_time",
+    "timezone",
+    "posted_at",
+    "attempts",
+    "last_error",
+    "created_at",
+)
+LIST_FIELDS = ("id", "content", "status", "scheduled_time")
+# Longest span the load histogram covers, in minutes
+MAX_LOAD_MINUTES = 24 * 60
+
+
+def post_payload(post):
+    return {
+        "id": post.id,
+        "content": post.content,
+        "status": post.status,
+        "scheduled_time": post.scheduled_time,
+        "targets": post.targets,
+        # Prefetched by the caller
+        "deliveries": {
+            delivery.network: delivery.status for delivery in post.deliveries.all()
+        },
+        "image": post.image.url if post.image else None,
+        "created_at": post.created_at,
+    }
+
+
+def detail_queryset():
+    return Post.objects.prefetch_related("deliveries")
+
+
+def export_queryset(user, since=None):
+    posts = Post.objects.filter(user=user).order_by("id")
+    if since:
+        posts = posts.filter(created_at__gte=since)
+    return posts
+
+
+def list_queryset(user, status=None, scheduled_after=None, scheduled_before=None):
+    posts = Post.objects.filter(user=user, scheduled_time__isnull=False)
+    if status:
+        posts = posts.filter(status=status)
+    if scheduled_after:
+        posts = posts.filter(scheduled_time__gte=scheduled_after)
+    if scheduled_before:
+        posts = posts.filter(scheduled_time__lt=scheduled_before)
+    return posts.values(*LIST_FIELDS)
+
 
 @router.post("/")
+# Two of them store a new image, two more find the post's slot
+@query_budget(8)
 def create_post(
     request,
     image_file: Optional[UploadedFile] = File(None),
     payload: PostCreateSchema = Form(...),
 ):
-    # Parse and validate the scheduled time
+    # The schema has already parsed, validated and converted the time to UTC
+    utc_datetime = payload.scheduled_utc
+
+    spread_window = payload.spread_window
+    if spread_window is None:
+        spread_window = default_spread_window(request.user)
+
+    media_asset = None
     try:
-        scheduled_time = datetime.strptime(payload.scheduled_time, "%Y-%m-%d %H:%M")
-    except ValueError:
-        return JsonResponse(
-            {"error": "Invalid time format. Use 'YYYY-MM-DD HH:MM'."}, status=400
-        )
-
-    local_timezone = pytz.timezone(payload.timezone)
-
-    # Localize to the local timezone to make it timezone-aware
-    localized_datetime = local_timezone.localize(scheduled_time)
-
-    # Convert to UTC timezone
-    utc_datetime = localized_datetime.astimezone(pytz.utc)
-
-    # Check if scheduled time is in the future
-    if utc_datetime < timezone.now():
-        return JsonResponse(
-            {"error": "Scheduled time must be in the future"}, status=400
-        )
-
-    aware_time = timezone.make_aware(scheduled_time)
-    # Create the post
-    scheduled_post = Post.objects.create(
-        user=request.user,
-        content=payload.content,
-        scheduled_time=aware_time,  # Store in UTC
-        image=image_file if image_file else None,
-    )
+        with transaction.atomic():
+            # Store the image once per distinct content and point the post at it
+            media_asset = store_upload(image_file) if image_file else None
+            # Create the post
+            scheduled_post = Post(
+                user=request.user,
+                content=payload.content,
+                scheduled_time=utc_datetime,  # Store in UTC
+                spread_window=spread_window,
+                timezone=payload.timezone,
+                targets=payload.targets,
+                image=media_asset.file.name if media_asset else None,
+                media_asset=media_asset,
+            )
+            # Moved within its spread window, if it has one
+            place_posts([scheduled_post])
+            scheduled_post.save()
+
+            # Schedule the task using the UTC time
+            schedule_posts([(scheduled_post, scheduled_post.scheduled_time)])
+            if media_asset:
+                enqueue_media_preparation([media_asset])
+    except Exception:
+        # The new asset's row was rolled back, but not its file
+        if media_asset:
+            discard_uploads([media_asset])
+        raise
+
+    logger.info(f"Scheduled post for post id - {scheduled_post.id}")
+
+    return {"id": scheduled_post.id, "status": "created"}
+
+
+@router.post("/batch", response={200: dict, 400: dict})
+# Two more per new image, two to find the posts' slots, and large batches are
+# inserted in several statements
+@query_budget(14)
+def create_posts_batch(request):
+    """
+    Schedule many posts in one request.
 
-    # Schedule the task using the UTC time
-    Schedule.objects.create(
-        func="posts.tasks.post_to_twitter",
-        name=f"Post to Twitter {scheduled_post.id}",
-        hook="hooks.print_result",
-        args=scheduled_post.id,
-        repeats=1,
-        schedule_type=Schedule.ONCE,
-        next_run=utc_datetime,  # Ensure this is in UTC
+    Accepts a JSON array of posts as the body, or a multipart form with the
+    array in a ``payload`` field and images in ``images``. Every item is
+    validated up front; valid items are created together and invalid ones are
+    reported by index.
+    """
+    try:
+        raw_items, images = parse_batch_request(request)
+    except ValueError as e:
+        return 400, {"error": str(e)}
+
+    results = create_batch(request.user, raw_items, images)
+    created = sum(1 for result in results if "id" in result)
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results,
+    }
+
+
+@router.get("/export")
+@query_budget(1)
+def export_posts(
+    request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+):
+    """
+    Stream the current user's post history as NDJSON or CSV, oldest first.
+
+    Pass ``since`` to only export posts created at or after that moment, for
+    incremental pulls.
+    """
+    return stream_export(
+        export_queryset(request.user, since), EXPORT_FIELDS, format, "posts"
     )
 
-    logger.info(f"Scheduled post for post id - {scheduled_post.id}")
 
-    return JsonResponse({"id": scheduled_post.id, "status": "created"})
+@router.get("/load", response={200: dict, 400: dict})
+@query_budget(2)
+def scheduled_load(request, minutes: int = 60):
+    """
+    The posts of all users due in each of the next ``minutes`` minutes.
+
+    Shows the peaks to avoid when picking a time, or the spread window wide
+    enough to flatten them.
+    """
+    if not 1 <= minutes <= MAX_LOAD_MINUTES:
+        return 400, {"error": f"minutes must be 1 to {MAX_LOAD_MINUTES}."}
+    histogram = load_histogram(timezone.now(), minutes)
+    counts = [minute["posts"] for minute in histogram]
+    return {"total": sum(counts), "peak": max(counts), "minutes": histogram}
 
 
 @router.get("/{post_id}/")
+@query_budget(3)
 def retrieve_post(request, post_id: int):
     """Retrieve a specific post by ID."""
-    post = get_object_or_404(Post, id=post_id)
-    return {
-        "id": post.id,
-        "content": post.content,
-        "status": post.status,
-        "scheduled_time": post.scheduled_time,
-        "image": post.image.url if post.image else None,
-        "created_at": post.created_at,
-    }
 
+    return post_cache.detail(
+        post_id, lambda: post_payload(get_object_or_404(detail_queryset(), id=post_id))
+    )
+
+
+@router.get("/", response={200: dict, 400: dict})
+@query_budget(2)
+def list_posts(
+    request,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    status: Optional[str] = None,
+    scheduled_after: Optional[datetime] = None,
+    scheduled_before: Optional[datetime] = None,
+):
+    """
+    List the current user's posts ordered by scheduled time.
+
+    Results are keyset-paginated on ``(scheduled_time, id)``; pass the
+    returned ``next_cursor`` back as ``cursor`` to fetch the following page.
+    Pages are cached per user until one of the user's posts changes.
+    """
+
+    def load():
+        posts = list_queryset(request.user, status, scheduled_after, scheduled_before)
+        items, next_cursor = keyset_page(posts, cursor, limit)
+        return {"items": items, "next_cursor": next_cursor}
+
+    params = [cursor, limit, status, scheduled_after, scheduled_before]
+    try:
+        return post_cache.page(request.user.id, params, load)
+    except ValueError as e:
+        return 400, {"error": str(e)}
+
+
+@router.put("/{post_id}/schedule", response={200: dict, 409: dict})
+@query_budget(12)
+def reschedule(request, post_id: int, payload: PostScheduleSchema):
+    """
+    Move a post that has not been published yet to a new time.
 
-@router.get("/")
-def list_posts(request):
-    """List all posts ordered by scheduled time."""
-    posts = Post.objects.all().order_by("scheduled_time")
-    return [
-        {"id": post.id, "content": post.content, "scheduled_time": post.scheduled_time}
-        for post in posts
-    ]
+    The post's pending schedule is cancelled and replaced in one transaction.
+    A ``spread_window`` replaces the post's own.
+    """
+    post = get_object_or_404(Post, id=post_id, user=request.user)
+    if not reschedule_post(
+        post, payload.scheduled_utc, payload.timezone, payload.spread_window
+    ):
+        return 409, {"error": f"A {post.status} post cannot be rescheduled."}
+    logger.info(f"Rescheduled post for post id - {post.id}")
+    return {"id": post.id, "status": "rescheduled"}
 
 
 @router.delete("/{post_id}/")
+@query_budget(10)
 def delete_post(request, post_id: int):
-    """Delete a specific post by ID."""
+    """Delete a specific post by ID and cancel its schedule."""
     post = get_object_or_404(Post, id=post_id)
     post.delete()
     return {"status": "deleted"}
@@ -0,0 +1,120 @@
+"""
+Async versions of the ``posts`` endpoints, served when ``API_ASYNC_VIEWS`` is set.
+
+Reads go through the async ORM. Creating and rescheduling posts write the
+posts and their schedules in one transaction, which Django only supports
+synchronously, so those views run the synchronous implementation in a worker
+thread.
+"""
+
+from datetime import datetime
+from typing import Literal, Optional
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from ninja import File, Form, Router, UploadedFile
+
+from social_media.export import astream_export
+from social_media.queries import query_budget
+
+from . import api
+from .cache import post_cache
+from .models import Post
+from .pagination import DEFAULT_PAGE_SIZE, akeyset_page
+from .schema import PostCreateSchema, PostScheduleSchema
+
+router = Router()
+
+
+@router.post("/")
+# Two of them store a new image, two more find the post's slot
+@query_budget(8)
+async def create_post(
+    request,
+    image_file: Optional[UploadedFile] = File(None),
+    payload: PostCreateSchema = Form(...),
+):
+    return await sync_to_async(api.create_post)(request, image_file, payload)
+
+
+@router.post("/batch", response={200: dict, 400: dict})
+# Two more per new image, two to find the posts' slots, and large batches are
+# inserted in several statements
+@query_budget(14)
+async def create_posts_batch(request):
+    """Schedule many posts in one request; see ``posts.api.create_posts_batch``."""
+    return await sync_to_async(api.create_posts_batch)(request)
+
+
+@router.get("/export")
+@query_budget(1)
+async def export_posts(
+    request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+):
+    """Stream the current user's post history as NDJSON or CSV, oldest first."""
+    return astream_export(
+        api.export_queryset(request.user, since), api.EXPORT_FIELDS, format, "posts"
+    )
+
+
+@router.get("/load", response={200: dict, 400: dict})
+@query_budget(2)
+async def scheduled_load(request, minutes: int = 60):
+    """The posts of all users due in each of the next ``minutes`` minutes."""
+    return await sync_to_async(api.scheduled_load)(request, minutes)
+
+
+@router.get("/{post_id}/")
+@query_budget(3)
+async def retrieve_post(request, post_id: int):
+    """Retrieve a specific post by ID."""
+
+    async def load():
+        post = await aget_object_or_404(api.detail_queryset(), id=post_id)
+        return api.post_payload(post)
+
+    return await post_cache.adetail(post_id, load)
+
+
+@router.get("/", response={200: dict, 400: dict})
+@query_budget(2)
+async def list_posts(
+    request,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    status: Optional[str] = None,
+    scheduled_after: Optional[datetime] = None,
+    scheduled_before: Optional[datetime] = None,
+):
+    """List the current user's posts ordered by scheduled time."""
+
+    async def load():
+        posts = api.list_queryset(
+            request.user, status, scheduled_after, scheduled_before
+        )
+        items, next_cursor = await akeyset_page(posts, cursor, limit)
+        return {"items": items, "next_cursor": next_cursor}
+
+    params = [cursor, limit, status, scheduled_after, scheduled_before]
+    try:
+        return await post_cache.apage(request.user.id, params, load)
+    except ValueError as e:
+        return 400, {"error": str(e)}
+
+
+@router.put("/{post_id}/schedule", response={200: dict, 409: dict})
+@query_budget(12)
+async def reschedule(request, post_id: int, payload: PostScheduleSchema):
+    """Move a post that has not been published yet to a new time."""
+    return await sync_to_async(api.reschedule)(request, post_id, payload)
+
+
+@router.delete("/{post_id}/")
+@query_budget(10)
+async def delete_post(request, post_id: int):
+    """Delete a specific post by ID and cancel its schedule."""
+    post = await aget_object_or_404(Post, id=post_id)
+    await post.adelete()
+    return {"status": "deleted"}
@@ -0,0 +1,500 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import NamedTuple
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from oauthlib.oauth1 import Client as OAuth1Client
+
+from social_media.log import log_context
+from social_media.metrics import record_publish
+
+from users.models import TwitterAccount
+
+from .clients import twitter_clients
+from .dispatcher import claim_due_posts, release_stale_claims
+from .media import get_media_id, upload_media
+from .models import Post, PostDelivery
+from .retries import (
+    PERMANENT,
+    RATE_LIMITED,
+    TRANSIENT,
+    Failure,
+    classify_exception,
+    classify_status,
+    rate_limit_reset,
+    record_failure,
+)
+from .tasks import post_to_twitter_batch
+from .transitions import CLAIMED, StatusBuffer, transition
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request to the X API may take
+REQUEST_TIMEOUT = 30.0
+
+# Outcomes of posts that were not sent: the batch deadline passed first, or the
+# claim was released (and maybe taken by another process) in the meantime
+EXPIRED = "expired"
+UNCLAIMED = "unclaimed"
+
+
+class Posted(NamedTuple):
+    tweet_id: str
+
+
+def parse_rate(rate):
+    """Parse a ``"<requests>/<seconds>"`` limit into ``(refill_per_second, capacity)``."""
+    requests, seconds = rate.split("/")
+    return int(requests) / float(seconds), int(requests)
+
+
+class TokenBucket:
+    """
+    Token bucket for a single event loop.
+
+    ``acquire`` waits until a token is available. No locking is needed since
+    the check and the decrement never straddle an ``await``.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def release(self):
+        """Give back a token that was acquired but not used."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the API answered 429."""
+        self._refill()
+        self.tokens = 0.0
+
+
+class PublishStats:
+    """
+    Throughput and latency percentiles of one publisher run.
+
+    Only the most recent ``window`` latencies are kept.
+    """
+
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.posted = 0
+        self.failed = 0
+        self.deferred = 0
+        self.rate_limited = 0
+        self.released = 0
+        self.latencies = deque(maxlen=window)
+
+    @staticmethod
+    def percentile(latencies, fraction):
+        """The ``fraction`` percentile of the sorted ``latencies``."""
+        if not latencies:
+            return None
+        return round(
+            latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 4
+        )
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "posted": self.posted,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "rate_limited": self.rate_limited,
+            "released": self.released,
+            "posts_per_second": round(self.posted / elapsed, 3) if elapsed else 0.0,
+            "latency_p50": self.percentile(latencies, 0.50),
+            "latency_p95": self.percentile(latencies, 0.95),
+            "latency_p99": self.percentile(latencies, 0.99),
+        }
+
+
+def load_claimed_posts(post_ids):
+    """Fetch the content and credentials of claimed posts in one query."""
+    return list(
+        Post.objects.filter(id__in=post_ids).values(
+            "id",
+            "user_id",
+            "content",
+            "scheduled_time",
+            "claimed_at",
+            "attempts",
+            "targets",
+            "image",
+            "media_asset_id",
+            "media_asset__file",
+            "media_asset__prepared_file",
+            "user__twitteraccount__id",
+            "user__twitteraccount__access_token",
+            "user__twitteraccount__access_token_secret",
+        )
+    )
+
+
+def still_claimed(post):
+    """Whether ``post`` is still held by the claim it was loaded with."""
+    return Post.objects.filter(
+        id=post["id"], status__in=CLAIMED, claimed_at=post["claimed_at"]
+    ).exists()
+
+
+def release_claims(post_ids):
+    """Return claimed posts that were not sent to ``scheduled``."""
+    return transition(post_ids, "scheduled", from_statuses=CLAIMED, claimed_at=None)
+
+
+def post_media_id(post):
+    """
+    Return the ``media_id`` for a claimed post's image, or ``None``.
+
+    Uses the blocking v1.1 media client, so call it from a thread.
+    """
+    account = TwitterAccount(
+        pk=post["user__twitteraccount__id"],
+        access_token=post["user__twitteraccount__access_token"],
+        access_token_secret=post["user__twitteraccount__access_token_secret"],
+    )
+    if post["media_asset_id"]:
+        name = post["media_asset__prepared_file"] or post["media_asset__file"]
+        return get_media_id(account, post["media_asset_id"], name)
+    if post["image"]:
+        api = twitter_clients.get_api(account)
+        return upload_media(api, post["image"]).media_id_string
+    return None
+
+
+class AsyncPublisher:
+    """
+    Publish batches of due posts concurrently over one async HTTP client.
+
+    Every request takes a token from the app-wide bucket and from the
+    bucket of its account, so bursts stay within the X API quotas, and at
+    most ``concurrency`` requests are in flight at once.
+
+    A claim is only held for ``claim_timeout`` seconds, after which any
+    process may release and publish the post again. Posts whose turn has not
+    come ``batch_deadline`` seconds after the claim are therefore released
+    unsent, and each claim is checked again right before its post is sent.
+
+    Raises:
+        ImproperlyConfigured: If a request started just before the batch
+            deadline could outlive the claim.
+    """
+
+    def __init__(
+        self,
+        concurrency=None,
+        account_rate=None,
+        app_rate=None,
+        claim_timeout=None,
+        batch_deadline=None,
+    ):
+        self.concurrency = concurrency or settings.POSTS_ASYNC_CONCURRENCY
+        self.claim_timeout = claim_timeout or settings.POSTS_DISPATCH_CLAIM_TIMEOUT
+        self.batch_deadline = batch_deadline or settings.POSTS_ASYNC_BATCH_DEADLINE
+        if self.batch_deadline + REQUEST_TIMEOUT >= self.claim_timeout:
+            raise ImproperlyConfigured(
+                f"The async publisher's batch deadline ({self.batch_deadline}s) "
+                f"plus the request timeout ({REQUEST_TIMEOUT}s) must stay below "
+                f"the claim timeout ({self.claim_timeout}s)."
+            )
+        self.account_rate = parse_rate(
+            account_rate or settings.TWITTER_ACCOUNT_RATE_LIMIT
+        )
+        self.app_bucket = TokenBucket(
+            *parse_rate(app_rate or settings.TWITTER_APP_RATE_LIMIT)
+        )
+        self.account_buckets = {}
+        self.stats = PublishStats()
+        self.create_tweet_url = f"{settings.TWITTER_API_BASE_URL.rstrip('/')}/2/tweets"
+
+    def account_bucket(self, account_id):
+        bucket = self.account_buckets.get(account_id)
+        if bucket is None:
+            bucket = self.account_buckets[account_id] = TokenBucket(*self.account_rate)
+        return bucket
+
+    def sign(self, post):
+        consumer_key, consumer_secret = twitter_clients.consumer_credentials
+        oauth = OAuth1Client(
+            consumer_key,
+            client_secret=consumer_secret,
+            resource_owner_key=post["user__twitteraccount__access_token"],
+            resource_owner_secret=post["user__twitteraccount__access_token_secret"],
+        )
+        _, headers, _ = oauth.sign(
+            self.create_tweet_url,
+            http_method="POST",
+            headers={"Content-Type": "application/json"},
+        )
+        return headers
+
+    async def publish_one(self, client, semaphore, post, deadline):
+        """
+        Publish one post unless ``deadline`` (event loop time) passes first.
+
+        Returns:
+            :class:`Posted`, the :class:`Failure`, or ``EXPIRED`` or
+            ``UNCLAIMED`` if the post was not sent.
+        """
+        with log_context(
+            post_id=post["id"],
+            user_id=post["user_id"],
+            account=post["user__twitteraccount__id"],
+        ):
+            return await self._publish_one(client, semaphore, post, deadline)
+
+    async def _publish_one(self, client, semaphore, post, deadline):
+        account_id = post["user__twitteraccount__id"]
+        if account_id is None:
+            logger.error(f"Post {post['id']} has no connected Twitter account")
+            return Failure(PERMANENT, "No connected Twitter account")
+
+        bucket = self.account_bucket(account_id)
+        # The account's own limit first, so a throttled account does not hold
+        # app-wide tokens while it waits; tokens of an expired post are returned
+        acquired = []
+        try:
+            async with asyncio.timeout_at(deadline):
+                for token_bucket in (bucket, self.app_bucket):
+                    await token_bucket.acquire()
+                    acquired.append(token_bucket)
+                await semaphore.acquire()
+        except TimeoutError:
+            for token_bucket in acquired:
+                token_bucket.release()
+            return EXPIRED
+
+        try:
+            start = time.perf_counter()
+            try:
+                body = {"text": post["content"]}
+                if post["media_asset_id"] or post["image"]:
+                    media_id = await sync_to_async(
+                        post_media_id, thread_sensitive=False
+                    )(post)
+                    body["media"] = {"media_ids": [media_id]}
+
+                # Right before sending, after the upload, which may be slow
+                if not await sync_to_async(still_claimed)(post):
+                    logger.warning(
+                        f"Post {post['id']} is no longer claimed, not sending"
+                    )
+                    return UNCLAIMED
+                response = await client.post(
+                    self.create_tweet_url, json=body, headers=self.sign(post)
+                )
+            except httpx.HTTPError as e:
+                logger.error(f"Error posting tweet for post {post['id']}: {e}")
+                return Failure(TRANSIENT, f"{type(e).__name__}: {e}")
+            except Exception as e:
+                logger.error(f"Error posting tweet for post {post['id']}: {e}")
+                return classify_exception(e)
+            finally:
+                self.stats.latencies.append(time.perf_counter() - start)
+        finally:
+            semaphore.release()
+
+        if response.is_success:
+            try:
+                return Posted(str(response.json()["data"]["id"]))
+            except (ValueError, KeyError, TypeError) as e:
+                # The tweet may well exist, so it is not retried
+                logger.error(
+                    f"Unreadable response to post {post['id']}: "
+                    f"{response.status_code} {response.text[:200]}"
+                )
+                return Failure(
+                    PERMANENT,
+                    f"Unreadable response {response.status_code}: "
+                    f"{type(e).__name__}: {e}",
+                )
+        kind = classify_status(response.status_code)
+        if kind == RATE_LIMITED:
+            bucket.drain()
+        logger.error(
+            f"Twitter rejected post {post['id']}: "
+            f"{response.status_code} {response.text[:200]}"
+        )
+        return Failure(
+            kind,
+            f"HTTP {response.status_code}: {response.text[:200]}",
+            rate_limit_reset(response.headers) if kind == RATE_LIMITED else None,
+        )
+
+    async def publish_batch(self, client, post_ids, deadline=None):
+        """
+        Publish claimed posts concurrently, recording outcomes as they come.
+
+        Outcomes are written every ``POSTS_STATUS_FLUSH_SIZE`` posts rather
+        than once the whole batch is done. Posts not sent by ``deadline``
+        (event loop time, ``batch_deadline`` seconds from now by default) are
+        released for the next claim. Posts that also target other networks
+        than Twitter are published by ``post_to_twitter_batch`` in a thread
+        meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = deadline or loop.time() + self.batch_deadline
+        posts = await sync_to_async(load_claimed_posts)(post_ids)
+        others = [post["id"] for post in posts if post["targets"] != ["twitter"]]
+        posts = [post for post in posts if post["targets"] == ["twitter"]]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def timed(post):
+            # Includes the wait for rate-limit tokens, as the sync path does not throttle
+            start = time.perf_counter()
+            outcome = await self.publish_one(client, semaphore, post, deadline)
+            return post, outcome, time.perf_counter() - start
+
+        fan_out = None
+        if others:
+            fan_out = asyncio.ensure_future(
+                sync_to_async(post_to_twitter_batch, thread_sensitive=False)(
+                    others, claimed=True
+                )
+            )
+
+        # Only flushed explicitly: writes must run outside the event loop
+        buffer = StatusBuffer(max_size=0, from_statuses=CLAIMED)
+        expired = []
+        try:
+            for result in asyncio.as_completed([timed(post) for post in posts]):
+                post, outcome, duration = await result
+                if outcome == EXPIRED:
+                    expired.append(post["id"])
+                    continue
+                if outcome == UNCLAIMED:
+                    continue
+                self.record_outcome(buffer, post, outcome, duration)
+                if len(buffer) >= settings.POSTS_STATUS_FLUSH_SIZE:
+                    await sync_to_async(buffer.flush)()
+        finally:
+            # Posts already sent must not be left claimed, or they would be
+            # released and sent again
+            await sync_to_async(buffer.flush)()
+
+        if expired:
+            logger.warning(
+                f"Batch deadline passed, releasing {len(expired)} unsent posts"
+            )
+            self.stats.released += await sync_to_async(release_claims)(expired)
+
+        if fan_out is not None:
+            fanned_out = await fan_out
+            self.stats.posted += fanned_out.get("posted", 0)
+            self.stats.deferred += fanned_out.get("deferred", 0)
+            self.stats.failed += fanned_out.get("dead", 0)
+
+    def record_outcome(self, buffer, post, outcome, duration):
+        """Buffer the status and delivery of a sent post and record its metrics."""
+        posted_at = timezone.now()
+        if isinstance(outcome, Posted):
+            buffer.add(
+                post["id"],
+                "posted",
+                post["user_id"],
+                posted_at=posted_at,
+                next_attempt_at=None,
+            )
+            delivery = PostDelivery(
+                post_id=post["id"],
+                network="twitter",
+                status="posted",
+                remote_id=outcome.tweet_id,
+                posted_at=posted_at,
+            )
+            outcome = "posted"
+            self.stats.posted += 1
+        else:
+            failure = outcome
+            # Deferred to the rate-limit reset or a backoff, or dead-lettered;
+            # with a buffer and no schedule this does not touch the database
+            outcome = record_failure(
+                post["id"],
+                post["attempts"],
+                failure,
+                schedule=False,
+                buffer=buffer,
+                user_id=post["user_id"],
+                from_statuses=CLAIMED,
+            )
+            delivery = PostDelivery(
+                post_id=post["id"],
+                network="twitter",
+                status="dead" if failure.kind == PERMANENT else "failed",
+                last_error=failure.error,
+            )
+            self.stats.rate_limited += failure.kind == RATE_LIMITED
+            self.stats.deferred += outcome == "deferred"
+            self.stats.failed += outcome == "dead"
+        buffer.add_deliveries([delivery])
+        record_publish(
+            outcome,
+            duration,
+            post["scheduled_time"],
+            posted_at if outcome == "posted" else None,
+        )
+
+    async def run(self, batch_size=None, interval=None, once=False):
+        """
+        Claim and publish due posts until cancelled, or until idle with ``once``.
+
+        Claims abandoned by a crashed publisher or dispatcher are released
+        every half ``claim_timeout``, as the dispatcher does.
+        """
+        batch_size = batch_size or settings.POSTS_DISPATCH_BATCH_SIZE
+        interval = (
+            interval if interval is not None else settings.POSTS_DISPATCH_INTERVAL
+        )
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        loop = asyncio.get_running_loop()
+        next_release = 0.0
+
+        async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT) as client:
+            while True:
+                if loop.time() >= next_release:
+                    self.stats.released += await sync_to_async(release_stale_claims)(
+                        self.claim_timeout
+                    )
+                    next_release = loop.time() + self.claim_timeout / 2
+
+                # The deadline counts from before the claim, so it is never
+                # later than the claim's own timeout allows
+                deadline = loop.time() + self.batch_deadline
+                rows = await sync_to_async(claim_due_posts)(batch_size)
+                if rows:
+                    await self.publish_batch(
+                        client, [post_id for post_id, _ in rows], deadline
+                    )
+                    continue
+                if once:
+                    return self.stats
+                await asyncio.sleep(interval)
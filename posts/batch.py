@@ -0,0 +1,173 @@
+import json
+import logging
+from django.db import transaction
+from django.utils import timezone
+from pydantic import ValidationError
+
+from .cache import post_cache
+from .media import discard_uploads, enqueue_media_preparation, store_upload
+from .models import Post
+from .schema import PostBatchItemSchema
+from .scheduling import schedule_posts
+from .spreading import default_spread_window, place_posts
+from .timezones import is_valid_timezone, parse_local_time, to_utc_many
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 5000
+
+
+def parse_batch_request(request):
+    """
+    Extract the raw batch items and uploaded images from ``request``.
+
+    A JSON request carries the array as its body. A multipart request carries
+    the array as a JSON string in the ``payload`` field and the images in
+    ``images``; items refer to an image by its position in that list.
+
+    Raises:
+        ValueError: If the body is not a JSON array or exceeds ``MAX_BATCH_SIZE``.
+    """
+    if request.content_type == "multipart/form-data":
+        raw = request.POST.get("payload", "")
+        images = request.FILES.getlist("images")
+    else:
+        raw = request.body
+        images = []
+
+    try:
+        items = json.loads(raw)
+    except (TypeError, ValueError):
+        raise ValueError("Batch payload must be a JSON array.")
+
+    if not isinstance(items, list):
+        raise ValueError("Batch payload must be a JSON array.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"A batch may contain at most {MAX_BATCH_SIZE} posts.")
+
+    return items, images
+
+
+def validate_batch(raw_items, images):
+    """
+    Validate every item and convert its scheduled time to UTC.
+
+    Times are parsed once per item and converted to UTC together in a single
+    ``to_utc_many`` call.
+
+    Returns:
+        tuple: ``(valid, errors)`` where ``valid`` is a list of
+        ``(index, item, utc_time)`` tuples and ``errors`` maps an item index
+        to its error message.
+    """
+    errors = {}
+    parsed = []
+
+    for index, raw in enumerate(raw_items):
+        try:
+            item = PostBatchItemSchema.model_validate(raw)
+        except ValidationError as e:
+            errors[index] = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+                for err in e.errors()
+            )
+            continue
+
+        if item.image is not None and not 0 <= item.image < len(images):
+            errors[index] = f"Image index {item.image} is out of range."
+            continue
+
+        if not is_valid_timezone(item.timezone):
+            errors[index] = f"Unknown timezone '{item.timezone}'."
+            continue
+
+        try:
+            naive = parse_local_time(item.scheduled_time)
+        except ValueError:
+            errors[index] = "Invalid time format. Use 'YYYY-MM-DD HH:MM'."
+            continue
+
+        parsed.append((index, item, naive))
+
+    utc_times = to_utc_many(
+        [naive for _, _, naive in parsed], [item.timezone for _, item, _ in parsed]
+    )
+
+    now = timezone.now()
+    valid = []
+    for (index, item, _), utc_time in zip(parsed, utc_times):
+        if utc_time < now:
+            errors[index] = "Scheduled time must be in the future"
+            continue
+        valid.append((index, item, utc_time))
+    return valid, errors
+
+
+def create_batch(user, raw_items, images=()):
+    """
+    Validate and schedule a batch of posts for ``user``.
+
+    Valid items are written with one ``bulk_create`` for the posts and one
+    for their django-q schedules (unless the dispatcher is enabled), inside a
+    single transaction. Invalid items are reported and skipped.
+
+    Returns:
+        list: One result per input item, in input order, holding either the
+        new post ``id`` or an ``error`` message.
+    """
+    valid, errors = validate_batch(raw_items, images)
+
+    used = sorted({item.image for _, item, _ in valid if item.image is not None})
+    # Items without a spread window of their own use the user's default
+    default_window = (
+        default_spread_window(user)
+        if any(item.spread_window is None for _, item, _ in valid)
+        else 0
+    )
+
+    assets = {}
+    try:
+        with transaction.atomic():
+            # Each distinct image is stored once, however many items share it
+            for index in used:
+                assets[index] = store_upload(images[index])
+
+            posts = [
+                Post(
+                    user=user,
+                    content=item.content,
+                    scheduled_time=utc_time,
+                    spread_window=(
+                        default_window
+                        if item.spread_window is None
+                        else item.spread_window
+                    ),
+                    timezone=item.timezone,
+                    targets=item.targets,
+                    image=(
+                        assets[item.image].file.name if item.image is not None else None
+                    ),
+                    media_asset=assets.get(item.image),
+                )
+                for _, item, utc_time in valid
+            ]
+            # Slots are picked from the load of all the posts' windows at once
+            place_posts(posts)
+            posts = Post.objects.bulk_create(posts)
+            schedule_posts([(post, post.scheduled_time) for post in posts])
+            enqueue_media_preparation(assets.values())
+            # bulk_create bypasses Post.save(), which would otherwise do this
+            post_cache.invalidate(user_ids=[user.id])
+    except Exception:
+        # The new assets' rows were rolled back, but not their files
+        discard_uploads(assets.values())
+        raise
+
+    logger.info(f"Scheduled {len(posts)} posts in batch, {len(errors)} rejected")
+
+    results = [None] * len(raw_items)
+    for post, (index, _, _) in zip(posts, valid):
+        results[index] = {"index": index, "id": post.id, "status": "created"}
+    for index, message in errors.items():
+        results[index] = {"index": index, "error": message}
+    return results
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+from social_media.metrics import CACHE_REQUESTS
+
+from .models import Post
+
+
+class PostCache:
+    """
+    Read-through cache of serialized posts and per-user list pages.
+
+    Detail entries are keyed by post id. List pages are keyed by the user's
+    current list *version* and the query parameters, so a write only has to
+    replace one version key to retire every cached page of that user; the
+    orphaned pages then age out by TTL or eviction.
+
+    Invalidations only reach the processes sharing the cache backend. With
+    the default local-memory backend a process keeps serving what it cached
+    until the entry expires, after ``POSTS_CACHE_LOCAL_TTL`` seconds at most.
+    """
+
+    def __init__(self, alias="posts"):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def detail(self, post_id, load):
+        """Return the cached payload of ``post_id``, calling ``load()`` on a miss."""
+        return self._read_through("detail", f"post:{post_id}", load)
+
+    def page(self, user_id, params, load):
+        """Return a cached list page of ``user_id`` for ``params``, or ``load()`` it."""
+        key = f"list:{user_id}:{self._list_version(user_id)}:{self._digest(params)}"
+        return self._read_through("list", key, load)
+
+    async def adetail(self, post_id, load):
+        """Async ``detail``; ``load`` is a coroutine function."""
+        return await self._aread_through("detail", f"post:{post_id}", load)
+
+    async def apage(self, user_id, params, load):
+        """Async ``page``; ``load`` is a coroutine function."""
+        version = await self.cache.aget_or_set(
+            f"list-version:{user_id}", time.time_ns, None
+        )
+        key = f"list:{user_id}:{version}:{self._digest(params)}"
+        return await self._aread_through("list", key, load)
+
+    def invalidate(self, post_ids=(), user_ids=None):
+        """
+        Drop the cached payloads of ``post_ids`` and the list pages of their users.
+
+        Runs once the surrounding transaction commits, so a concurrent read
+        cannot cache the old rows again. The owners are looked up when
+        ``user_ids`` is not given.
+        """
+        post_ids = list(post_ids)
+        transaction.on_commit(lambda: self._invalidate(post_ids, user_ids))
+
+    def _invalidate(self, post_ids, user_ids):
+        if user_ids is None:
+            user_ids = set(
+                Post.objects.filter(id__in=post_ids).values_list("user_id", flat=True)
+            )
+        cache = self.cache
+        cache.delete_many([f"post:{post_id}" for post_id in post_ids])
+        cache.delete_many([f"list-version:{user_id}" for user_id in set(user_ids)])
+        with self._lock:
+            self.invalidations += len(post_ids) or len(user_ids)
+
+    @staticmethod
+    def _digest(params):
+        return hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _list_version(self, user_id):
+        return self.cache.get_or_set(f"list-version:{user_id}", time.time_ns, None)
+
+    def _read_through(self, kind, key, load):
+        cache = self.cache
+        value = cache.get(key)
+        if not self._count(kind, value is not None):
+            value = load()
+            if value is not None:
+                cache.set(key, value)
+        return value
+
+    async def _aread_through(self, kind, key, load):
+        cache = self.cache
+        value = await cache.aget(key)
+        if not self._count(kind, value is not None):
+            value = await load()
+            if value is not None:
+                await cache.aset(key, value)
+        return value
+
+    def _count(self, kind, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_REQUESTS.labels(kind, "hit" if hit else "miss").inc()
+        return hit
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+post_cache = PostCache()
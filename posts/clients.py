@@ -0,0 +1,176 @@
+import threading
+from collections import OrderedDict
+
+import requests
+from decouple import config
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+def twitter_base_urls():
+    """Map the Twitter origins tweepy uses to the configured base URLs."""
+    base_urls = {
+        "https://api.twitter.com": settings.TWITTER_API_BASE_URL,
+        "https://upload.twitter.com": settings.TWITTER_UPLOAD_BASE_URL,
+    }
+    return {
+        origin: base_url.rstrip("/")
+        for origin, base_url in base_urls.items()
+        if base_url.rstrip("/") != origin
+    }
+
+
+class KeepAliveSession(requests.Session):
+    """
+    Session whose pooled connections survive ``close()``.
+
+    ``tweepy.API`` closes its session after every request, which would
+    otherwise tear down the pool shared by all clients. Requests to the
+    origins in ``base_urls`` are redirected to the mapped base URL, since
+    tweepy hardcodes the Twitter hosts.
+    """
+
+    def __init__(self, base_urls=None):
+        super().__init__()
+        self.base_urls = base_urls or {}
+
+    def request(self, method, url, *args, **kwargs):
+        for origin, base_url in self.base_urls.items():
+            if url.startswith(origin):
+                url = base_url + url[len(origin) :]
+                break
+        return super().request(method, url, *args, **kwargs)
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+
+class TwitterClientRegistry:
+    """
+    LRU-bounded cache of authenticated Twitter clients per account.
+
+    Each entry holds a ``tweepy.Client`` for the v2 endpoints and a
+    ``tweepy.API`` for v1.1 media upload. All of them share one pooled ``requests.Session``, so connections (and
+    their TLS sessions) are kept alive across tweets. Entries are keyed by
+    ``TwitterAccount`` id and remember the tokens they were built with; a
+    token rotation is therefore picked up as a miss even in processes that
+    never saw the explicit ``invalidate`` call.
+    """
+
+    def __init__(self, maxsize, pool_size):
+        self.maxsize = maxsize
+        self.pool_size = pool_size
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._session = None
+        self._consumer_credentials = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def session(self):
+        """The shared keep-alive session, created on first use."""
+        with self._lock:
+            if self._session is None:
+                session = KeepAliveSession(twitter_base_urls())
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def consumer_credentials(self):
+        """The app's consumer key and secret, read from the environment once."""
+        if self._consumer_credentials is None:
+            self._consumer_credentials = (
+                config("TWITTER_CONSUMER_API_KEY"),
+                config("TWITTER_CONSUMER_API_KEY_SECRET"),
+            )
+        return self._consumer_credentials
+
+    def get(self, twitter_account):
+        """Return a ``tweepy.Client`` authenticated as ``twitter_account``."""
+        return self._entry(twitter_account)[1]
+
+    def get_api(self, twitter_account):
+        """Return a ``tweepy.API`` authenticated as ``twitter_account``."""
+        return self._entry(twitter_account)[2]
+
+    def _entry(self, twitter_account):
+        tokens = (twitter_account.access_token, twitter_account.access_token_secret)
+
+        with self._lock:
+            entry = self._clients.get(twitter_account.pk)
+            if entry is not None and entry[0] == tokens:
+                self._clients.move_to_end(twitter_account.pk)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = (tokens, *self._build_clients(*tokens))
+
+        with self._lock:
+            self._clients[twitter_account.pk] = entry
+            self._clients.move_to_end(twitter_account.pk)
+            while len(self._clients) > self.maxsize:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, account_id):
+        """Drop the cached client of ``account_id``, e.g. after its tokens rotate."""
+        with self._lock:
+            if self._clients.pop(account_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._clients),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _build_clients(self, access_token, access_token_secret):
+        # Imported here: the web process loads this module but rarely builds
+        # a client, and tweepy is slow to import
+        import tweepy
+
+        consumer_key, consumer_secret = self.consumer_credentials
+        client = tweepy.Client(
+            consumer_key=consumer_key,
+            consumer_secret=consumer_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret,
+        )
+        client.session = self.session
+        api = tweepy.API(
+            tweepy.OAuth1UserHandler(
+                consumer_key, consumer_secret, access_token, access_token_secret
+            )
+        )
+        api.session = self.session
+        return client, api
+
+
+twitter_clients = TwitterClientRegistry(
+    maxsize=settings.TWITTER_CLIENT_CACHE_SIZE,
+    pool_size=settings.TWITTER_HTTP_POOL_SIZE,
+)
@@ -0,0 +1,183 @@
+"""
+Compaction of the django-q tables behind Schedule mode.
+
+Rows that are never read again pile up there:
+
+- finished schedules: django-q keeps a ``ONCE`` schedule with positive
+  ``repeats`` after starting its task, with ``repeats`` set to 0, so every
+  post ever scheduled leaves one behind;
+- orphaned schedules: pending publish schedules whose posts were all deleted
+  without going through ``Post.delete()`` (a queryset or cascading delete);
+  they would still fire and fail;
+- task results older than ``POSTS_TASK_RESULT_RETENTION_DAYS`` days.
+
+Rows are deleted ``batch_size`` at a time, each batch in its own short
+transaction, so the tables the cluster polls are never locked for long.
+"""
+
+import ast
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_q.models import Schedule, Task
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_FUNCS = ("posts.tasks.post_to_twitter", "posts.tasks.post_to_twitter_batch")
+COMPACTION_SCHEDULE_NAME = "Compact scheduler tables"
+
+
+def _delete_ids(model, ids):
+    with transaction.atomic():
+        _, deleted = model.objects.filter(pk__in=ids).delete()
+    return deleted.get(model._meta.label, 0)
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Delete the rows of ``queryset`` ``batch_size`` at a time.
+
+    Returns:
+        tuple: ``(rows, batches)``, the rows deleted and the batches used.
+    """
+    rows = batches = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return rows, batches
+        rows += _delete_ids(queryset.model, ids)
+        batches += 1
+
+
+def schedule_post_ids(schedule_args):
+    """The post ids a publish schedule's ``args`` hold, or ``None`` if unreadable."""
+    try:
+        args = ast.literal_eval(schedule_args)
+    except (SyntaxError, ValueError):
+        return None
+    post_ids = args if isinstance(args, (list, tuple)) else [args]
+    return post_ids if all(isinstance(i, int) for i in post_ids) else None
+
+
+def delete_orphaned_schedules(batch_size):
+    """
+    Delete pending publish schedules none of whose posts exist any more.
+
+    Posts are looked up from the schedule's ``args`` rather than
+    ``Post.schedule``, so schedules created before the link are only deleted
+    once their posts are really gone.
+
+    Returns:
+        tuple: ``(rows, batches)``, the rows deleted and the batches used.
+    """
+    pending = (
+        Schedule.objects.filter(func__in=PUBLISH_FUNCS)
+        .exclude(repeats=0)
+        .order_by("id")
+    )
+    rows = batches = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            pending.filter(id__gt=last_id).values_list("id", "args")[:batch_size]
+        )
+        if not chunk:
+            return rows, batches
+        last_id = chunk[-1][0]
+        targets = {}
+        for schedule_id, args in chunk:
+            post_ids = schedule_post_ids(args)
+            if post_ids is not None:
+                targets[schedule_id] = post_ids
+        # Batch schedules hold up to POSTS_SCHEDULE_BATCH_SIZE ids each, more
+        # than some databases accept in one query
+        post_ids = sorted({i for post_ids in targets.values() for i in post_ids})
+        existing = set()
+        for i in range(0, len(post_ids), batch_size):
+            existing.update(
+                Post.objects.filter(id__in=post_ids[i : i + batch_size]).values_list(
+                    "id", flat=True
+                )
+            )
+        orphans = [
+            schedule_id
+            for schedule_id, post_ids in targets.items()
+            if existing.isdisjoint(post_ids)
+        ]
+        if orphans:
+            # Only while still pending: a schedule started meanwhile is left
+            # for the next run to collect as finished
+            rows += _delete_ids(
+                Schedule, pending.filter(id__in=orphans).values_list("id", flat=True)
+            )
+            batches += 1
+
+
+def compact(batch_size=None, retention_days=None):
+    """
+    Purge finished and orphaned schedules and old task results.
+
+    ``batch_size`` and ``retention_days`` default to
+    ``POSTS_COMPACTION_BATCH_SIZE`` and ``POSTS_TASK_RESULT_RETENTION_DAYS``.
+    Also runs as a django-q task; see :func:`install_schedule`.
+
+    Returns:
+        dict: The rows reclaimed per kind, their total, the number of delete
+        batches and the time taken.
+    """
+    batch_size = batch_size or settings.POSTS_COMPACTION_BATCH_SIZE
+    if retention_days is None:
+        retention_days = settings.POSTS_TASK_RESULT_RETENTION_DAYS
+    started = time.monotonic()
+
+    finished, finished_batches = delete_in_batches(
+        Schedule.objects.filter(schedule_type=Schedule.ONCE, repeats=0), batch_size
+    )
+    orphaned, orphaned_batches = delete_orphaned_schedules(batch_size)
+    results, results_batches = delete_in_batches(
+        Task.objects.filter(
+            stopped__lt=timezone.now() - timedelta(days=retention_days)
+        ),
+        batch_size,
+    )
+
+    stats = {
+        "finished_schedules": finished,
+        "orphaned_schedules": orphaned,
+        "task_results": results,
+        "rows_reclaimed": finished + orphaned + results,
+        "batches": finished_batches + orphaned_batches + results_batches,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info(
+        f"Compacted scheduler tables: {stats['rows_reclaimed']} rows reclaimed "
+        f"({finished} finished schedules, {orphaned} orphaned schedules, "
+        f"{results} task results) in {stats['elapsed_seconds']}s"
+    )
+    return stats
+
+
+def install_schedule(minutes=None):
+    """
+    Create or update the django-q schedule running :func:`compact` every
+    ``minutes`` (``POSTS_COMPACTION_INTERVAL`` by default).
+
+    Returns:
+        Schedule: The saved schedule.
+    """
+    minutes = minutes or settings.POSTS_COMPACTION_INTERVAL
+    schedule = Schedule.objects.filter(name=COMPACTION_SCHEDULE_NAME).first()
+    if schedule is None:
+        schedule = Schedule(name=COMPACTION_SCHEDULE_NAME, next_run=timezone.now())
+    schedule.func = "posts.compaction.compact"
+    schedule.schedule_type = Schedule.MINUTES
+    schedule.minutes = minutes
+    schedule.repeats = -1
+    schedule.save()
+    return schedule
@@ -0,0 +1,176 @@
+import logging
+import statistics
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .cache import post_cache
+from .clients import twitter_clients
+from .models import Post
+from .tasks import post_to_twitter_batch
+from .transitions import transition
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_ERROR = "Unresolved by the publish task"
+
+
+class DispatcherStats:
+    """
+    Running claim-lag and throughput figures for one dispatcher process.
+
+    Claim lag is the delay between a post's ``scheduled_time`` and the moment
+    it was claimed; only the most recent ``window`` samples are kept.
+    """
+
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.batches = 0
+        self.claimed = 0
+        self.published = 0
+        self.failed = 0
+        self.deferred = 0
+        self.released = 0
+        self.lags = deque(maxlen=window)
+
+    def record_claim(self, rows, claimed_at):
+        self.batches += 1
+        self.claimed += len(rows)
+        self.lags.extend(
+            (claimed_at - scheduled_time).total_seconds() for _, scheduled_time in rows
+        )
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        lags = sorted(self.lags)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "batches": self.batches,
+            "claimed": self.claimed,
+            "published": self.published,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "released": self.released,
+            "posts_per_second": round(self.claimed / elapsed, 3) if elapsed else 0.0,
+            "claim_lag_p50": round(statistics.median(lags), 3) if lags else None,
+            "claim_lag_p95": round(lags[int(len(lags) * 0.95)], 3) if lags else None,
+            "claim_lag_max": round(lags[-1], 3) if lags else None,
+            "twitter_clients": twitter_clients.stats(),
+        }
+
+
+def claim_due_posts(batch_size, now=None):
+    """
+    Atomically claim up to ``batch_size`` due posts for this process.
+
+    A post is due once its ``scheduled_time`` has passed, or, when deferred
+    after a failure, once its ``next_attempt_at`` has.
+
+    Due rows are locked with ``SELECT ... FOR UPDATE SKIP LOCKED`` so that
+    concurrent dispatchers each claim a disjoint set, then flipped to
+    ``publishing`` before the lock is released.
+
+    Returns:
+        list: ``(post_id, scheduled_time)`` tuples, oldest first.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Post.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="scheduled", scheduled_time__lte=now)
+                | Q(status="deferred", next_attempt_at__lte=now)
+            )
+            .order_by("scheduled_time")
+            .values_list("id", "scheduled_time")[:batch_size]
+        )
+        if rows:
+            post_ids = [post_id for post_id, _ in rows]
+            Post.objects.filter(id__in=post_ids).update(
+                status="publishing", claimed_at=now
+            )
+            post_cache.invalidate(post_ids)
+    return rows
+
+
+def release_stale_claims(timeout, now=None):
+    """Return posts claimed more than ``timeout`` seconds ago to ``scheduled``."""
+    now = now or timezone.now()
+    stale = Post.objects.filter(
+        status="publishing", claimed_at__lt=now - timedelta(seconds=timeout)
+    )
+    post_ids = list(stale.values_list("id", flat=True))
+    if not post_ids:
+        return 0
+    return transition(
+        post_ids, "scheduled", from_statuses=["publishing"], claimed_at=None
+    )
+
+
+def publish_claimed(post_ids, stats):
+    """
+    Publish claimed posts and dead-letter any the task left unresolved,
+    recording ``UNRESOLVED_ERROR`` as their error.
+
+    The posts are loaded with one query and their outcomes written with a
+    few bulk UPDATEs, see ``post_to_twitter_batch``.
+    """
+    post_to_twitter_batch(post_ids, claimed=True)
+
+    # Left in publishing when the task crashed before writing their outcome
+    unresolved = transition(
+        post_ids,
+        "dead",
+        from_statuses=["publishing"],
+        attempts=F("attempts") + 1,
+        last_error=UNRESOLVED_ERROR,
+        claimed_at=None,
+    )
+    if unresolved:
+        logger.error(f"Dead-lettered {unresolved} posts left unresolved by the task")
+    counts = dict(
+        Post.objects.filter(id__in=post_ids)
+        .values_list("status")
+        .annotate(Count("id"))
+        .order_by()
+    )
+    stats.published += counts.get("posted", 0)
+    stats.deferred += counts.get("deferred", 0)
+    stats.failed += counts.get("dead", 0)
+
+
+def run_dispatcher(
+    batch_size=None, interval=None, claim_timeout=None, once=False, stats=None
+):
+    """
+    Claim and publish due posts until interrupted.
+
+    The loop only sleeps when a poll finds nothing due, so a backlog is
+    drained at full speed. With ``once`` it stops as soon as nothing is due.
+    """
+    batch_size = batch_size or settings.POSTS_DISPATCH_BATCH_SIZE
+    interval = interval if interval is not None else settings.POSTS_DISPATCH_INTERVAL
+    claim_timeout = claim_timeout or settings.POSTS_DISPATCH_CLAIM_TIMEOUT
+    stats = stats or DispatcherStats()
+    next_release = 0.0
+
+    while True:
+        if time.monotonic() >= next_release:
+            stats.released += release_stale_claims(claim_timeout)
+            next_release = time.monotonic() + claim_timeout / 2
+
+        now = timezone.now()
+        rows = claim_due_posts(batch_size, now)
+        if rows:
+            stats.record_claim(rows, now)
+            publish_claimed([post_id for post_id, _ in rows], stats)
+            continue
+
+        if once:
+            return stats
+        time.sleep(interval)
@@ -0,0 +1,146 @@
+"""
+Parallel publishing of a post to all of its target networks.
+
+Networks are called from one process-wide pool of ``POSTS_FANOUT_WORKERS``
+threads, so publishing a post takes as long as its slowest network rather
+than the sum of all of them, while the number of requests in flight stays
+bounded however many posts are being published. Networks that already have
+a ``posted`` or ``dead`` delivery are skipped: a retry only goes to the
+networks that failed for a reason a retry may fix.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PostDelivery
+from .networks import ADAPTERS
+from .retries import PERMANENT, RATE_LIMITED, TRANSIENT, Failure, classify_exception
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """The fan-out thread pool, started on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_FANOUT_WORKERS,
+                thread_name_prefix="fanout",
+            )
+        return _executor
+
+
+def pending_targets(post):
+    """The targets of ``post`` without a ``posted`` or ``dead`` delivery."""
+    done = {
+        delivery.network
+        for delivery in post.deliveries.all()
+        if delivery.status in ("posted", "dead")
+    }
+    return [network for network in post.targets if network not in done]
+
+
+def combine_failures(failures):
+    """
+    Merge the failures of several networks into the one that decides the
+    post's retry.
+
+    The post is retried while any network may still succeed; rate limits
+    defer it until the latest reset among the limited networks.
+    """
+    if not failures:
+        return None
+    error = "; ".join(
+        f"{network}: {failure.error}" for network, failure in failures.items()
+    )[:1000]
+    kinds = {failure.kind for failure in failures.values()}
+    if RATE_LIMITED in kinds:
+        resets = [failure.reset_at for failure in failures.values() if failure.reset_at]
+        return Failure(RATE_LIMITED, error, max(resets) if resets else None)
+    return Failure(TRANSIENT if TRANSIENT in kinds else PERMANENT, error)
+
+
+def _publish(adapter, post, credentials):
+    try:
+        return adapter.publish(post, credentials), None
+    except Exception as e:
+        return None, e
+
+
+def publish_targets(post, adapters=None):
+    """
+    Publish ``post`` to its pending targets in parallel.
+
+    ``adapters`` maps network names to adapter instances to use instead of
+    new ones. Credentials are looked up in the calling thread; the user's
+    social auth tokens are only loaded if a target needs them.
+
+    Returns:
+        tuple: ``(deliveries, failure)``, the unsaved ``PostDelivery`` of
+        every network attempted and the combined
+        :class:`~posts.retries.Failure` of those that failed, or ``None``.
+    """
+    adapters = adapters or {}
+    social_auths = None
+    outcomes = {}
+    jobs = {}
+    for network in pending_targets(post):
+        try:
+            if network not in ADAPTERS:
+                raise ValueError(f"Unknown network '{network}'")
+            adapter = adapters.get(network) or ADAPTERS[network]()
+            if adapter.provider and social_auths is None:
+                social_auths = {
+                    social_auth.provider: social_auth
+                    for social_auth in post.user.social_auth.all()
+                }
+            jobs[network] = (adapter, adapter.credentials(post, social_auths))
+        except Exception as e:
+            outcomes[network] = (None, e)
+
+    if len(jobs) == 1:
+        # A single network is not worth the thread hop
+        (network, (adapter, credentials)) = jobs.popitem()
+        outcomes[network] = _publish(adapter, post, credentials)
+    # Each call runs in a copy of this context, so its log records carry the
+    # post's log_context fields
+    futures = {
+        network: executor().submit(
+            contextvars.copy_context().run, _publish, adapter, post, credentials
+        )
+        for network, (adapter, credentials) in jobs.items()
+    }
+    for network, future in futures.items():
+        outcomes[network] = future.result()
+
+    now = timezone.now()
+    deliveries = []
+    failures = {}
+    for network, (remote_id, error) in outcomes.items():
+        if error is None:
+            deliveries.append(
+                PostDelivery(
+                    post=post,
+                    network=network,
+                    status="posted",
+                    remote_id=remote_id,
+                    posted_at=now,
+                )
+            )
+            continue
+        failure = failures[network] = classify_exception(error)
+        deliveries.append(
+            PostDelivery(
+                post=post,
+                network=network,
+                status="dead" if failure.kind == PERMANENT else "failed",
+                last_error=failure.error,
+            )
+        )
+    return deliveries, combine_failures(failures)
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.compaction import compact, install_schedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Purge finished and orphaned django-q schedules and old task results "
+        "in bounded batches, and report the rows reclaimed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Rows deleted per batch.")
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            help="Keep task results that finished within this many days.",
+        )
+        parser.add_argument(
+            "--install",
+            action="store_true",
+            help="Run the compaction periodically from the django-q cluster "
+            "instead of now.",
+        )
+        parser.add_argument(
+            "--every", type=int, help="Minutes between periodic runs (with --install)."
+        )
+
+    def handle(self, *args, **options):
+        if options["install"]:
+            schedule = install_schedule(options["every"])
+            self.stdout.write(
+                f"Compaction scheduled every {schedule.minutes} minutes "
+                f"(schedule {schedule.id})"
+            )
+            return
+
+        stats = compact(options["batch_size"], options["retention_days"])
+        self.stdout.write(json.dumps(stats, indent=2))
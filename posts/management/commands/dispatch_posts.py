@@ -0,0 +1,78 @@
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media.metrics import start_exporter
+
+from posts.dispatcher import DispatcherStats, run_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Claim due posts with SELECT ... FOR UPDATE SKIP LOCKED and publish them. "
+        "Several dispatchers can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Posts claimed per query.")
+        parser.add_argument(
+            "--interval", type=float, help="Seconds to sleep when nothing is due."
+        )
+        parser.add_argument(
+            "--claim-timeout",
+            type=int,
+            help="Seconds after which an unfinished claim is released.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no posts are due."
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, help="Serve Prometheus metrics on this port."
+        )
+        parser.add_argument(
+            "--stats-interval",
+            type=float,
+            default=60.0,
+            help="Seconds between stats log lines (0 disables).",
+        )
+
+    def handle(self, *args, **options):
+        # Without it every post also has a django-q schedule, which would
+        # publish it a second time
+        if not settings.POSTS_DISPATCHER_ENABLED:
+            raise CommandError(
+                "Set POSTS_DISPATCHER_ENABLED to run the dispatcher; posts are "
+                "published by their django-q schedules otherwise."
+            )
+        if options["metrics_port"]:
+            start_exporter(options["metrics_port"])
+
+        stats = DispatcherStats()
+        stop = threading.Event()
+
+        if options["stats_interval"] > 0:
+
+            def report():
+                while not stop.wait(options["stats_interval"]):
+                    logger.info(f"Dispatcher stats: {json.dumps(stats.snapshot())}")
+
+            threading.Thread(target=report, daemon=True).start()
+
+        try:
+            run_dispatcher(
+                batch_size=options["batch_size"],
+                interval=options["interval"],
+                claim_timeout=options["claim_timeout"],
+                once=options["once"],
+                stats=stats,
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            self.stdout.write(json.dumps(stats.snapshot(), indent=2))
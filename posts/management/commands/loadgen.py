@@ -0,0 +1,126 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from django_q.models import Schedule
+
+from posts.models import Post
+from posts.scheduling import schedule_posts
+from users.models import TwitterAccount
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Schedule N posts across generated accounts and measure the lag between "
+        "scheduled_time and posted_at. Run a publisher (dispatch_posts, "
+        "publish_async or qcluster) alongside, with TWITTER_API_BASE_URL pointing "
+        "at `python -m benchmarks.fake_twitter`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1000)
+        parser.add_argument("--accounts", type=int, default=10)
+        parser.add_argument(
+            "--delay", type=float, default=30.0, help="Seconds until the posts are due."
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=600.0,
+            help="Seconds to wait for every post to finish after it is due.",
+        )
+        parser.add_argument("--poll", type=float, default=1.0)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the generated users and posts."
+        )
+
+    def handle(self, *args, **options):
+        prefix = f"loadgen-{uuid.uuid4().hex[:8]}"
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}-{i}") for i in range(options["accounts"])]
+        )
+        TwitterAccount.objects.bulk_create(
+            [
+                TwitterAccount(
+                    user=user,
+                    access_token=user.username,
+                    access_token_secret="loadgen",
+                )
+                for user in users
+            ]
+        )
+
+        due = timezone.now() + timedelta(seconds=options["delay"])
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    user=users[i % len(users)],
+                    content=f"{prefix} post {i}",
+                    scheduled_time=due,
+                )
+                for i in range(options["posts"])
+            ],
+            batch_size=1000,
+        )
+        schedules = schedule_posts([(post, due) for post in posts])
+        self.stdout.write(
+            f"Scheduled {len(posts)} posts for {len(users)} accounts, due at "
+            f"{due.isoformat()} ({prefix})"
+        )
+
+        queryset = Post.objects.filter(user__username__startswith=prefix)
+        deadline = due + timedelta(seconds=options["timeout"])
+        while True:
+            counts = dict(
+                queryset.values_list("status").annotate(Count("id")).order_by()
+            )
+            pending = sum(
+                counts.get(status, 0)
+                for status in ("scheduled", "publishing", "deferred")
+            )
+            self.stdout.write(f"{timezone.now().isoformat()} {json.dumps(counts)}")
+            if not pending or timezone.now() > deadline:
+                break
+            time.sleep(options["poll"])
+
+        self.stdout.write(json.dumps(self.report(queryset, counts, due), indent=2))
+
+        if not options["keep"]:
+            Schedule.objects.filter(
+                id__in=[schedule.id for schedule in schedules]
+            ).delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+    def report(self, queryset, counts, due):
+        posted_at = sorted(
+            queryset.filter(status="posted").values_list("posted_at", flat=True)
+        )
+        lags = [(moment - due).total_seconds() for moment in posted_at]
+        report = {
+            "posted": counts.get("posted", 0),
+            "failed": counts.get("failed", 0) + counts.get("dead", 0),
+            "pending": sum(
+                counts.get(status, 0)
+                for status in ("scheduled", "publishing", "deferred")
+            ),
+        }
+        if lags:
+            report.update(
+                {
+                    "lag_p50": round(percentile(lags, 0.50), 3),
+                    "lag_p95": round(percentile(lags, 0.95), 3),
+                    "lag_p99": round(percentile(lags, 0.99), 3),
+                    "lag_max": round(lags[-1], 3),
+                    "posts_per_second": round(len(lags) / max(lags[-1], 1e-3), 3),
+                }
+            )
+        return report
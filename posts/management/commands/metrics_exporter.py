@@ -0,0 +1,24 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from social_media.metrics import start_exporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve Prometheus metrics for the worker processes. Set "
+        "PROMETHEUS_MULTIPROC_DIR for this command and the django-q cluster so "
+        "the samples of every worker are aggregated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=9100)
+
+    def handle(self, *args, **options):
+        start_exporter(options["port"])
+        self.stdout.write(f"Serving metrics on :{options['port']}/metrics")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
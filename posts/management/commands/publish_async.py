@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media.metrics import start_exporter
+
+from posts.async_publisher import AsyncPublisher
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish due posts concurrently with asyncio, within per-account and "
+        "app-wide rate limits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Posts claimed per query.")
+        parser.add_argument(
+            "--interval", type=float, help="Seconds to sleep when nothing is due."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, help="Maximum requests in flight."
+        )
+        parser.add_argument(
+            "--account-rate", help='Per-account limit as "<requests>/<seconds>".'
+        )
+        parser.add_argument(
+            "--app-rate", help='App-wide limit as "<requests>/<seconds>".'
+        )
+        parser.add_argument(
+            "--claim-timeout",
+            type=int,
+            help="Seconds after which an unfinished claim is released.",
+        )
+        parser.add_argument(
+            "--batch-deadline",
+            type=float,
+            help="Seconds after a claim past which its unsent posts are released.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no posts are due."
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, help="Serve Prometheus metrics on this port."
+        )
+
+    def handle(self, *args, **options):
+        # Without it every post also has a django-q schedule, which would
+        # publish it a second time
+        if not settings.POSTS_DISPATCHER_ENABLED:
+            raise CommandError(
+                "Set POSTS_DISPATCHER_ENABLED to run the async publisher; posts "
+                "are published by their django-q schedules otherwise."
+            )
+        if options["metrics_port"]:
+            start_exporter(options["metrics_port"])
+
+        publisher = AsyncPublisher(
+            concurrency=options["concurrency"],
+            account_rate=options["account_rate"],
+            app_rate=options["app_rate"],
+            claim_timeout=options["claim_timeout"],
+            batch_deadline=options["batch_deadline"],
+        )
+        try:
+            asyncio.run(
+                publisher.run(
+                    batch_size=options["batch_size"],
+                    interval=options["interval"],
+                    once=options["once"],
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(json.dumps(publisher.stats.snapshot(), indent=2))
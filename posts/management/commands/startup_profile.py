@@ -0,0 +1,142 @@
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What each kind of process imports before it can serve its first request or
+# task: the WSGI/ASGI application with its URLconf (which loads every API
+# module), and a django-q worker with the task modules it runs
+ENTRY_POINTS = {
+    "web": (
+        "from social_media.wsgi import application\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    "asgi": (
+        "from social_media.asgi import application\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    "worker": (
+        "import django\n"
+        "django.setup()\n"
+        "import django_q.cluster\n"
+        "import posts.tasks, posts.media, posts.compaction\n"
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """
+    Parse the ``-X importtime`` report of a process.
+
+    Returns:
+        list: ``(module, self_us, cumulative_us, depth)`` tuples in report
+        order, depth 0 being the imports made by the entry point itself.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def profile(code):
+    """
+    Run ``code`` in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        tuple: ``(seconds, modules)``, the wall-clock time of the process and
+        its parsed import report.
+
+    Raises:
+        CommandError: If the process failed.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise CommandError(result.stderr.strip().splitlines()[-1])
+    return elapsed, parse_importtime(result.stderr)
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the cold-start time of the web and worker processes with a "
+        "per-package and per-module import-time breakdown."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--entry",
+            action="append",
+            choices=sorted(ENTRY_POINTS),
+            help="Process to profile; repeat for several (default: web and worker).",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=3,
+            help="Cold starts per process; the fastest is reported.",
+        )
+        parser.add_argument(
+            "--top", type=int, default=15, help="Rows per breakdown table."
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            help="Fail if a process takes longer than this many milliseconds "
+            "to start.",
+        )
+
+    def handle(self, *args, **options):
+        over_budget = []
+        for name in options["entry"] or ["web", "worker"]:
+            # The fastest run is the one least disturbed by the machine; the
+            # first one may also be compiling bytecode
+            elapsed, modules = min(
+                profile(ENTRY_POINTS[name]) for _ in range(options["runs"])
+            )
+            self.report(name, elapsed, modules, options["top"])
+            if options["budget"] and elapsed * 1000 > options["budget"]:
+                over_budget.append(f"{name} ({elapsed * 1000:.0f} ms)")
+
+        if over_budget:
+            raise CommandError(
+                f"Over the startup budget of {options['budget']:.0f} ms: "
+                f"{', '.join(over_budget)}"
+            )
+
+    def report(self, name, elapsed, modules, top):
+        imports_us = sum(cumulative for _, _, cumulative, depth in modules if not depth)
+        self.stdout.write(
+            f"{name}: {elapsed * 1000:.0f} ms cold start, "
+            f"{imports_us / 1000:.0f} ms importing {len(modules)} modules"
+        )
+
+        # Self times add up to the total, so packages partition it
+        packages = defaultdict(int)
+        for module, self_us, _, _ in modules:
+            packages[module.partition(".")[0]] += self_us
+        self.stdout.write(f"  {'package':40} {'self ms':>9} {'share':>7}")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[
+            :top
+        ]:
+            self.stdout.write(
+                f"  {package:40} {self_us / 1000:9.1f} "
+                f"{self_us / imports_us if imports_us else 0:7.1%}"
+            )
+
+        self.stdout.write(f"  {'module':40} {'cumulative ms':>13}")
+        for module, _, cumulative_us, _ in sorted(modules, key=lambda m: -m[2])[:top]:
+            self.stdout.write(f"  {module:40} {cumulative_us / 1000:13.1f}")
+        self.stdout.write("")
@@ -0,0 +1,241 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from social_media.queries import track_queries
+
+from .clients import twitter_clients
+from .models import MediaAsset, RemoteMedia
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITIES = (90, 80, 70, 60, 50, 40)
+# Uploaded media ids expire after a day unless Twitter says otherwise
+DEFAULT_MEDIA_TTL = 24 * 60 * 60
+# Don't attach a media id this close to its expiry
+MEDIA_EXPIRY_MARGIN = timedelta(minutes=10)
+
+_executor = None
+
+
+def get_executor():
+    """The process pool used for Pillow work, started on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.POSTS_MEDIA_WORKERS)
+    return _executor
+
+
+def _encode(image, max_bytes):
+    """Encode ``image`` as the smallest acceptable JPEG, or ``None`` if none fit."""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    for quality in JPEG_QUALITIES:
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        if buffer.tell() <= max_bytes:
+            return buffer.getvalue()
+    return None
+
+
+def prepare_image(data, max_dimension, max_bytes):
+    """
+    Resize and recompress image bytes to fit the platform limits.
+
+    Images with transparency stay PNG when that fits within ``max_bytes``;
+    everything else becomes a JPEG at the highest quality that fits, halving
+    the dimensions until one does. Animated images are returned untouched.
+
+    Returns:
+        tuple: ``(data, extension)`` of the prepared variant.
+    """
+    # Imported here: Pillow is only needed by the processes preparing media,
+    # not by the web processes importing this module to enqueue them
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        if getattr(original, "is_animated", False):
+            return data, original.format.lower()
+
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_dimension, max_dimension))
+
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            buffer = io.BytesIO()
+            image.save(buffer, "PNG", optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue(), "png"
+
+        while True:
+            encoded = _encode(image, max_bytes)
+            if encoded is not None:
+                return encoded, "jpg"
+            image = image.resize((max(1, image.width // 2), max(1, image.height // 2)))
+
+
+def _prepare_stored_image(name):
+    with default_storage.open(name, "rb") as f:
+        data = f.read()
+    return prepare_image(
+        data, settings.POSTS_IMAGE_MAX_DIMENSION, settings.POSTS_IMAGE_MAX_BYTES
+    )
+
+
+@track_queries()
+def prepare_media_assets(asset_ids):
+    """
+    Build the upload-ready variant of each media asset.
+
+    Runs as a django-q task, off the request. Images are processed in chunks
+    across the process pool, so a large batch neither holds every image in
+    memory nor serialises on one core. Daemonized workers cannot start child
+    processes and fall back to processing in-line. Assets that already have a
+    prepared variant are skipped.
+    """
+    assets = list(
+        MediaAsset.objects.filter(id__in=asset_ids, prepared_file="").only(
+            "id", "sha256", "file"
+        )
+    )
+    if multiprocessing.current_process().daemon:
+        run = map
+    else:
+        run = get_executor().map
+
+    chunk_size = settings.POSTS_MEDIA_WORKERS * 4
+    for offset in range(0, len(assets), chunk_size):
+        chunk = assets[offset : offset + chunk_size]
+        prepared = run(_prepare_stored_image, [asset.file.name for asset in chunk])
+        for asset, (data, extension) in zip(chunk, prepared):
+            asset.prepared_file.save(
+                f"{asset.sha256}.{extension}", ContentFile(data), save=False
+            )
+            MediaAsset.objects.filter(id=asset.id).update(
+                prepared_file=asset.prepared_file.name
+            )
+
+    logger.info(f"Prepared {len(assets)} media assets")
+
+
+def enqueue_media_preparation(assets):
+    """Queue ``prepare_media_assets`` for unprepared assets once the transaction commits."""
+    asset_ids = sorted({asset.id for asset in assets if not asset.prepared_file})
+    if asset_ids:
+        transaction.on_commit(
+            lambda: async_task("posts.media.prepare_media_assets", asset_ids)
+        )
+
+
+def store_upload(upload):
+    """
+    Store an uploaded image once per distinct content.
+
+    The upload is hashed chunk by chunk; if an asset with the same SHA-256
+    already exists it is reused and nothing is written. Call it inside the
+    transaction that uses the asset, and :func:`discard_uploads` if that
+    transaction fails, so a rolled back asset does not leave its file behind.
+
+    Returns:
+        MediaAsset: The new or existing asset.
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    asset = MediaAsset.objects.filter(sha256=sha256).first()
+    if asset is not None:
+        return asset
+
+    upload.seek(0)
+    extension = os.path.splitext(upload.name)[1].lower()
+    asset = MediaAsset(sha256=sha256, size=upload.size)
+    asset.file.save(f"{sha256[:2]}/{sha256}{extension}", upload, save=False)
+    try:
+        with transaction.atomic():
+            asset.save()
+    except IntegrityError:
+        # The same content was stored concurrently; keep the other copy
+        asset.file.delete(save=False)
+        asset = MediaAsset.objects.get(sha256=sha256)
+    except Exception:
+        asset.file.delete(save=False)
+        raise
+    return asset
+
+
+def discard_uploads(assets):
+    """
+    Delete the files of ``assets`` whose rows no longer exist.
+
+    Run after the transaction that stored them rolled back: the files of new
+    assets go with their rows, while reused assets are left alone.
+    """
+    assets = [asset for asset in assets if asset.file]
+    if not assets:
+        return
+    kept = set(
+        MediaAsset.objects.filter(
+            sha256__in=[asset.sha256 for asset in assets]
+        ).values_list("sha256", flat=True)
+    )
+    for asset in assets:
+        if asset.sha256 not in kept:
+            asset.file.delete(save=False)
+
+
+def upload_media(api, name):
+    """
+    Upload a stored image through the chunked media endpoint.
+
+    Returns:
+        tweepy.models.Media: The uploaded media.
+    """
+    with default_storage.open(name, "rb") as f:
+        return api.media_upload(
+            filename=os.path.basename(name),
+            file=f,
+            chunked=True,
+            media_category="tweet_image",
+        )
+
+
+def get_media_id(twitter_account, asset_id, name):
+    """
+    Return a ``media_id`` for an asset, uploading it only when needed.
+
+    An unexpired upload made by the same account is reused; otherwise the
+    asset's file ``name`` is uploaded and the new id is remembered until
+    Twitter expires it.
+    """
+    now = timezone.now()
+    remote = RemoteMedia.objects.filter(
+        asset_id=asset_id,
+        twitter_account=twitter_account,
+        expires_at__gt=now + MEDIA_EXPIRY_MARGIN,
+    ).first()
+    if remote is not None:
+        return remote.media_id
+
+    media = upload_media(twitter_clients.get_api(twitter_account), name)
+    ttl = getattr(media, "expires_after_secs", None) or DEFAULT_MEDIA_TTL
+    RemoteMedia.objects.update_or_create(
+        asset_id=asset_id,
+        twitter_account=twitter_account,
+        defaults={
+            "media_id": media.media_id_string,
+            "expires_at": now + timedelta(seconds=ttl),
+        },
+    )
+    return media.media_id_string
@@ -1,21 +1,105 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from social_media.celery import app
-import pytz
+from datetime import timezone as dt_timezone
+from .timezones import get_timezone, timezone_choices
 
+# Networks a post can be published to; posts.networks holds their adapters
+NETWORK_CHOICES = [
+    ("twitter", "Twitter"),
+    ("facebook", "Facebook"),
+    ("instagram", "Instagram"),
+    ("linkedin", "LinkedIn"),
+]
 
-class Post(models.Model):
-    TIMEZONE_CHOICES = [(tz, tz) for tz in pytz.all_timezones]
 
+def default_targets():
+    return ["twitter"]
+
+
+class MediaAsset(models.Model):
+    """
+    An uploaded image, stored once per distinct content.
+
+    Files are addressed by the SHA-256 of their bytes, so attaching the same
+    image to many posts keeps a single copy on disk.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to="post_images/")
+    prepared_file = models.ImageField(
+        upload_to="post_images/prepared/",
+        null=True,
+        blank=True,
+        help_text="Copy of the image resized and recompressed for upload.",
+    )
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+    @property
+    def upload_name(self):
+        """Storage name of the variant to upload: the prepared copy once ready."""
+        return self.prepared_file.name or self.file.name
+
+
+class RemoteMedia(models.Model):
+    """
+    A ``media_id`` returned by Twitter for an asset uploaded as an account.
+
+    Twitter only accepts a ``media_id`` from the account that uploaded it and
+    until ``expires_at``; within that window every post reuses the upload.
+    """
+
+    asset = models.ForeignKey(
+        MediaAsset, on_delete=models.CASCADE, related_name="remote_uploads"
+    )
+    twitter_account = models.ForeignKey(
+        "users.TwitterAccount", on_delete=models.CASCADE
+    )
+    media_id = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["asset", "twitter_account"], name="remote_media_unique"
+            )
+        ]
+
+    def __str__(self):
+        return self.media_id
+
+
+class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     image = models.ImageField(upload_to="post_images/", null=True, blank=True)
+    media_asset = models.ForeignKey(
+        MediaAsset,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="posts",
+        help_text="Deduplicated image; ``image`` points at the same file.",
+    )
     scheduled_time = models.DateTimeField(null=True, blank=True)
+    spread_window = models.PositiveIntegerField(
+        default=0,
+        help_text="Seconds after the time asked for the post may be published "
+        "in, to level the load; scheduled_time then holds the slot picked.",
+    )
+    targets = models.JSONField(
+        default=default_targets,
+        help_text="Names of the networks the post is published to.",
+    )
     timezone = models.CharField(
         max_length=50,
-        choices=TIMEZONE_CHOICES,
+        # Callable, so the ~600 zone names are only listed when needed
+        choices=timezone_choices,
         default="UTC",
         help_text="Timezone in which the scheduled time is set.",
     )
@@ -23,13 +107,62 @@ class Post(models.Model):
         max_length=20,
         choices=[
             ("scheduled", "Scheduled"),
+            ("publishing", "Publishing"),
             ("posted", "Posted"),
             ("failed", "Failed"),
+            ("deferred", "Deferred"),
+            ("dead", "Dead letter"),
         ],
         default="scheduled",
     )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, help_text="Failed publish attempts, rate limits excluded."
+    )
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(
+        null=True, blank=True, help_text="When a deferred post is retried."
+    )
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When a dispatcher claimed the post for publishing.",
+    )
+    posted_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the post was published."
+    )
+    schedule = models.ForeignKey(
+        "django_q.Schedule",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="posts",
+        help_text="The django-q schedule that publishes the post, if any.",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's posts, optionally by status
+            models.Index(
+                fields=["user", "scheduled_time", "id"], name="post_user_sched_idx"
+            ),
+            models.Index(
+                fields=["user", "status", "scheduled_time", "id"],
+                name="post_user_status_sched_idx",
+            ),
+            # Due-post scan of the dispatcher
+            models.Index(
+                fields=["scheduled_time"],
+                condition=models.Q(status="scheduled"),
+                name="post_due_idx",
+            ),
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="deferred"),
+                name="post_retry_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.content
 
@@ -42,17 +175,79 @@ class Post(models.Model):
         # Call the clean method to ensure validation
         self.clean()
         super().save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        # Imported here: posts.scheduling depends on this module
+        from .scheduling import cancel_schedules
+
+        post_id, user_id = self.id, self.user_id
+        with transaction.atomic():
+            # Before the delete, which would unlink the post from its schedule
+            cancel_schedules([post_id])
+            result = super().delete(*args, **kwargs)
+        self.invalidate_cache(post_id, user_id)
+        return result
+
+    def invalidate_cache(self, post_id=None, user_id=None):
+        # Imported here: posts.cache depends on this module
+        from .cache import post_cache
+
+        post_cache.invalidate([post_id or self.id], [user_id or self.user_id])
 
     def get_utc_scheduled_time(self):
         """Convert scheduled_time to UTC based on the selected timezone."""
         if self.scheduled_time and self.timezone:
-            tz = pytz.timezone(self.timezone)
-            localized_time = tz.localize(self.scheduled_time)
-            return localized_time.astimezone(pytz.utc)
+            scheduled_time = self.scheduled_time
+            if timezone.is_naive(scheduled_time):
+                scheduled_time = scheduled_time.replace(
+                    tzinfo=get_timezone(self.timezone)
+                )
+            return scheduled_time.astimezone(dt_timezone.utc)
         return None
 
     def schedule_post(self):
         # Use the converted UTC time for scheduling
         utc_scheduled_time = self.get_utc_scheduled_time()
         if utc_scheduled_time:
+            # Imported here: loading Celery costs every process that imports
+            # the models, while only this legacy path sends Celery tasks
+            from social_media.celery import app
+
             app.send_task("post_to_twitter", args=[self.id], eta=utc_scheduled_time)
+
+
+class PostDelivery(models.Model):
+    """
+    The outcome of publishing a post to one of its target networks.
+
+    A retried post is only sent again to the networks whose delivery is
+    neither ``posted`` nor ``dead``.
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="deliveries")
+    network = models.CharField(max_length=20, choices=NETWORK_CHOICES)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("posted", "Posted"),
+            ("failed", "Failed"),
+            ("dead", "Dead letter"),
+        ],
+    )
+    remote_id = models.CharField(
+        max_length=255, blank=True, default="", help_text="The network's post id."
+    )
+    last_error = models.TextField(blank=True, default="")
+    posted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "network"], name="post_delivery_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} {self.network}: {self.status}"
@@ -0,0 +1,18 @@
+"""
+Adapters that publish a post to one social network.
+
+``ADAPTERS`` maps every name a ``Post`` may list in its ``targets`` to the
+adapter class for that network; see ``posts.fanout`` for the publisher that
+sends a post to all of its targets.
+"""
+
+from .base import NetworkAdapter
+from .facebook import FacebookAdapter
+from .instagram import InstagramAdapter
+from .linkedin import LinkedInAdapter
+from .twitter import TwitterAdapter
+
+ADAPTERS = {
+    adapter.name: adapter
+    for adapter in (TwitterAdapter, FacebookAdapter, InstagramAdapter, LinkedInAdapter)
+}
@@ -0,0 +1,82 @@
+import threading
+
+import requests
+from django.conf import settings
+from django.core.files.storage import default_storage
+from requests.adapters import HTTPAdapter
+
+# Seconds to wait for a network's API
+REQUEST_TIMEOUT = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_session():
+    """The keep-alive session shared by the adapters, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.POSTS_FANOUT_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def image_name(post):
+    """Storage name of the post's image to upload, or ``None``."""
+    if post.media_asset_id:
+        return post.media_asset.upload_name
+    return post.image.name or None
+
+
+def read_image(post):
+    with default_storage.open(image_name(post), "rb") as f:
+        return f.read()
+
+
+class NetworkAdapter:
+    """
+    Publishes posts to one network.
+
+    ``credentials`` runs in the calling thread and may query the database;
+    ``publish`` runs in a worker thread of the fan-out pool and should only
+    talk to the network.
+    """
+
+    #: The target name in ``Post.targets``
+    name = None
+    #: The ``social_django`` provider whose tokens the adapter uses
+    provider = None
+
+    def credentials(self, post, social_auths):
+        """
+        Return what ``publish`` needs to authenticate as the post's author:
+        by default the user's ``UserSocialAuth`` of ``provider``.
+
+        ``social_auths`` maps a provider name to the user's
+        ``UserSocialAuth``.
+
+        Raises:
+            ValueError: If the user has not connected this network.
+        """
+        try:
+            return social_auths[self.provider]
+        except KeyError:
+            raise ValueError(f"No connected {self.name} account")
+
+    def publish(self, post, credentials):
+        """
+        Publish ``post`` and return the network's id of the new post.
+
+        Raises:
+            requests.HTTPError: If the network rejected the post; failures
+            are classified by ``posts.retries.classify_exception``.
+        """
+        raise NotImplementedError
+
+    def post(self, url, **kwargs):
+        response = http_session().post(url, timeout=REQUEST_TIMEOUT, **kwargs)
+        response.raise_for_status()
+        return response
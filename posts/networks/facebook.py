@@ -0,0 +1,35 @@
+from django.conf import settings
+
+from .base import NetworkAdapter, image_name, read_image
+
+
+class FacebookAdapter(NetworkAdapter):
+    """
+    Publishes to a Facebook Page through the Graph API.
+
+    Posts go to the page in the ``page_id`` and ``page_access_token`` of the
+    user's social auth data, falling back to the user's own feed.
+    """
+
+    name = "facebook"
+    provider = "facebook"
+
+    def publish(self, post, social_auth):
+        data = social_auth.extra_data
+        target = data.get("page_id", "me")
+        token = data.get("page_access_token") or data["access_token"]
+        base_url = settings.FACEBOOK_GRAPH_BASE_URL.rstrip("/")
+
+        if image_name(post):
+            response = self.post(
+                f"{base_url}/{target}/photos",
+                data={"caption": post.content, "access_token": token},
+                files={"source": read_image(post)},
+            )
+        else:
+            response = self.post(
+                f"{base_url}/{target}/feed",
+                data={"message": post.content, "access_token": token},
+            )
+        created = response.json()
+        return str(created.get("post_id") or created["id"])
@@ -0,0 +1,42 @@
+from django.conf import settings
+
+from .base import NetworkAdapter, image_name
+
+
+class InstagramAdapter(NetworkAdapter):
+    """
+    Publishes to an Instagram professional account through the Graph API.
+
+    Instagram only publishes media, fetched from a public URL: the post's
+    image must be served under ``MEDIA_PUBLIC_BASE_URL``.
+    """
+
+    name = "instagram"
+    provider = "instagram"
+
+    def publish(self, post, social_auth):
+        name = image_name(post)
+        if not name:
+            raise ValueError("Instagram posts need an image")
+        if not settings.MEDIA_PUBLIC_BASE_URL:
+            raise ValueError("MEDIA_PUBLIC_BASE_URL is not set")
+
+        account = social_auth.extra_data.get("ig_user_id") or social_auth.uid
+        token = social_auth.extra_data["access_token"]
+        image_url = f"{settings.MEDIA_PUBLIC_BASE_URL.rstrip('/')}/{name}"
+        base_url = f"{settings.FACEBOOK_GRAPH_BASE_URL.rstrip('/')}/{account}"
+
+        # A media container first, then its publication
+        container = self.post(
+            f"{base_url}/media",
+            data={
+                "image_url": image_url,
+                "caption": post.content,
+                "access_token": token,
+            },
+        ).json()
+        published = self.post(
+            f"{base_url}/media_publish",
+            data={"creation_id": container["id"], "access_token": token},
+        ).json()
+        return str(published["id"])
@@ -0,0 +1,73 @@
+from django.conf import settings
+
+from .base import REQUEST_TIMEOUT, NetworkAdapter, http_session, image_name, read_image
+
+IMAGE_RECIPE = "urn:li:digitalmediaRecipe:feedshare-image"
+UPLOAD_MECHANISM = "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"
+
+
+class LinkedInAdapter(NetworkAdapter):
+    """
+    Shares posts on the user's LinkedIn profile through the UGC Posts API.
+
+    Images are registered as assets and uploaded before the share.
+    """
+
+    name = "linkedin"
+    provider = "linkedin-oauth2"
+
+    def publish(self, post, social_auth):
+        author = f"urn:li:person:{social_auth.uid}"
+        headers = {
+            "Authorization": f"Bearer {social_auth.extra_data['access_token']}",
+            "X-Restli-Protocol-Version": "2.0.0",
+        }
+        base_url = settings.LINKEDIN_API_BASE_URL.rstrip("/")
+
+        content = {
+            "shareCommentary": {"text": post.content},
+            "shareMediaCategory": "NONE",
+        }
+        if image_name(post):
+            asset = self.upload_image(post, author, headers, base_url)
+            content["shareMediaCategory"] = "IMAGE"
+            content["media"] = [{"status": "READY", "media": asset}]
+
+        response = self.post(
+            f"{base_url}/v2/ugcPosts",
+            headers=headers,
+            json={
+                "author": author,
+                "lifecycleState": "PUBLISHED",
+                "specificContent": {"com.linkedin.ugc.ShareContent": content},
+                "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"},
+            },
+        )
+        return response.headers.get("x-restli-id") or response.json()["id"]
+
+    def upload_image(self, post, author, headers, base_url):
+        """Register an image asset, upload the post's image to it, return its URN."""
+        registered = self.post(
+            f"{base_url}/v2/assets?action=registerUpload",
+            headers=headers,
+            json={
+                "registerUploadRequest": {
+                    "recipes": [IMAGE_RECIPE],
+                    "owner": author,
+                    "serviceRelationships": [
+                        {
+                            "relationshipType": "OWNER",
+                            "identifier": "urn:li:userGeneratedContent",
+                        }
+                    ],
+                }
+            },
+        ).json()["value"]
+        upload_url = registered["uploadMechanism"][UPLOAD_MECHANISM]["uploadUrl"]
+        http_session().put(
+            upload_url,
+            data=read_image(post),
+            headers={"Authorization": headers["Authorization"]},
+            timeout=REQUEST_TIMEOUT,
+        ).raise_for_status()
+        return registered["asset"]
@@ -0,0 +1,61 @@
+import logging
+
+from ..clients import twitter_clients
+from ..media import get_media_id, upload_media
+from .base import NetworkAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class TwitterAdapter(NetworkAdapter):
+    """
+    Publishes through the cached tweepy clients of ``posts.clients``.
+
+    ``client`` is an already looked up ``tweepy.Client`` of the post's
+    account, when publishing many posts of one account.
+    """
+
+    name = "twitter"
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def credentials(self, post, social_auths):
+        """
+        Return the post's ``TwitterAccount`` and the ``media_id`` of its
+        stored image, if any.
+
+        The media id is looked up (and remembered) here rather than in
+        ``publish`` since it reads and writes ``RemoteMedia`` rows.
+
+        Raises:
+            TwitterAccount.DoesNotExist: If the user never connected Twitter.
+        """
+        twitter_account = post.user.twitteraccount
+        media_id = None
+        media_asset = post.media_asset
+        if media_asset:
+            # Reuses this account's earlier upload of the same image if unexpired
+            media_id = get_media_id(
+                twitter_account, media_asset.id, media_asset.upload_name
+            )
+            logger.debug("Media attached successfully.")
+        return twitter_account, media_id
+
+    def publish(self, post, credentials):
+        twitter_account, media_id = credentials
+        client = self.client or twitter_clients.get(twitter_account)
+        logger.debug("Acquired Twitter client.")
+
+        media_ids = None
+        if media_id:
+            media_ids = [media_id]
+        elif post.image:
+            api = twitter_clients.get_api(twitter_account)
+            media_ids = [upload_media(api, post.image.name).media_id_string]
+            logger.debug("Media uploaded successfully.")
+
+        response = client.create_tweet(text=post.content, media_ids=media_ids)
+        tweet_id = str(response.data["id"])
+        logger.debug("Tweet posted successfully.", extra={"tweet_id": tweet_id})
+        return tweet_id
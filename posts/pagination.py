@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(scheduled_time, post_id):
+    """Encode the ``(scheduled_time, id)`` position of a row as an opaque cursor."""
+    raw = json.dumps([scheduled_time.isoformat(), post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        scheduled_time, post_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(scheduled_time), int(post_id)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of a ``values()`` queryset ordered by ``(scheduled_time, id)``.
+
+    Rows after the cursor are selected with ``scheduled_time >= t`` so the
+    database can range-scan the composite index, and ties on ``t`` are
+    resolved on ``id``. The cost of a page does not depend on its depth.
+
+    Returns:
+        tuple: ``(rows, next_cursor)``; ``next_cursor`` is ``None`` on the
+        last page.
+    """
+    queryset, limit = _page_queryset(queryset, cursor, limit)
+    return _finish_page(list(queryset), limit)
+
+
+async def akeyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Async version of ``keyset_page``, for async views."""
+    queryset, limit = _page_queryset(queryset, cursor, limit)
+    return _finish_page([row async for row in queryset], limit)
+
+
+def _page_queryset(queryset, cursor, limit):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    queryset = queryset.order_by("scheduled_time", "id")
+
+    if cursor:
+        scheduled_time, post_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(scheduled_time__gt=scheduled_time) | Q(id__gt=post_id),
+            scheduled_time__gte=scheduled_time,
+        )
+    # One extra row tells whether another page follows
+    return queryset[: limit + 1], limit
+
+
+def _finish_page(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["scheduled_time"], last["id"])
+    return rows, next_cursor
@@ -0,0 +1,189 @@
+"""
+Classification and deferral of failed publish attempts.
+
+A failure is one of:
+
+- ``rate_limited``: the API answered 429; retried exactly when the
+  ``x-rate-limit-reset`` header says the window reopens.
+- ``transient``: network errors and 5xx responses; retried with exponential
+  backoff and full jitter, up to ``POSTS_MAX_ATTEMPTS`` attempts.
+- ``permanent``: anything a retry cannot fix (4xx, revoked tokens, missing
+  account or file); the post goes straight to the ``dead`` status.
+"""
+
+import logging
+import random
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import NamedTuple, Optional
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+
+from .models import Post
+from .scheduling import build_post_schedule
+from .transitions import PUBLISHABLE, transition
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+class Failure(NamedTuple):
+    kind: str
+    error: str
+    reset_at: Optional[datetime] = None
+
+
+def classify_status(status_code):
+    """Failure kind of an HTTP error status."""
+    if status_code == 429:
+        return RATE_LIMITED
+    if status_code >= 500 or status_code in (408, 425):
+        return TRANSIENT
+    return PERMANENT
+
+
+def rate_limit_reset(headers):
+    """
+    Parse the ``x-rate-limit-reset`` header (epoch seconds).
+
+    Returns:
+        datetime: The reset moment in UTC, or ``None`` if absent or invalid.
+    """
+    try:
+        reset = int(headers.get("x-rate-limit-reset"))
+    except (TypeError, ValueError):
+        return None
+    return datetime.fromtimestamp(reset, tz=dt_timezone.utc)
+
+
+def classify_exception(exc):
+    """
+    Classify an exception raised while publishing a post.
+
+    Returns:
+        Failure: The failure kind, a short error message and, for rate
+        limits, when the limit resets.
+    """
+    # Imported here: tweepy is slow to import and already loaded by whatever
+    # raised the exception
+    import tweepy
+
+    error = f"{type(exc).__name__}: {exc}"[:1000]
+    if isinstance(exc, tweepy.HTTPException):
+        kind = classify_status(exc.response.status_code)
+        reset_at = (
+            rate_limit_reset(exc.response.headers) if kind == RATE_LIMITED else None
+        )
+        return Failure(kind, error, reset_at)
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        # Raised by the adapters of posts.networks
+        kind = classify_status(exc.response.status_code)
+        reset_at = (
+            rate_limit_reset(exc.response.headers) if kind == RATE_LIMITED else None
+        )
+        return Failure(kind, error, reset_at)
+    if isinstance(exc, (ObjectDoesNotExist, FileNotFoundError, ValueError)):
+        return Failure(PERMANENT, error)
+    # Connection errors (requests.RequestException, tweepy.TweepyException
+    # without a response) and unknown errors are retried up to the limit
+    return Failure(TRANSIENT, error)
+
+
+def backoff_delay(attempt):
+    """Seconds to wait before retry number ``attempt`` (1-based), with full jitter."""
+    ceiling = min(
+        settings.POSTS_RETRY_BACKOFF_MAX,
+        settings.POSTS_RETRY_BACKOFF_BASE * 2 ** (attempt - 1),
+    )
+    return random.uniform(0, ceiling)
+
+
+def plan_retry(failure, attempts, now=None):
+    """
+    Decide what happens to a post after its ``attempts``-th failed attempt.
+
+    Returns:
+        tuple: ``("deferred", next_attempt_at)`` or ``("dead", None)``.
+    """
+    now = now or timezone.now()
+    if failure.kind == RATE_LIMITED:
+        # Waiting for the window to reopen is not the post's fault, so rate
+        # limits do not count towards the attempt limit
+        if failure.reset_at and failure.reset_at > now:
+            return "deferred", failure.reset_at
+        return "deferred", now + timedelta(seconds=backoff_delay(1))
+    if failure.kind == TRANSIENT and attempts < settings.POSTS_MAX_ATTEMPTS:
+        return "deferred", now + timedelta(seconds=backoff_delay(attempts))
+    return "dead", None
+
+
+def schedule_retry(post_id, next_attempt_at):
+    """Create the one-off django-q schedule of a deferred post and link it."""
+    retry = build_post_schedule(Post(id=post_id), next_attempt_at)
+    retry.save()
+    Post.objects.filter(id=post_id).update(schedule=retry)
+
+
+def record_failure(
+    post_id,
+    attempts,
+    failure,
+    now=None,
+    schedule=None,
+    buffer=None,
+    user_id=None,
+    from_statuses=PUBLISHABLE,
+):
+    """
+    Defer or dead-letter a post after a failed attempt.
+
+    ``attempts`` is the number of attempts made before this one. Unless
+    ``schedule`` is false (by default, in Schedule mode) a one-off django-q
+    schedule is created for the retry and linked to the post; publishers that claim posts from the
+    table pick deferred posts up by ``next_attempt_at`` themselves. With a
+    ``buffer`` (a :class:`~posts.transitions.StatusBuffer`) the new status is
+    written when the buffer is flushed, and the retry schedule only created
+    after that, so the retry never finds the post still in its old status;
+    otherwise the status is written only if the post is still in
+    ``from_statuses``.
+
+    Returns:
+        str: The post's new status, ``deferred`` or ``dead``.
+    """
+    attempts += failure.kind != RATE_LIMITED
+    status, next_attempt_at = plan_retry(failure, attempts, now)
+    fields = {
+        "attempts": attempts,
+        "last_error": failure.error,
+        "next_attempt_at": next_attempt_at,
+        "claimed_at": None,
+    }
+    if buffer is not None:
+        buffer.add(post_id, status, user_id, **fields)
+    else:
+        transition(
+            [post_id],
+            status,
+            from_statuses=from_statuses,
+            user_ids=user_id and [user_id],
+            **fields,
+        )
+    if schedule is None:
+        schedule = not settings.POSTS_DISPATCHER_ENABLED
+    if status == "deferred" and schedule:
+        if buffer is not None:
+            buffer.after_flush(lambda: schedule_retry(post_id, next_attempt_at))
+        else:
+            schedule_retry(post_id, next_attempt_at)
+
+    logger.warning(
+        f"Post {post_id} {failure.kind} failure ({failure.error}): {status}"
+        + (f" until {next_attempt_at.isoformat()}" if next_attempt_at else "")
+    )
+    return status
@@ -0,0 +1,166 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django_q.models import Schedule
+
+from .models import Post
+from .spreading import assign_slots, spread_key
+from .transitions import transition
+
+# Statuses of posts still waiting for their publish attempt
+RESCHEDULABLE = ("scheduled", "deferred")
+
+
+def build_post_schedule(post, run_at):
+    """
+    Build (but do not save) the django-q schedule that publishes ``post``.
+
+    ``run_at`` must be a timezone-aware datetime in UTC.
+    """
+    return Schedule(
+        func="posts.tasks.post_to_twitter",
+        name=f"Post to Twitter {post.id}",
+        hook="hooks.print_result",
+        args=post.id,
+        repeats=1,
+        schedule_type=Schedule.ONCE,
+        next_run=run_at,
+    )
+
+
+def build_batch_schedule(post_ids, run_at):
+    """
+    Build (but do not save) the django-q schedule that publishes ``post_ids``
+    with one ``post_to_twitter_batch`` task.
+    """
+    return Schedule(
+        func="posts.tasks.post_to_twitter_batch",
+        name=f"Post to Twitter {post_ids[0]} and {len(post_ids) - 1} more",
+        hook="hooks.print_result",
+        # Evaluated with ast.literal_eval, so the list is passed as one argument
+        args=repr(list(post_ids)),
+        repeats=1,
+        schedule_type=Schedule.ONCE,
+        next_run=run_at,
+    )
+
+
+def schedule_posts(entries, batch_size=None):
+    """
+    Create the django-q schedules for ``(post, run_at)`` pairs in one insert.
+
+    Posts due at the same moment share schedules of up to ``batch_size``
+    posts (``POSTS_SCHEDULE_BATCH_SIZE`` by default), each published by one
+    task; a post due alone gets its own ``post_to_twitter`` schedule. Every
+    post is then linked to its schedule through ``Post.schedule``, with one
+    more ``UPDATE``.
+
+    Nothing is created when ``POSTS_DISPATCHER_ENABLED`` is set, since the
+    dispatcher then claims due posts straight from the ``Post`` table.
+    """
+    if settings.POSTS_DISPATCHER_ENABLED:
+        return []
+    batch_size = batch_size or settings.POSTS_SCHEDULE_BATCH_SIZE
+
+    due = defaultdict(list)
+    for post, run_at in entries:
+        due[run_at].append(post)
+    schedules = []
+    batches = []
+    for run_at, posts in due.items():
+        for i in range(0, len(posts), batch_size):
+            batch = posts[i : i + batch_size]
+            if len(batch) == 1:
+                schedules.append(build_post_schedule(batch[0], run_at))
+            else:
+                schedules.append(
+                    build_batch_schedule([post.id for post in batch], run_at)
+                )
+            batches.append(batch)
+    schedules = Schedule.objects.bulk_create(schedules)
+
+    linked = []
+    for schedule, batch in zip(schedules, batches):
+        for post in batch:
+            post.schedule = schedule
+            linked.append(post)
+    Post.objects.bulk_update(linked, ["schedule"], batch_size=batch_size)
+    return schedules
+
+
+def cancel_schedules(post_ids):
+    """
+    Stop the django-q schedules linked to ``post_ids`` from publishing them.
+
+    A schedule left without posts is deleted; a batch schedule shared with
+    other posts is rewritten to publish only those. The schedules are locked
+    with ``SELECT ... FOR UPDATE``, like the django-q scheduler does before
+    starting them, so a schedule is either cancelled or started, never both.
+    Run inside a transaction, before deleting the posts.
+
+    Returns:
+        int: The number of schedules deleted.
+    """
+    post_ids = list(post_ids)
+    schedule_ids = set(
+        Post.objects.filter(id__in=post_ids, schedule__isnull=False).values_list(
+            "schedule_id", flat=True
+        )
+    )
+    if not schedule_ids:
+        return 0
+
+    schedules = list(Schedule.objects.select_for_update().filter(id__in=schedule_ids))
+    remaining = defaultdict(list)
+    for schedule_id, post_id in (
+        Post.objects.filter(schedule_id__in=schedule_ids)
+        .exclude(id__in=post_ids)
+        .order_by("id")
+        .values_list("schedule_id", "id")
+    ):
+        remaining[schedule_id].append(post_id)
+
+    emptied = [schedule.id for schedule in schedules if not remaining[schedule.id]]
+    for schedule in schedules:
+        if remaining[schedule.id] and schedule.repeats != 0:
+            schedule.args = repr(remaining[schedule.id])
+            schedule.save(update_fields=["args"])
+    if emptied:
+        Schedule.objects.filter(id__in=emptied).delete()
+    return len(emptied)
+
+
+def reschedule_post(post, run_at, timezone_name, spread_window=None):
+    """
+    Move ``post`` to ``run_at`` (aware, in UTC), replacing its schedule.
+
+    With a spread window (``spread_window``, or the post's own) the post gets
+    a new slot within it after ``run_at``. A deferred post goes back to
+    ``scheduled`` and waits for the new time instead of its retry. The status
+    change, the cancellation of the old schedule and the new schedule are
+    committed together.
+
+    Returns:
+        bool: Whether the post was rescheduled; ``False`` once it is being
+        published or has been published, failed or dead-lettered.
+    """
+    if spread_window is None:
+        spread_window = post.spread_window
+    with transaction.atomic():
+        (run_at,) = assign_slots([(spread_key(post), run_at, spread_window)])
+        moved = transition(
+            [post.id],
+            "scheduled",
+            from_statuses=RESCHEDULABLE,
+            user_ids=[post.user_id],
+            scheduled_time=run_at,
+            spread_window=spread_window,
+            timezone=timezone_name,
+            next_attempt_at=None,
+        )
+        if not moved:
+            return False
+        cancel_schedules([post.id])
+        schedule_posts([(post, run_at)])
+    return True
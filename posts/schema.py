@@ -1,22 +1,83 @@
-from pydantic import BaseModel, field_validator
+from typing import List, Optional
+from django.conf import settings
+from pydantic import BaseModel, PrivateAttr, field_validator, model_validator
 from datetime import datetime
 from django.utils import timezone as tm
+from .models import NETWORK_CHOICES, default_targets
+from .timezones import is_valid_timezone, parse_local_time, to_utc
 
+NETWORKS = dict(NETWORK_CHOICES)
 
-class PostCreateSchema(BaseModel):
-    content: str
+
+def validate_targets(targets):
+    """Reject unknown or missing networks and drop duplicates, keeping the order."""
+    if not targets:
+        raise ValueError("Select at least one network.")
+    for network in targets:
+        if network not in NETWORKS:
+            raise ValueError(f"Unknown network '{network}'.")
+    return list(dict.fromkeys(targets))
+
+
+def validate_spread_window(window):
+    """Reject windows that are negative or longer than ``POSTS_SPREAD_MAX_WINDOW``."""
+    if window is not None and not 0 <= window <= settings.POSTS_SPREAD_MAX_WINDOW:
+        raise ValueError(
+            f"The spread window must be 0 to {settings.POSTS_SPREAD_MAX_WINDOW} seconds."
+        )
+    return window
+
+
+class PostScheduleSchema(BaseModel):
     scheduled_time: str
     timezone: str
+    # Seconds the post may be delayed by to level the load; None keeps the
+    # post's window, or uses the user's default for a new post
+    spread_window: Optional[int] = None
+    # Set by validation so the view never parses the time again
+    _scheduled_utc: Optional[datetime] = PrivateAttr(default=None)
+
+    @field_validator("timezone")
+    def validate_timezone(cls, value):
+        if not is_valid_timezone(value):
+            raise ValueError(f"Unknown timezone '{value}'.")
+        return value
+
+    check_spread_window = field_validator("spread_window")(validate_spread_window)
 
-    @field_validator("scheduled_time")
-    def validate_scheduled_time(cls, value):
+    @model_validator(mode="after")
+    def validate_scheduled_time(self):
+        # Parse once, in the post's own timezone
         try:
-            # Convert to datetime
-            scheduled_time = datetime.strptime(value, "%Y-%m-%d %H:%M")
-            # Make it timezone-aware
-            scheduled_time = tm.make_aware(scheduled_time)
-            if scheduled_time < tm.now():
-                raise ValueError("Scheduled time must be in the future.")
-            return value  # Return as str, only if needed in this format
-        except Exception:
+            scheduled_time = parse_local_time(self.scheduled_time)
+        except ValueError:
             raise ValueError('Invalid time format. Use "YYYY-MM-DD HH:MM".')
+        self._scheduled_utc = to_utc(scheduled_time, self.timezone)
+        if self._scheduled_utc < tm.now():
+            raise ValueError("Scheduled time must be in the future.")
+        return self
+
+    @property
+    def scheduled_utc(self):
+        """The scheduled time as an aware UTC datetime."""
+        return self._scheduled_utc
+
+
+class PostCreateSchema(PostScheduleSchema):
+    content: str
+    targets: List[str] = default_targets()
+
+    check_targets = field_validator("targets")(validate_targets)
+
+
+class PostBatchItemSchema(BaseModel):
+    content: str
+    scheduled_time: str
+    timezone: str
+    # Index into the uploaded ``images`` list of a multipart batch request
+    image: Optional[int] = None
+    targets: List[str] = default_targets()
+    spread_window: Optional[int] = None
+
+    check_targets = field_validator("targets")(validate_targets)
+    check_spread_window = field_validator("spread_window")(validate_spread_window)
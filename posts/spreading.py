@@ -0,0 +1,157 @@
+"""
+Load-leveling of scheduled posts.
+
+Times are set to the minute, so posts cluster on round times and thousands of
+them can become due in the same second. A post with a spread window (its own
+``spread_window``, or its user's ``SchedulingPreference``) is given a dispatch
+slot instead: the least loaded minute of the ``window`` seconds after the time
+asked for, counting the posts already due in each, at an offset within that
+minute derived from a hash of the post. The slot is stored as the post's
+``scheduled_time``, which the dispatcher, the django-q schedules and the async
+publisher all go by.
+
+Slots are deterministic: the same post and the same load give the same slot.
+Offsets are multiples of ``POSTS_SPREAD_SLOT_SECONDS``, so posts sharing a
+slot still share a batch schedule.
+"""
+
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import TruncMinute
+
+from users.models import SchedulingPreference
+
+from .models import Post
+
+MINUTE = timedelta(minutes=1)
+
+
+def floor_minute(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def default_spread_window(user):
+    """The spread window ``user`` set for their posts, 0 if none."""
+    return (
+        SchedulingPreference.objects.filter(user=user)
+        .values_list("spread_window", flat=True)
+        .first()
+        or 0
+    )
+
+
+def spread_key(post):
+    """
+    What a post's jitter is derived from.
+
+    Known before the post is saved, so slots are picked before the insert.
+    """
+    return f"{post.user_id}:{post.content}"
+
+
+def minute_load(start, end):
+    """
+    The posts due per minute between ``start`` and ``end``.
+
+    Only posts still ``scheduled`` are counted; deferred retries are not.
+
+    Returns:
+        dict: Minute (aware, UTC) to its number of posts; minutes without
+        posts are left out.
+    """
+    return dict(
+        Post.objects.filter(
+            status="scheduled", scheduled_time__gte=start, scheduled_time__lt=end
+        )
+        .annotate(minute=TruncMinute("scheduled_time", tzinfo=dt_timezone.utc))
+        .values("minute")
+        .annotate(posts=Count("id"))
+        .order_by()
+        .values_list("minute", "posts")
+    )
+
+
+def slot_offset(key, span, step):
+    """A deterministic offset in ``[0, span)`` seconds for ``key``, a multiple of ``step``."""
+    jitter = zlib.crc32(key.encode()) % span
+    return jitter - jitter % step
+
+
+def assign_slots(entries, step=None):
+    """
+    Pick the dispatch slot of each ``(key, run_at, window)`` entry.
+
+    ``run_at`` is the aware UTC time asked for and ``window`` the seconds the
+    post may be delayed by, 0 for none. The load of all the windows is read
+    with one query and updated as each post is placed, so posts due together
+    are spread evenly. Ties go to the earliest minute, so nothing is delayed
+    more than needed.
+
+    Returns:
+        list: The slot of each entry, in order; ``run_at`` itself when it has
+        no window.
+    """
+    step = step or settings.POSTS_SPREAD_SLOT_SECONDS
+    slots = [run_at for _, run_at, _ in entries]
+    spread = [i for i, (_, _, window) in enumerate(entries) if window]
+    if not spread:
+        return slots
+
+    ends = {i: entries[i][1] + timedelta(seconds=entries[i][2]) for i in spread}
+    load = defaultdict(
+        int,
+        minute_load(
+            min(floor_minute(entries[i][1]) for i in spread), max(ends.values())
+        ),
+    )
+    for i in spread:
+        key, run_at, _ = entries[i]
+        minutes = []
+        minute = floor_minute(run_at)
+        while minute < ends[i]:
+            minutes.append(minute)
+            minute += MINUTE
+        minute = min(minutes, key=load.__getitem__)
+
+        start = max(minute, run_at)
+        span = (min(minute + MINUTE, ends[i]) - start).total_seconds()
+        offset = slot_offset(f"{key}:{minute.isoformat()}", max(int(span), 1), step)
+        slots[i] = start + timedelta(seconds=offset)
+        load[minute] += 1
+    return slots
+
+
+def place_posts(posts):
+    """
+    Move each post with a ``spread_window`` to its slot, in place.
+
+    ``scheduled_time`` holds the time asked for on entry and the slot on
+    return. Call before saving the posts.
+    """
+    slots = assign_slots(
+        [(spread_key(post), post.scheduled_time, post.spread_window) for post in posts]
+    )
+    for post, slot in zip(posts, slots):
+        post.scheduled_time = slot
+    return posts
+
+
+def load_histogram(start, minutes):
+    """
+    The posts due in each of the ``minutes`` minutes from ``start``.
+
+    Returns:
+        list: ``{"minute", "posts"}`` dicts in time order, empty minutes
+        included.
+    """
+    start = floor_minute(start)
+    load = minute_load(start, start + minutes * MINUTE)
+    return [
+        {"minute": start + i * MINUTE, "posts": load.get(start + i * MINUTE, 0)}
+        for i in range(minutes)
+    ]
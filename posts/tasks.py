@@ -1,45 +1,185 @@
+from collections import Counter, defaultdict
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from social_media.log import log_context
+from social_media.metrics import record_publish
+from social_media.queries import track_queries
 from .models import Post
-import tweepy
-from decouple import config
+from .clients import twitter_clients
+from .fanout import publish_targets
+from .networks import TwitterAdapter
+from .retries import classify_exception, record_failure
+from .transitions import CLAIMED, DUE, StatusBuffer, save_deliveries, transition
 import logging
+import time
 
 
 logger = logging.getLogger(__name__)
 
 
-def post_to_twitter(post_id):
-    try:
-        logger.info(f"Post id - {post_id} {type(post_id)} started. Processing tweet. ")
-        scheduled_post = Post.objects.get(id=post_id)
-        twitter_account = scheduled_post.user.twitteraccount
-
-        # Check if access token is valid, otherwise refresh it
-        if not twitter_account:
-            logger.error("Failed to get access token")
-            raise Exception("Failed to get access token")
-
-        logger.info("Access token acquired successfully.")
-
-        client = tweepy.Client(
-            consumer_key=config("TWITTER_CONSUMER_API_KEY"),
-            consumer_secret=config("TWITTER_CONSUMER_API_KEY_SECRET"),
-            access_token=twitter_account.access_token,
-            access_token_secret=twitter_account.access_token_secret,
-        )
+def with_credentials(posts):
+    """
+    Load posts together with their user, Twitter account, media asset and
+    earlier deliveries.
+    """
+    return posts.select_related("user__twitteraccount", "media_asset").prefetch_related(
+        "deliveries"
+    )
+
 
-        logger.info("Instantiated Twitter client.")
+# The post with its deliveries and their outcome, plus the social auth tokens
+# and the media_id lookup and upload record a post may need
+@track_queries(budget=8)
+def post_to_twitter(post_id, buffer=None):
+    """
+    Publish one post to all of its target networks and record the outcome.
 
+    Runs from a django-q schedule, so only a post still due (``scheduled``
+    or ``deferred``) is published; one claimed by a dispatcher is left to it.
+    With a ``buffer`` (a :class:`~posts.transitions.StatusBuffer`) the new
+    status is written when the caller flushes it instead of right away.
+    """
+    with log_context(post_id=post_id):
+        logger.debug("Publishing post.")
         try:
-            client.create_tweet(text=scheduled_post.content)
-            logger.info("Tweet posted successfully.")
-            scheduled_post.status = "posted"
-        except tweepy.TweepError as e:
-            scheduled_post.status = "failed"
-            logger.error(f"Tweepy Error posting tweet: {str(e)}")
-        finally:
-            scheduled_post.save()
+            scheduled_post = with_credentials(Post.objects).get(id=post_id)
+        except Exception as e:
+            logger.error(f"Error in post_to_twitter task: {str(e)} semi")
+            record_publish("error")
+            return "error"
+        return publish_post(scheduled_post, buffer)
+
+
+@track_queries()
+def post_to_twitter_batch(post_ids, claimed=False):
+    """
+    Publish many posts, loaded with their credentials in one query.
+
+    Posts are published account by account, each group reusing one Twitter
+    client, and their outcomes are written together once the batch is done.
+    As a django-q task only due posts are published; a dispatcher passes
+    ``claimed`` to publish the posts it claimed instead. Posts that no longer
+    exist or are no longer in those statuses are skipped.
+
+    Returns:
+        dict: The number of posts per outcome.
+    """
+    from_statuses = CLAIMED if claimed else DUE
+    posts = with_credentials(
+        Post.objects.filter(id__in=post_ids, status__in=from_statuses)
+    ).order_by("scheduled_time")
+    # One query for the tokens of every user publishing beyond Twitter
+    prefetch_related_objects(
+        [post for post in posts if post.targets != ["twitter"]], "user__social_auth"
+    )
+    by_account = defaultdict(list)
+    for post in posts:
+        twitter_account = getattr(post.user, "twitteraccount", None)
+        by_account[twitter_account and twitter_account.pk].append(post)
+
+    outcomes = Counter()
+    with StatusBuffer(from_statuses=from_statuses) as buffer:
+        for account_id, account_posts in by_account.items():
+            # Posts without an account fail in publish_post
+            client = account_id and twitter_clients.get(
+                account_posts[0].user.twitteraccount
+            )
+            for post in account_posts:
+                outcomes[publish_post(post, buffer, client, from_statuses)] += 1
+
+    skipped = len(set(post_ids)) - sum(outcomes.values())
+    for _ in range(skipped):
+        record_publish("skipped")
+    if skipped:
+        outcomes["skipped"] = skipped
+    logger.info(f"Published batch of {len(post_ids)} posts: {dict(outcomes)}")
+    return dict(outcomes)
+
+
+def publish_post(scheduled_post, buffer=None, client=None, from_statuses=DUE):
+    """
+    Publish a loaded post to its targets, optionally with the ``client`` of
+    its Twitter account.
 
-        logger.info(f"Post Task ID: {scheduled_post.id} completed.")
+    The post is skipped unless its status is in ``from_statuses``, and its
+    outcome only written while it still is.
+
+    Records logged meanwhile carry the post's ``post_id``, ``user_id`` and
+    Twitter ``account``.
+
+    Returns:
+        str: The outcome: ``posted``, ``deferred``, ``dead`` or ``skipped``.
+    """
+    twitter_account = getattr(scheduled_post.user, "twitteraccount", None)
+    with log_context(
+        post_id=scheduled_post.id,
+        user_id=scheduled_post.user_id,
+        account=twitter_account and twitter_account.pk,
+    ):
+        return _publish_post(scheduled_post, buffer, client, from_statuses)
+
+
+def _publish_post(scheduled_post, buffer, client, from_statuses):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        if scheduled_post.status not in from_statuses:
+            # A duplicate task, or one for a post claimed by another process
+            logger.info(f"Post is {scheduled_post.status}, skipping.")
+            outcome = "skipped"
+            return outcome
+
+        adapters = {"twitter": TwitterAdapter(client)} if client else None
+        deliveries, failure = publish_targets(scheduled_post, adapters)
+        if buffer is not None:
+            buffer.add_deliveries(deliveries)
+        else:
+            save_deliveries(deliveries)
+        if failure is not None:
+            # Rate limits and transient errors are deferred, the rest dead-lettered
+            outcome = record_failure(
+                scheduled_post.id,
+                scheduled_post.attempts,
+                failure,
+                buffer=buffer,
+                user_id=scheduled_post.user_id,
+                from_statuses=from_statuses,
+            )
+            return outcome
+
+        scheduled_post.status = "posted"
+        scheduled_post.posted_at = timezone.now()
+        fields = {"posted_at": scheduled_post.posted_at, "next_attempt_at": None}
+        if buffer is not None:
+            buffer.add(scheduled_post.id, "posted", scheduled_post.user_id, **fields)
+        else:
+            transition(
+                [scheduled_post.id],
+                "posted",
+                from_statuses=from_statuses,
+                user_ids=[scheduled_post.user_id],
+                **fields,
+            )
+
+        outcome = scheduled_post.status
+        logger.info("Post published.")
 
     except Exception as e:
         logger.error(f"Error in post_to_twitter task: {str(e)} semi")
+        # Rate limits and transient errors are deferred, the rest dead-lettered
+        outcome = record_failure(
+            scheduled_post.id,
+            scheduled_post.attempts,
+            classify_exception(e),
+            buffer=buffer,
+            user_id=scheduled_post.user_id,
+            from_statuses=from_statuses,
+        )
+    finally:
+        record_publish(
+            outcome,
+            time.perf_counter() - start,
+            scheduled_post.scheduled_time,
+            scheduled_post.posted_at,
+        )
+    return outcome
@@ -0,0 +1,504 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import requests
+import tweepy
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django_q.models import Schedule, Task
+
+from users.models import TwitterAccount
+
+from . import async_publisher
+from .async_publisher import AsyncPublisher, PublishStats
+from .clients import twitter_clients
+from .compaction import compact
+from .dispatcher import (
+    UNRESOLVED_ERROR,
+    DispatcherStats,
+    claim_due_posts,
+    publish_claimed,
+    release_stale_claims,
+    run_dispatcher,
+)
+from .models import Post
+from .retries import (
+    PERMANENT,
+    RATE_LIMITED,
+    TRANSIENT,
+    Failure,
+    classify_exception,
+    classify_status,
+    plan_retry,
+    record_failure,
+)
+from .scheduling import schedule_posts
+from .tasks import post_to_twitter, post_to_twitter_batch
+from .transitions import StatusBuffer
+
+
+class PostTestCase(TestCase):
+    """Creates a user with a Twitter account whose client is a stub."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="secret")
+        self.account = TwitterAccount.objects.create(
+            user=self.user, access_token="token", access_token_secret="secret"
+        )
+        self.twitter = mock.Mock()
+        self.twitter.create_tweet.return_value = SimpleNamespace(data={"id": "100"})
+        twitter_clients.clear()
+        self.addCleanup(twitter_clients.clear)
+        patcher = mock.patch.object(
+            twitter_clients, "_build_clients", return_value=(self.twitter, mock.Mock())
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, user=None, **fields):
+        """A post due now, saved without the model's future-time validation."""
+        fields.setdefault("scheduled_time", timezone.now() - timedelta(seconds=1))
+        (post,) = Post.objects.bulk_create(
+            [Post(user=user or self.user, content="Due", **fields)]
+        )
+        return post
+
+    def status(self, post):
+        return Post.objects.values_list("status", flat=True).get(id=post.id)
+
+
+class DispatcherTests(PostTestCase):
+    def test_claims_due_posts_once(self):
+        now = timezone.now()
+        due = self.post()
+        retry = self.post(status="deferred", next_attempt_at=now - timedelta(seconds=1))
+        self.post(scheduled_time=now + timedelta(hours=1))
+        self.post(status="deferred", next_attempt_at=now + timedelta(hours=1))
+
+        rows = claim_due_posts(10, now)
+
+        self.assertCountEqual([post_id for post_id, _ in rows], [due.id, retry.id])
+        self.assertEqual(
+            set(
+                Post.objects.filter(id__in=[due.id, retry.id]).values_list(
+                    "status", "claimed_at"
+                )
+            ),
+            {("publishing", now)},
+        )
+        self.assertEqual(claim_due_posts(10, now), [])
+
+    def test_releases_only_stale_claims(self):
+        now = timezone.now()
+        stale = self.post(status="publishing", claimed_at=now - timedelta(minutes=10))
+        fresh = self.post(status="publishing", claimed_at=now - timedelta(seconds=10))
+
+        self.assertEqual(release_stale_claims(300, now), 1)
+        self.assertEqual(self.status(stale), "scheduled")
+        self.assertEqual(self.status(fresh), "publishing")
+
+    def test_publishes_claimed_posts(self):
+        post = self.post()
+        orphan = self.post(user=User.objects.create_user(username="unconnected"))
+        rows = claim_due_posts(10)
+        stats = DispatcherStats()
+
+        publish_claimed([post_id for post_id, _ in rows], stats)
+
+        self.assertEqual(self.status(post), "posted")
+        self.assertEqual(self.status(orphan), "dead")
+        self.assertEqual((stats.published, stats.failed), (1, 1))
+        self.twitter.create_tweet.assert_called_once()
+
+    def test_unresolved_posts_are_dead_lettered_with_a_reason(self):
+        post = self.post()
+        claim_due_posts(10)
+        stats = DispatcherStats()
+
+        with mock.patch("posts.dispatcher.post_to_twitter_batch"):
+            with self.assertLogs("posts.dispatcher", "ERROR"):
+                publish_claimed([post.id], stats)
+
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.status, post.attempts, post.last_error, post.claimed_at),
+            ("dead", 1, UNRESOLVED_ERROR, None),
+        )
+        self.assertEqual(stats.failed, 1)
+
+    def test_run_releases_and_publishes_abandoned_claims(self):
+        post = self.post(
+            status="publishing", claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        stats = run_dispatcher(claim_timeout=300, once=True)
+        self.assertEqual(stats.released, 1)
+        self.assertEqual(self.status(post), "posted")
+
+    @override_settings(POSTS_DISPATCHER_ENABLED=False)
+    def test_publishers_require_dispatcher_mode(self):
+        for command in ("dispatch_posts", "publish_async"):
+            with self.subTest(command=command):
+                with self.assertRaisesMessage(
+                    CommandError, "Set POSTS_DISPATCHER_ENABLED"
+                ):
+                    call_command(command, "--once")
+
+
+def tweet_created(request):
+    return httpx.Response(201, json={"data": {"id": "100"}})
+
+
+class AsyncPublisherTests(PostTestCase):
+    def publish(self, publisher, post_ids, handler=tweet_created):
+        """Run ``publish_batch`` against ``handler``; return the requests sent."""
+        sent = []
+
+        def record(request):
+            sent.append(request)
+            return handler(request)
+
+        async def publish_batch():
+            transport = httpx.MockTransport(record)
+            async with httpx.AsyncClient(transport=transport) as client:
+                await publisher.publish_batch(client, post_ids)
+
+        async_to_sync(publish_batch)()
+        return sent
+
+    def test_publishes_claimed_posts(self):
+        posts = [self.post() for _ in range(3)]
+        claim_due_posts(10)
+        publisher = AsyncPublisher()
+
+        self.assertEqual(len(self.publish(publisher, [post.id for post in posts])), 3)
+
+        self.assertEqual(set(Post.objects.values_list("status", flat=True)), {"posted"})
+        self.assertEqual(publisher.stats.snapshot()["posted"], 3)
+
+    def test_deadline_releases_unsent_posts(self):
+        posts = [self.post() for _ in range(4)]
+        claim_due_posts(10)
+        publisher = AsyncPublisher(account_rate="2/1000", batch_deadline=0.2)
+
+        self.publish(publisher, [post.id for post in posts])
+
+        self.assertEqual(
+            sorted(Post.objects.values_list("status", flat=True)),
+            ["posted", "posted", "scheduled", "scheduled"],
+        )
+        self.assertFalse(
+            Post.objects.filter(status="scheduled", claimed_at__isnull=False).exists()
+        )
+        self.assertEqual((publisher.stats.posted, publisher.stats.released), (2, 2))
+
+    def test_throttled_account_does_not_use_app_tokens(self):
+        posts = [self.post() for _ in range(3)]
+        claim_due_posts(10)
+        publisher = AsyncPublisher(
+            account_rate="1/1000", app_rate="10/1000", batch_deadline=0.2
+        )
+
+        self.publish(publisher, [post.id for post in posts])
+
+        self.assertEqual(publisher.stats.released, 2)
+        self.assertLess(publisher.app_bucket.tokens, 9.1)
+        self.assertGreaterEqual(publisher.app_bucket.tokens, 9)
+
+    def test_post_whose_claim_was_lost_is_not_sent(self):
+        post = self.post()
+        claim_due_posts(10)
+        load_claimed_posts = async_publisher.load_claimed_posts
+
+        def load_then_lose_claim(post_ids):
+            posts = load_claimed_posts(post_ids)
+            # Released as stale and claimed again by another process
+            Post.objects.filter(id=post.id).update(
+                claimed_at=timezone.now() + timedelta(seconds=1)
+            )
+            return posts
+
+        publisher = AsyncPublisher()
+        with mock.patch.object(
+            async_publisher, "load_claimed_posts", load_then_lose_claim
+        ):
+            self.assertEqual(self.publish(publisher, [post.id]), [])
+
+        self.assertEqual(self.status(post), "publishing")
+        self.assertEqual(publisher.stats.posted, 0)
+
+    def test_claim_is_checked_after_the_media_upload(self):
+        post = self.post(image="post_images/image.png")
+        claim_due_posts(10)
+        calls = []
+
+        def upload(post):
+            calls.append("upload")
+            return "200"
+
+        def claim_lost(post):
+            calls.append("claim")
+            return False
+
+        publisher = AsyncPublisher()
+        with mock.patch.object(async_publisher, "post_media_id", upload):
+            with mock.patch.object(async_publisher, "still_claimed", claim_lost):
+                self.assertEqual(self.publish(publisher, [post.id]), [])
+
+        self.assertEqual(calls, ["upload", "claim"])
+        self.assertEqual(self.status(post), "publishing")
+
+    def test_unreadable_success_response_is_not_retried(self):
+        post = self.post()
+        claim_due_posts(10)
+        publisher = AsyncPublisher()
+
+        self.publish(publisher, [post.id], lambda request: httpx.Response(201))
+
+        post.refresh_from_db()
+        self.assertEqual(post.status, "dead")
+        self.assertIn("Unreadable response 201", post.last_error)
+
+    def test_sent_posts_are_recorded_when_the_batch_fails(self):
+        posts = [self.post() for _ in range(2)]
+        claim_due_posts(10)
+        publisher = AsyncPublisher()
+        record_outcome = publisher.record_outcome
+
+        def fail_after_first(buffer, *args):
+            if len(buffer):
+                raise RuntimeError("boom")
+            record_outcome(buffer, *args)
+
+        with mock.patch.object(publisher, "record_outcome", fail_after_first):
+            with self.assertRaisesMessage(RuntimeError, "boom"):
+                self.publish(publisher, [post.id for post in posts])
+
+        self.assertEqual(
+            sorted(Post.objects.values_list("status", flat=True)),
+            ["posted", "publishing"],
+        )
+
+    def test_deadline_must_leave_room_before_the_claim_timeout(self):
+        with self.assertRaises(ImproperlyConfigured):
+            AsyncPublisher(claim_timeout=100, batch_deadline=80)
+
+    def test_latencies_are_bounded(self):
+        stats = PublishStats(window=2)
+        stats.latencies.extend([3.0, 1.0, 2.0])
+        self.assertEqual(list(stats.latencies), [1.0, 2.0])
+        self.assertEqual(stats.snapshot()["latency_p99"], 2.0)
+
+
+NOW = datetime(2030, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+
+def http_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = "Reason"
+    response.headers.update(headers or {})
+    response._content = b"{}"
+    return response
+
+
+class ClassificationTests(SimpleTestCase):
+    def test_status_codes(self):
+        self.assertEqual(classify_status(429), RATE_LIMITED)
+        for status_code in (500, 503, 408, 425):
+            self.assertEqual(classify_status(status_code), TRANSIENT)
+        for status_code in (400, 401, 403, 404):
+            self.assertEqual(classify_status(status_code), PERMANENT)
+
+    def test_tweepy_rate_limit_carries_the_reset(self):
+        reset = int(NOW.timestamp())
+        failure = classify_exception(
+            tweepy.TooManyRequests(
+                http_response(429, {"x-rate-limit-reset": str(reset)})
+            )
+        )
+        self.assertEqual(failure.kind, RATE_LIMITED)
+        self.assertEqual(failure.reset_at, NOW)
+
+    def test_tweepy_client_error_is_permanent(self):
+        failure = classify_exception(tweepy.Forbidden(http_response(403)))
+        self.assertEqual(failure.kind, PERMANENT)
+        self.assertIsNone(failure.reset_at)
+
+    def test_network_adapter_errors(self):
+        error = requests.HTTPError(response=http_response(502))
+        self.assertEqual(classify_exception(error).kind, TRANSIENT)
+        error = requests.HTTPError(response=http_response(400))
+        self.assertEqual(classify_exception(error).kind, PERMANENT)
+
+    def test_connection_and_unknown_errors_are_transient(self):
+        self.assertEqual(
+            classify_exception(requests.ConnectionError("reset")).kind, TRANSIENT
+        )
+        self.assertEqual(classify_exception(RuntimeError("boom")).kind, TRANSIENT)
+
+    def test_missing_account_or_file_is_permanent(self):
+        for error in (ObjectDoesNotExist(), FileNotFoundError(), ValueError()):
+            self.assertEqual(classify_exception(error).kind, PERMANENT)
+
+    def test_error_is_truncated(self):
+        self.assertEqual(len(classify_exception(RuntimeError("x" * 2000)).error), 1000)
+
+
+@override_settings(POSTS_MAX_ATTEMPTS=3)
+class PlanRetryTests(SimpleTestCase):
+    def test_rate_limit_waits_for_the_reset(self):
+        reset_at = NOW + timedelta(minutes=15)
+        self.assertEqual(
+            plan_retry(Failure(RATE_LIMITED, "429", reset_at), 10, NOW),
+            ("deferred", reset_at),
+        )
+
+    def test_rate_limit_without_reset_backs_off(self):
+        status, next_attempt_at = plan_retry(Failure(RATE_LIMITED, "429"), 1, NOW)
+        self.assertEqual(status, "deferred")
+        self.assertGreaterEqual(next_attempt_at, NOW)
+
+    def test_transient_is_retried_up_to_the_limit(self):
+        status, next_attempt_at = plan_retry(Failure(TRANSIENT, "503"), 2, NOW)
+        self.assertEqual(status, "deferred")
+        self.assertGreaterEqual(next_attempt_at, NOW)
+        self.assertEqual(plan_retry(Failure(TRANSIENT, "503"), 3, NOW), ("dead", None))
+
+    def test_permanent_is_dead_lettered(self):
+        self.assertEqual(plan_retry(Failure(PERMANENT, "403"), 1, NOW), ("dead", None))
+
+
+@override_settings(POSTS_MAX_ATTEMPTS=3, POSTS_DISPATCHER_ENABLED=False)
+class RecordFailureTests(PostTestCase):
+    def test_transient_failure_defers_with_a_retry_schedule(self):
+        post = self.post()
+        status = record_failure(post.id, 0, Failure(TRANSIENT, "503"))
+        post.refresh_from_db()
+        self.assertEqual(status, "deferred")
+        self.assertEqual((post.status, post.attempts), ("deferred", 1))
+        self.assertEqual(post.schedule.next_run, post.next_attempt_at)
+
+    def test_buffered_retry_is_scheduled_after_the_flush(self):
+        post = self.post()
+        buffer = StatusBuffer(max_size=0)
+
+        record_failure(post.id, 0, Failure(TRANSIENT, "503"), buffer=buffer)
+        self.assertFalse(Schedule.objects.exists())
+
+        buffer.flush()
+        post.refresh_from_db()
+        self.assertEqual(post.status, "deferred")
+        self.assertEqual(post.schedule.next_run, post.next_attempt_at)
+
+    def test_rate_limit_does_not_count_as_an_attempt(self):
+        post = self.post(attempts=2)
+        record_failure(
+            post.id,
+            2,
+            Failure(RATE_LIMITED, "429", timezone.now() + timedelta(minutes=5)),
+            schedule=False,
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.status, post.attempts), ("deferred", 2))
+        self.assertIsNone(post.schedule)
+
+    def test_last_attempt_is_dead_lettered(self):
+        post = self.post(attempts=2)
+        self.assertEqual(record_failure(post.id, 2, Failure(TRANSIENT, "503")), "dead")
+        self.assertEqual(self.status(post), "dead")
+        self.assertFalse(Schedule.objects.exists())
+
+
+@override_settings(POSTS_DISPATCHER_ENABLED=False)
+class DoublePublishTests(PostTestCase):
+    """A post is published by its claimer or its schedule, never both."""
+
+    def claimed_post(self):
+        post = self.post()
+        schedule_posts([(post, post.scheduled_time)])
+        claim_due_posts(10)
+        return post
+
+    def test_schedule_task_skips_a_claimed_post(self):
+        post = self.claimed_post()
+        self.assertEqual(post_to_twitter(post.id), "skipped")
+        self.assertEqual(post_to_twitter_batch([post.id]), {"skipped": 1})
+        self.assertEqual(self.status(post), "publishing")
+        self.twitter.create_tweet.assert_not_called()
+
+    def test_only_the_claimer_publishes(self):
+        post = self.claimed_post()
+        self.assertEqual(post_to_twitter_batch([post.id], claimed=True), {"posted": 1})
+        self.assertEqual(post_to_twitter(post.id), "skipped")
+        self.assertEqual(self.status(post), "posted")
+        self.twitter.create_tweet.assert_called_once()
+
+    def test_claimer_skips_a_post_published_by_its_schedule(self):
+        post = self.post()
+        self.assertEqual(post_to_twitter(post.id), "posted")
+        self.assertEqual(post_to_twitter_batch([post.id], claimed=True), {"skipped": 1})
+        self.twitter.create_tweet.assert_called_once()
+
+    def test_batch_task_publishes_due_posts_once(self):
+        posts = [self.post() for _ in range(3)]
+        post_ids = [post.id for post in posts]
+        self.assertEqual(post_to_twitter_batch(post_ids), {"posted": 3})
+        self.assertEqual(post_to_twitter_batch(post_ids), {"skipped": 3})
+        self.assertEqual(self.twitter.create_tweet.call_count, 3)
+
+
+class CompactionTests(TestCase):
+    def schedule(self, args, repeats=1):
+        return Schedule.objects.create(
+            func="posts.tasks.post_to_twitter_batch",
+            args=args,
+            repeats=repeats,
+            schedule_type=Schedule.ONCE,
+            next_run=timezone.now() + timedelta(hours=1),
+        )
+
+    def task(self, name, stopped):
+        return Task.objects.create(
+            id=name,
+            name=name,
+            func="posts.tasks.post_to_twitter",
+            started=stopped,
+            stopped=stopped,
+            success=True,
+        )
+
+    def test_purges_finished_and_orphaned_rows_only(self):
+        user = User.objects.create_user(username="author")
+        post = Post.objects.create(
+            user=user, content="Live", scheduled_time=timezone.now() + timedelta(days=1)
+        )
+        finished = self.schedule(repr([post.id]), repeats=0)
+        orphaned = self.schedule(repr([post.id + 1, post.id + 2]))
+        shared = self.schedule(repr([post.id, post.id + 1]))
+        now = timezone.now()
+        self.task("old", now - timedelta(days=30))
+        self.task("recent", now - timedelta(hours=1))
+
+        stats = compact(batch_size=1, retention_days=7)
+
+        self.assertEqual(
+            (
+                stats["finished_schedules"],
+                stats["orphaned_schedules"],
+                stats["task_results"],
+            ),
+            (1, 1, 1),
+        )
+        self.assertEqual(
+            list(Schedule.objects.values_list("id", flat=True)), [shared.id]
+        )
+        self.assertFalse(Schedule.objects.filter(id__in=[finished.id, orphaned.id]))
+        self.assertEqual(list(Task.objects.values_list("name", flat=True)), ["recent"])
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, available_timezones
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+@lru_cache(maxsize=None)
+def timezone_names():
+    """The set of valid IANA timezone names, built on first use."""
+    return frozenset(available_timezones())
+
+
+def timezone_choices():
+    """Model field choices for ``Post.timezone``, evaluated lazily by Django."""
+    return [(name, name) for name in sorted(timezone_names())]
+
+
+def is_valid_timezone(name):
+    return name in timezone_names()
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    """
+    Return the ``ZoneInfo`` for ``name``, constructing each zone only once.
+
+    Raises:
+        ValueError: If ``name`` is not a known timezone.
+    """
+    if not is_valid_timezone(name):
+        raise ValueError(f"Unknown timezone '{name}'.")
+    return ZoneInfo(name)
+
+
+def parse_local_time(value):
+    """
+    Parse a ``YYYY-MM-DD HH:MM`` string into a naive datetime.
+
+    Raises:
+        ValueError: If ``value`` is not in that format.
+    """
+    return datetime.strptime(value, TIME_FORMAT)
+
+
+def to_utc(naive, tz_name):
+    """Interpret a naive local datetime in ``tz_name`` and convert it to UTC."""
+    return naive.replace(tzinfo=get_timezone(tz_name)).astimezone(dt_timezone.utc)
+
+
+def to_utc_many(naive_datetimes, tz_names):
+    """
+    Convert many naive local datetimes to UTC in one call.
+
+    ``tz_names`` is parallel to ``naive_datetimes``. Each distinct zone is
+    looked up once and its datetimes converted together.
+
+    Returns:
+        list: Aware UTC datetimes, in input order.
+    """
+    by_zone = defaultdict(list)
+    for index, tz_name in enumerate(tz_names):
+        by_zone[tz_name].append(index)
+
+    converted = [None] * len(tz_names)
+    for tz_name, indexes in by_zone.items():
+        zone = get_timezone(tz_name)
+        for index in indexes:
+            converted[index] = (
+                naive_datetimes[index].replace(tzinfo=zone).astimezone(dt_timezone.utc)
+            )
+    return converted
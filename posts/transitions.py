@@ -0,0 +1,149 @@
+"""
+Post status transitions as conditional UPDATEs.
+
+``Post.save()`` validates ``scheduled_time`` against the current time and
+writes every column, so it cannot record the outcome of a post whose time
+has come. These helpers only write the status and its bookkeeping columns,
+and only while the post is still in one of the expected statuses: an outcome
+arriving for a post that was deleted, released or already published in the
+meantime changes nothing.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+
+from .cache import post_cache
+from .models import Post, PostDelivery
+
+# Statuses a django-q publish task starts from: due, or waiting for a retry
+DUE = ("scheduled", "deferred")
+# Posts claimed by a dispatcher or the async publisher; only the claimer may
+# publish them
+CLAIMED = ("publishing",)
+# Every status a publish attempt starts from
+PUBLISHABLE = DUE + CLAIMED
+
+
+def transition(post_ids, status, from_statuses=PUBLISHABLE, user_ids=None, **fields):
+    """
+    Move the posts of ``post_ids`` still in ``from_statuses`` to ``status``.
+
+    ``fields`` are written by the same ``UPDATE``. ``user_ids`` are the
+    owners of the posts, if known, to save a lookup when invalidating the
+    cache.
+
+    Returns:
+        int: The number of posts moved.
+    """
+    post_ids = list(post_ids)
+    updated = Post.objects.filter(id__in=post_ids, status__in=from_statuses).update(
+        status=status, **fields
+    )
+    if updated:
+        post_cache.invalidate(post_ids, user_ids)
+    return updated
+
+
+def save_deliveries(deliveries):
+    """Insert or update the ``PostDelivery`` rows of ``deliveries`` in one statement."""
+    if deliveries:
+        PostDelivery.objects.bulk_create(
+            deliveries,
+            update_conflicts=True,
+            unique_fields=["post", "network"],
+            update_fields=[
+                "status",
+                "remote_id",
+                "last_error",
+                "posted_at",
+                "updated_at",
+            ],
+        )
+
+
+class StatusBuffer:
+    """
+    Publish outcomes collected in memory and written with ``bulk_update``.
+
+    Outcomes that set the same columns are written together, one
+    ``UPDATE ... SET status = CASE ...`` per ``max_size`` posts instead of
+    one statement per post, under the same ``status IN from_statuses``
+    condition as :func:`transition`. Per-network deliveries are buffered
+    alongside and saved by the same flush, and callbacks registered with
+    :meth:`after_flush` run once it has written them. The buffer flushes
+    itself once it holds ``max_size`` outcomes (never if ``max_size`` is 0)
+    and when leaving a ``with`` block.
+    """
+
+    def __init__(self, max_size=None, from_statuses=PUBLISHABLE):
+        self.max_size = (
+            max_size if max_size is not None else settings.POSTS_STATUS_FLUSH_SIZE
+        )
+        self.from_statuses = from_statuses
+        self.pending = {}
+        self.deliveries = []
+        self.callbacks = []
+        self.flushes = 0
+        self.written = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def add(self, post_id, status, user_id=None, **fields):
+        """Buffer the move of ``post_id`` to ``status``; a later outcome replaces it."""
+        self.pending[post_id] = (status, fields, user_id)
+        if self.max_size and len(self.pending) >= self.max_size:
+            self.flush()
+
+    def add_deliveries(self, deliveries):
+        """Buffer ``PostDelivery`` rows to save with the next flush."""
+        self.deliveries.extend(deliveries)
+
+    def after_flush(self, callback):
+        """Call ``callback()`` once the outcomes buffered so far are written."""
+        self.callbacks.append(callback)
+
+    def flush(self):
+        """
+        Write the buffered outcomes, then run the ``after_flush`` callbacks.
+
+        Returns:
+            int: The number of posts updated.
+        """
+        updated = self._write()
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+        return updated
+
+    def _write(self):
+        deliveries, self.deliveries = self.deliveries, []
+        save_deliveries(deliveries)
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+
+        groups = defaultdict(list)
+        for post_id, (status, fields, _) in pending.items():
+            groups[tuple(sorted(fields))].append(
+                Post(id=post_id, status=status, **fields)
+            )
+        queryset = Post.objects.filter(status__in=self.from_statuses)
+        updated = 0
+        for columns, posts in groups.items():
+            updated += queryset.bulk_update(
+                posts, ["status", *columns], batch_size=self.max_size or None
+            )
+
+        user_ids = {user_id for _, _, user_id in pending.values()}
+        post_cache.invalidate(pending, None if None in user_ids else user_ids)
+        self.flushes += 1
+        self.written += updated
+        return updated
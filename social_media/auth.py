@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.exceptions import InvalidToken
+from ninja_jwt.settings import api_settings
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Forget the cached user, e.g. after the profile changed or was deleted."""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuth(JWTAuth):
+    """
+    ``JWTAuth`` that skips repeated work for tokens it has already seen.
+
+    Decoded claims are kept in an in-process LRU keyed by the raw token, so
+    the signature is verified once per token and TTL; the ``User`` is cached
+    in Django's default cache. Neither entry outlives ``JWT_AUTH_CACHE_TTL``
+    seconds or the token's own expiry, which bounds how stale a user can be
+    in processes that did not see an ``invalidate_user``.
+    """
+
+    def __init__(self, ttl=None, maxsize=None):
+        super().__init__()
+        self.ttl = ttl if ttl is not None else settings.JWT_AUTH_CACHE_TTL
+        self.maxsize = maxsize or settings.JWT_AUTH_CACHE_SIZE
+        self._claims = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def authenticate(self, request, token):
+        user = self.get_cached_user(self.get_user_id(token))
+        request.user = user
+        return user
+
+    async def aauthenticate(self, request, token):
+        """Async ``authenticate`` for async views; only a cache miss hits the DB."""
+        user_id = self.get_user_id(token)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await sync_to_async(self.get_user)(
+                {api_settings.USER_ID_CLAIM: user_id}
+            )
+            await cache.aset(key, user, self.ttl)
+        request.user = user
+        return user
+
+    def get_user_id(self, token):
+        """Return the user id claim of ``token``, verifying it on a cache miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._claims.get(token)
+            if entry and entry[1] > now:
+                self._claims.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        validated_token = self.get_validated_token(token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            ) from e
+
+        expires = min(validated_token["exp"], now + self.ttl)
+        with self._lock:
+            self._claims[token] = (user_id, expires)
+            self._claims.move_to_end(token)
+            while len(self._claims) > self.maxsize:
+                self._claims.popitem(last=False)
+        return user_id
+
+    def get_cached_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Raises for unknown and inactive users, which are not cached
+            user = self.get_user({api_settings.USER_ID_CLAIM: user_id})
+            cache.set(key, user, self.ttl)
+        return user
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._claims),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
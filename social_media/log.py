@@ -0,0 +1,242 @@
+"""
+Logging set-up: JSON records, context fields, sampling and a queue.
+
+``configure`` (the ``LOGGING_CONFIG`` callable) applies ``settings.LOGGING``
+and, with ``LOG_ASYNC``, puts every handler behind a queue drained by one
+background thread. Logging a record then costs the caller its filters and a
+``put`` on the queue; formatting and writing happen in the listener thread.
+When the queue is full (``LOG_QUEUE_SIZE`` records) new records are dropped
+and counted rather than blocking the caller.
+
+Fields set with :func:`log_context` (``post_id``, ``account``, ...) are added
+to every record logged inside the block and written as JSON keys by
+:class:`JSONFormatter`.
+"""
+
+import atexit
+import logging
+import logging.config
+import os
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+import orjson
+
+_context = ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else was passed as ``extra``
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+@contextmanager
+def log_context(**fields):
+    """Add ``fields`` to the records logged inside the block, in any thread."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the :func:`log_context` fields onto each record."""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records below ``WARNING`` of some loggers.
+
+    ``rates`` maps logger names to the fraction kept; a logger without an
+    entry uses the one of its nearest configured ancestor, and loggers with
+    none keep everything. A record reaching several handlers is kept or
+    dropped by all of them.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved = {}
+
+    def rate(self, name):
+        if name not in self._resolved:
+            rate = 1.0
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:i])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        keep = getattr(record, "_sampled", None)
+        if keep is None:
+            rate = self.rate(record.name)
+            keep = rate >= 1 or random.random() < rate
+            record._sampled = keep
+        return keep
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, the
+    exception if any and every ``extra``/context field.
+    """
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = record.stack_info
+        return orjson.dumps(payload, default=str).decode()
+
+
+class LogListener:
+    """
+    The background thread writing queued records to their target handlers.
+
+    Forked processes (django-q workers) start their own thread and queue.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._start()
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.stop)
+
+    def _start(self):
+        self.queue = queue.SimpleQueue()
+        self.dropped = 0
+        self.thread = threading.Thread(
+            target=self._run, name="log-listener", daemon=True
+        )
+        self.thread.start()
+
+    def enqueue(self, target, record):
+        # SimpleQueue has no bound, but its put is several times cheaper
+        # than Queue's; the size check is approximate under concurrency
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.queue.put((target, record))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            target, record = item
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                target.handle(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": f"Dropped {dropped} log records: the queue was full",
+                        }
+                    )
+                )
+            if record.levelno >= target.level:
+                target.handle(record)
+
+    def stop(self, timeout=5.0):
+        """Write the records still queued and stop the thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+
+class QueueingHandler(logging.Handler):
+    """
+    Stand-in for ``target`` that hands records to a :class:`LogListener`.
+
+    Filters run here, in the logging thread, so sampled-out records never
+    reach the queue. The message is rendered before queueing, since its
+    arguments may change once the caller moves on; the record is updated in
+    place, which leaves what other handlers write unchanged.
+    """
+
+    def __init__(self, target, listener):
+        super().__init__(target.level)
+        self.target = target
+        self.listener = listener
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.listener.enqueue(self.target, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.target.close()
+        super().close()
+
+
+_listener = None
+
+
+def use_queue(maxsize):
+    """Put every handler of every configured logger behind the log queue."""
+    global _listener
+    if _listener is None:
+        _listener = LogListener(maxsize)
+
+    fronts = {}
+    loggers = [logging.getLogger()] + [
+        logger
+        for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    for logger in loggers:
+        for i, handler in enumerate(logger.handlers):
+            if isinstance(handler, QueueingHandler):
+                continue
+            if handler not in fronts:
+                front = fronts[handler] = QueueingHandler(handler, _listener)
+                front.filters, handler.filters = handler.filters, []
+            logger.handlers[i] = fronts[handler]
+
+
+def configure(config):
+    """Apply ``config`` with ``dictConfig``, then queue it if ``LOG_ASYNC`` is set."""
+    from django.conf import settings
+
+    logging.config.dictConfig(config)
+    if settings.LOG_ASYNC:
+        use_queue(settings.LOG_QUEUE_SIZE)
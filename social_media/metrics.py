@@ -0,0 +1,193 @@
+"""
+Prometheus metrics for the web and worker processes.
+
+Web processes expose ``/metrics``; workers either pass ``--metrics-port`` to
+``dispatch_posts``/``publish_async`` or run ``manage.py metrics_exporter``.
+When several processes record metrics (gunicorn, django-q workers), set
+``PROMETHEUS_MULTIPROC_DIR`` so their samples are aggregated on scrape.
+"""
+
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Publish lag spans from sub-second to hours when the queue backs up
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, float("inf"))
+
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds",
+    "Latency of API requests by route.",
+    ["method", "route", "status"],
+)
+PUBLISH_DURATION = Histogram(
+    "post_publish_duration_seconds",
+    "Time spent publishing one post, by outcome.",
+    ["outcome"],
+)
+PUBLISH_OUTCOMES = Counter(
+    "post_publish_total", "Posts processed by the publishers, by outcome.", ["outcome"]
+)
+PUBLISH_LAG = Histogram(
+    "post_publish_lag_seconds",
+    "Delay between a post's scheduled_time and its actual posting.",
+    buckets=LAG_BUCKETS,
+)
+# Queries per request or task; more than a few dozen means an N+1 crept in
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf"))
+REQUEST_QUERIES = Histogram(
+    "api_request_db_queries",
+    "Database queries run by API requests, by route.",
+    ["method", "route"],
+    buckets=QUERY_BUCKETS,
+)
+TASK_QUERIES = Histogram(
+    "task_db_queries",
+    "Database queries run by tasks, by task.",
+    ["task"],
+    buckets=QUERY_BUCKETS,
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    "db_query_budget_exceeded_total",
+    "Requests and tasks that ran more queries than their budget.",
+    ["label"],
+)
+CACHE_REQUESTS = Counter(
+    "posts_cache_requests_total",
+    "Post cache lookups by kind (detail or list) and result (hit or miss).",
+    ["kind", "result"],
+)
+
+
+def record_publish(outcome, duration=None, scheduled_time=None, posted_at=None):
+    """Record one publish attempt and, for posted posts, its lag."""
+    PUBLISH_OUTCOMES.labels(outcome).inc()
+    if duration is not None:
+        PUBLISH_DURATION.labels(outcome).observe(duration)
+    if scheduled_time and posted_at:
+        PUBLISH_LAG.observe(max(0.0, (posted_at - scheduled_time).total_seconds()))
+
+
+class BacklogCollector:
+    """
+    Gauges computed on scrape: due-but-unposted posts and django-q queue size.
+
+    The backlog is labelled by status: ``scheduled`` posts past their
+    ``scheduled_time``, ``deferred`` posts past their ``next_attempt_at`` and
+    ``publishing`` posts claimed but not yet resolved. Only registered in the
+    registry that is being exported, so each scrape costs one grouped count
+    query and one broker call.
+    """
+
+    BACKLOG_STATUSES = ("scheduled", "deferred", "publishing")
+
+    def collect(self):
+        from django_q.brokers import get_broker
+        from posts.models import Post
+
+        now = timezone.now()
+        counts = dict(
+            Post.objects.filter(
+                Q(status="scheduled", scheduled_time__lte=now)
+                | Q(status="deferred", next_attempt_at__lte=now)
+                | Q(status="publishing")
+            )
+            .values_list("status")
+            .annotate(Count("id"))
+            .order_by()
+        )
+        backlog = GaugeMetricFamily(
+            "posts_due_backlog",
+            "Posts due or being published but not posted yet, by status.",
+            labels=["status"],
+        )
+        for status in self.BACKLOG_STATUSES:
+            backlog.add_metric([status], counts.get(status, 0))
+        yield backlog
+
+        queue = GaugeMetricFamily("django_q_queue_size", "Tasks waiting in django-q.")
+        try:
+            queue.add_metric([], get_broker().queue_size() or 0)
+        except Exception:
+            # An unreachable broker should not break the whole scrape
+            return
+        yield queue
+
+
+def export_registry():
+    """The registry to export, aggregating all processes in multiprocess mode."""
+    registry = CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(_DefaultCollector())
+    registry.register(BacklogCollector())
+    return registry
+
+
+class _DefaultCollector:
+    """Re-exports everything registered in the process-wide default registry."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def metrics_view(request):
+    return HttpResponse(
+        generate_latest(export_registry()), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+def start_exporter(port):
+    """Serve this process's metrics (plus the backlog gauges) on ``port``."""
+    start_http_server(port, registry=export_registry())
+
+
+class MetricsMiddleware:
+    """Observe the latency of every API request, labelled by URL route."""
+
+    # Works in both modes, so async views are not pushed into a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    def observe(self, request, response, start):
+        if request.path.startswith("/api/"):
+            match = getattr(request, "resolver_match", None)
+            REQUEST_LATENCY.labels(
+                request.method,
+                match.route if match else "unmatched",
+                response.status_code,
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,285 @@
+"""
+SQL query counts, time and budgets per request and per task.
+
+Every database connection gets an execute wrapper that reports to the
+:class:`QueryStats` of the request or task running in the current context, so
+queries made from ``sync_to_async`` threads are counted for the async view
+that awaited them. Queries slower than ``SLOW_QUERY_MS`` are logged with the
+project frames that ran them.
+
+Routes and tasks declare how many queries they may run with
+:func:`query_budget` and :func:`track_queries`. Going over budget is logged
+and counted in Prometheus, or raises :class:`QueryBudgetExceeded` when
+``QUERY_BUDGETS_ENFORCED`` is set, as in tests; see
+``social_media.testing`` for helpers to use in tests.
+"""
+
+import logging
+import sys
+import time
+import traceback
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import QUERY_BUDGET_EXCEEDED, REQUEST_QUERIES, TASK_QUERIES
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("query_stats", default=None)
+
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+# Frames from these directories are skipped when locating a slow query
+_LIBRARY_DIRS = tuple(
+    {str(Path(path).resolve()) for path in sys.path if "-packages" in path}
+)
+_PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or task ran more queries than its declared budget."""
+
+
+class QueryStats:
+    """
+    Queries run by one request or task.
+
+    With ``keep_sql`` the SQL and duration of every query are kept in
+    ``queries``, for test failures; otherwise only the totals are.
+    """
+
+    def __init__(self, label, budget=None, keep_sql=False, parent=None):
+        self.label = label
+        self.budget = budget
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.slow = 0
+        self.queries = [] if keep_sql else None
+
+    def record(self, sql, duration):
+        """Count a query here and in every enclosing :class:`QueryStats`."""
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            if stats.queries is not None:
+                stats.queries.append((sql, duration))
+            stats = stats.parent
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            self.slow += 1
+            logger.warning(
+                f"Slow query ({duration * 1000:.1f} ms) in {self.label}: "
+                f"{sql[:500]}\n{query_origin()}"
+            )
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def check_budget(self, enforce=None):
+        """
+        Log, count and, if enforced, raise when the budget was exceeded.
+
+        ``enforce`` defaults to the ``QUERY_BUDGETS_ENFORCED`` setting.
+
+        Raises:
+            QueryBudgetExceeded: If enforced and over budget.
+        """
+        if not self.over_budget:
+            return
+        if enforce is None:
+            enforce = settings.QUERY_BUDGETS_ENFORCED
+        message = (
+            f"{self.label} ran {self.count} queries, over its budget of "
+            f"{self.budget}"
+        )
+        QUERY_BUDGET_EXCEEDED.labels(self.label).inc()
+        if self.queries:
+            message += ":\n" + "\n".join(
+                f"  {i}. {sql}" for i, (sql, _) in enumerate(self.queries, 1)
+            )
+        if enforce:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    def snapshot(self):
+        return {
+            "label": self.label,
+            "queries": self.count,
+            "query_seconds": round(self.duration, 6),
+            "slow_queries": self.slow,
+            "budget": self.budget,
+        }
+
+
+def query_origin(limit=3):
+    """The innermost ``limit`` project frames of the current stack, formatted."""
+    frames = [
+        frame
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(_PROJECT_DIR)
+        and not frame.filename.startswith(_LIBRARY_DIRS)
+        and frame.filename != _THIS_FILE
+    ]
+    return "".join(traceback.format_list(frames[-limit:])).rstrip()
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper timing the query for the current :class:`QueryStats`."""
+    stats = _current.get()
+    # Only some backends send transaction control through the cursor; leaving
+    # it out keeps budgets the same on all of them
+    if stats is None or sql.startswith(TRANSACTION_STATEMENTS):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, time.perf_counter() - start)
+
+
+def install(connection):
+    """Add :func:`record_query` to ``connection``, once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+class tracking:
+    """
+    Context manager counting the queries run inside it into a
+    :class:`QueryStats`, which it returns on entry.
+
+    Queries of a nested block also count for the enclosing ones.
+    """
+
+    def __init__(self, label, budget=None, keep_sql=False):
+        self.stats = QueryStats(label, budget, keep_sql)
+
+    def __enter__(self):
+        # Connections opened before this module was imported lack the wrapper
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        self.stats.parent = _current.get()
+        self.token = _current.set(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        _current.reset(self.token)
+
+
+def query_budget(queries):
+    """
+    Declare the number of queries a view may run, authentication included.
+
+    Apply below the router decorator::
+
+        @router.get("/{post_id}/")
+        @query_budget(2)
+        def retrieve_post(request, post_id): ...
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                request.query_budget = queries
+                return await view(request, *args, **kwargs)
+
+        else:
+
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                request.query_budget = queries
+                return view(request, *args, **kwargs)
+
+        wrapper.query_budget = queries
+        return wrapper
+
+    return decorator
+
+
+def track_queries(budget=None):
+    """
+    Count the queries of every call of a task, against ``budget`` if given.
+
+    The count is observed in the ``task_db_queries`` histogram, labelled with
+    the task's name.
+    """
+
+    def decorator(func):
+        label = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracking(
+                label, budget, keep_sql=settings.QUERY_BUDGETS_ENFORCED
+            ) as stats:
+                result = func(*args, **kwargs)
+            TASK_QUERIES.labels(label).observe(stats.count)
+            stats.check_budget()
+            return result
+
+        wrapper.query_budget = budget
+        return wrapper
+
+    return decorator
+
+
+class QueryCountMiddleware:
+    """
+    Count the queries of every API request and check them against the
+    budget its view declared with :func:`query_budget`.
+
+    The :class:`QueryStats` are left on ``response.query_stats``. Queries
+    run while a streaming response is consumed are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+        with tracking(request.path, keep_sql=settings.QUERY_BUDGETS_ENFORCED) as stats:
+            response = self.get_response(request)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        if not request.path.startswith("/api/"):
+            return await self.get_response(request)
+        with tracking(request.path, keep_sql=settings.QUERY_BUDGETS_ENFORCED) as stats:
+            response = await self.get_response(request)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "unmatched"
+        stats.label = f"{request.method} {route}"
+        stats.budget = getattr(request, "query_budget", None)
+        REQUEST_QUERIES.labels(request.method, route).observe(stats.count)
+        response.query_stats = stats
+        stats.check_budget()
+        return response
@@ -0,0 +1,29 @@
+import orjson
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+# Datetimes are written as RFC 3339 with "Z" for UTC, like Django's encoder,
+# but keep their microseconds
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_fallback = NinjaJSONEncoder()
+
+
+def _default(value):
+    # Types orjson does not know natively: pydantic models, Decimal, lazy
+    # translation strings, timedelta and the rest of NinjaJSONEncoder
+    return _fallback.default(value)
+
+
+def dumps(data):
+    """Serialize ``data`` to JSON bytes."""
+    return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Renders API responses with orjson instead of the stdlib encoder."""
+
+    media_type = "application/json"
+
+    def render(self, request, data, *, response_status):
+        return dumps(data)
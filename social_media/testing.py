@@ -0,0 +1,52 @@
+"""
+Test helpers for query budgets.
+
+Run tests with ``QUERY_BUDGETS_ENFORCED=True`` so any request or task going
+over the budget its code declares fails with
+:class:`~social_media.queries.QueryBudgetExceeded`, listing its queries. The
+helpers below cover code without a declared budget and check that every
+route has one.
+"""
+
+from contextlib import contextmanager
+
+from .queries import tracking
+
+
+@contextmanager
+def assert_max_queries(budget, label="block"):
+    """
+    Fail if the block runs more than ``budget`` queries.
+
+    Yields the :class:`~social_media.queries.QueryStats` of the block::
+
+        with assert_max_queries(2):
+            post_to_twitter(post.id)
+
+    Raises:
+        QueryBudgetExceeded: When over budget, with the block's queries.
+    """
+    with tracking(label, budget, keep_sql=True) as stats:
+        yield stats
+    stats.check_budget(enforce=True)
+
+
+def unbudgeted_routes(api):
+    """
+    The operations of a ``NinjaAPI`` whose view declares no query budget.
+
+    Routes of third-party routers (``/login``, ``/token``) are listed too.
+
+    Returns:
+        list: ``"METHOD /path"`` strings, empty when every route has a budget.
+    """
+    missing = []
+    for prefix, router in api._routers:
+        for path, path_view in router.path_operations.items():
+            for operation in path_view.operations:
+                if getattr(operation.view_func, "query_budget", None) is None:
+                    for method in operation.methods:
+                        missing.append(
+                            f"{method} {prefix.rstrip('/')}/{path.lstrip('/')}"
+                        )
+    return missing
@@ -0,0 +1,307 @@
+"""
+Query budgets of the API routes.
+
+Every route is requested with ``QUERY_BUDGETS_ENFORCED`` set, so a view
+going over the budget it declares fails its test with the list of its
+queries. Run with ``python manage.py test`` and the environment the settings
+require.
+"""
+
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from django_q.models import Schedule
+from ninja_jwt.tokens import RefreshToken
+from PIL import Image
+
+from posts.cache import post_cache
+from posts.models import Post
+from posts.scheduling import schedule_posts
+from users.models import TwitterAccount
+
+from .queries import QueryBudgetExceeded
+from .testing import assert_max_queries, unbudgeted_routes
+from .urls import api
+
+# ninja_jwt's routers, whose views cannot declare a budget
+UNBUDGETED_ROUTES = {"POST /login/pair", "POST /login/refresh", "POST /token/verify"}
+
+
+def routes_api(users_router, posts_router):
+    """A stand-in for a ``NinjaAPI`` mounting the two routers, for ``unbudgeted_routes``."""
+    return SimpleNamespace(
+        _routers=[("/users/", users_router), ("/posts/", posts_router)]
+    )
+
+
+def png(name="image.png", color="red"):
+    data = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(data, "PNG")
+    return SimpleUploadedFile(name, data.getvalue(), content_type="image/png")
+
+
+class RouteBudgetTests(TestCase):
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(sorted(set(unbudgeted_routes(api)) - UNBUDGETED_ROUTES), [])
+
+    def test_every_async_route_has_a_budget(self):
+        from posts.async_api import router as posts_router
+        from users.async_api import router as users_router
+
+        self.assertEqual(unbudgeted_routes(routes_api(users_router, posts_router)), [])
+
+    def test_unbudgeted_route_is_reported(self):
+        from ninja import Router
+
+        router = Router()
+
+        @router.get("/plain")
+        def plain(request):
+            return {}
+
+        self.assertEqual(
+            unbudgeted_routes(routes_api(router, Router())), ["GET /users/plain"]
+        )
+
+
+@override_settings(QUERY_BUDGETS_ENFORCED=True)
+class RouteQueryTests(TestCase):
+    """Each route, run once under its enforced budget."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        # Rolled-back posts reuse ids, so entries cached by an earlier test
+        # could be served
+        post_cache.cache.clear()
+        self.user = User.objects.create_user(username="author", password="secret")
+        token = RefreshToken.for_user(self.user).access_token
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.when = timezone.now() + timedelta(days=1)
+
+    def scheduled_post(self, **fields):
+        post = Post.objects.create(
+            user=self.user, content="Scheduled", scheduled_time=self.when, **fields
+        )
+        schedule_posts([(post, post.scheduled_time)])
+        return post
+
+    def form_time(self):
+        return self.when.strftime("%Y-%m-%d %H:%M")
+
+    def assertOk(self, response):
+        body = b"" if response.streaming else response.content
+        self.assertEqual(response.status_code, 200, body)
+        return response
+
+    def test_create_post(self):
+        self.assertOk(
+            self.client.post(
+                "/api/posts/",
+                {
+                    "content": "Hello",
+                    "scheduled_time": self.form_time(),
+                    "timezone": "UTC",
+                },
+            )
+        )
+        self.assertEqual(Schedule.objects.count(), 1)
+
+    def test_create_post_with_image(self):
+        self.assertOk(
+            self.client.post(
+                "/api/posts/",
+                {
+                    "content": "Hello",
+                    "scheduled_time": self.form_time(),
+                    "timezone": "UTC",
+                    "image_file": png(),
+                },
+            )
+        )
+
+    def test_create_posts_batch(self):
+        items = [
+            {
+                "content": f"Post {i}",
+                "scheduled_time": self.form_time(),
+                "timezone": "UTC",
+            }
+            for i in range(20)
+        ]
+        response = self.assertOk(
+            self.client.post(
+                "/api/posts/batch", json.dumps(items), content_type="application/json"
+            )
+        )
+        self.assertEqual(response.json()["created"], 20)
+
+    def test_export_posts(self):
+        self.scheduled_post()
+        response = self.assertOk(self.client.get("/api/posts/export"))
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+    def test_scheduled_load(self):
+        self.scheduled_post()
+        self.assertOk(self.client.get("/api/posts/load?minutes=120"))
+
+    def test_retrieve_post(self):
+        post = self.scheduled_post()
+        response = self.assertOk(self.client.get(f"/api/posts/{post.id}/"))
+        self.assertEqual(response.json()["id"], post.id)
+
+    def test_list_posts(self):
+        for _ in range(3):
+            self.scheduled_post()
+        response = self.assertOk(self.client.get("/api/posts/?limit=2"))
+        self.assertEqual(len(response.json()["items"]), 2)
+
+    def test_reschedule(self):
+        post = self.scheduled_post()
+        self.assertOk(
+            self.client.put(
+                f"/api/posts/{post.id}/schedule",
+                json.dumps(
+                    {
+                        "scheduled_time": (self.when + timedelta(hours=1)).strftime(
+                            "%Y-%m-%d %H:%M"
+                        ),
+                        "timezone": "UTC",
+                    }
+                ),
+                content_type="application/json",
+            )
+        )
+
+    def test_delete_post(self):
+        post = self.scheduled_post()
+        self.assertOk(self.client.delete(f"/api/posts/{post.id}/"))
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_get_users(self):
+        self.assertOk(self.client.get("/api/users/"))
+
+    def test_export_users(self):
+        response = self.assertOk(self.client.get("/api/users/export?format=csv"))
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 2)
+
+    def test_register_user(self):
+        self.assertOk(
+            Client().post(
+                "/api/users/",
+                json.dumps({"username": "new", "password": "secret"}),
+                content_type="application/json",
+            )
+        )
+
+    def test_update_profile(self):
+        self.assertOk(
+            self.client.put(
+                "/api/users/update-profile",
+                json.dumps({"email": "author@example.com", "spread_window": 60}),
+                content_type="application/json",
+            )
+        )
+
+    def test_delete_user(self):
+        TwitterAccount.objects.create(
+            user=self.user, access_token="token", access_token_secret="secret"
+        )
+        for _ in range(3):
+            self.scheduled_post()
+        self.assertOk(self.client.delete("/api/users/delete-user"))
+
+    @mock.patch("users.api.requests.post")
+    def test_twitter_login(self, post):
+        post.return_value = mock.Mock(
+            text="oauth_token=request&oauth_token_secret=secret"
+        )
+        self.client.force_login(self.user)
+        self.assertOk(self.client.get("/api/users/social/twitter-login"))
+
+    @mock.patch("users.api.requests.post")
+    def test_twitter_callback(self, post):
+        post.return_value = mock.Mock(
+            status_code=200, text="oauth_token=access&oauth_token_secret=secret"
+        )
+        session = self.client.session
+        session.update(
+            {
+                "oauth_token": "request",
+                "oauth_token_secret": "s",
+                "user_id": self.user.id,
+            }
+        )
+        session.save()
+        self.assertOk(
+            self.client.get(
+                "/api/users/social/twitter-callback?oauth_token=request&oauth_verifier=v"
+            )
+        )
+        self.assertEqual(self.user.twitteraccount.access_token, "access")
+
+
+class BudgetExceededTests(TestCase):
+    def setUp(self):
+        post_cache.cache.clear()
+        self.user = User.objects.create_user(username="author", password="secret")
+        token = RefreshToken.for_user(self.user).access_token
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def list_with_extra_queries(self):
+        from posts import api as posts_api
+
+        list_queryset = posts_api.list_queryset
+
+        def wasteful(*args):
+            for _ in range(3):
+                User.objects.exists()
+            return list_queryset(*args)
+
+        return mock.patch.object(posts_api, "list_queryset", wasteful)
+
+    @override_settings(QUERY_BUDGETS_ENFORCED=True)
+    def test_route_over_budget_fails(self):
+        with self.list_with_extra_queries():
+            with self.assertRaisesRegex(
+                QueryBudgetExceeded,
+                r"^GET api/posts/ ran \d+ queries, over its budget of 2",
+            ):
+                self.client.get("/api/posts/")
+
+    @override_settings(QUERY_BUDGETS_ENFORCED=False)
+    def test_route_over_budget_is_only_logged_unless_enforced(self):
+        with self.list_with_extra_queries():
+            with self.assertLogs("social_media.queries", "WARNING"):
+                response = self.client.get("/api/posts/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.query_stats.over_budget)
+
+    def test_block_over_budget_fails(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "over its budget of 1"):
+            with assert_max_queries(1):
+                User.objects.count()
+                Post.objects.count()
+
+    def test_block_within_budget(self):
+        with assert_max_queries(2) as stats:
+            User.objects.count()
+        self.assertEqual(stats.count, 1)
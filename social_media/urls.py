@@ -1,22 +1,47 @@
 # urls.py
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from ninja import NinjaAPI
 from ninja.security import HttpBearer
-from ninja_jwt.authentication import JWTAuth
-from users.api import router as users_router
-from posts.api import router as posts_router
 from ninja_jwt.routers.obtain import obtain_pair_router
 from ninja_jwt.routers.verify import verify_router
+from social_media.auth import CachedJWTAuth
+from social_media.metrics import metrics_view
+from social_media.renderers import ORJSONRenderer
+
+
+# One instance for the whole process, so its token and user caches are shared
+jwt_auth = CachedJWTAuth()
 
 
 class AuthBearer(HttpBearer):
     def authenticate(self, request, token):
-        return JWTAuth().authenticate(request, token)
+        return jwt_auth.authenticate(request, token)
+
+
+class AsyncAuthBearer(HttpBearer):
+    # Tells ninja to await the coroutine that __call__ returns
+    is_async = True
+
+    async def authenticate(self, request, token):
+        return await jwt_auth.aauthenticate(request, token)
+
+
+# Async views need an ASGI server, e.g. `uvicorn social_media.asgi:application`
+if settings.API_ASYNC_VIEWS:
+    from users.async_api import router as users_router
+    from posts.async_api import router as posts_router
+
+    auth = AsyncAuthBearer()
+else:
+    from users.api import router as users_router
+    from posts.api import router as posts_router
 
+    auth = AuthBearer()
 
-api = NinjaAPI(auth=AuthBearer())
+api = NinjaAPI(auth=auth, renderer=ORJSONRenderer())
 
 api.add_router("/login", tags=["Auth"], router=obtain_pair_router)
 api.add_router("/token", tags=["Auth"], router=verify_router)
@@ -27,4 +52,5 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("social_django.urls", namespace="social")),
     path("api/", api.urls),
+    path("metrics", metrics_view),
 ]
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import TwitterAccount
+from .models import SchedulingPreference, TwitterAccount
 
 
 admin.site.register(TwitterAccount)
+admin.site.register(SchedulingPreference)
@@ -1,23 +1,95 @@
+from datetime import datetime
+from typing import Literal, Optional
 from ninja import Router
 from django.contrib.auth.models import User
 from django.http import HttpRequest
-import tweepy
 from decouple import config
-from .models import TwitterAccount
+from django.conf import settings
+from django.db import transaction
+from .models import SchedulingPreference, TwitterAccount
+from posts.cache import post_cache
+from posts.clients import twitter_clients
+from posts.models import Post
+from posts.scheduling import cancel_schedules
+from social_media.auth import invalidate_user
+from social_media.export import stream_export
+from social_media.queries import query_budget
 from .schema import RegisterSchema, UpdateProfileSchema, Error, Success
 import requests
-from urllib.parse import parse_qs
+from urllib.parse import parse_qs, urlencode
+from oauthlib.oauth1 import Client as OAuth1Client
 
 
-TWITTER_REDIRECT_URI = config("TWITTER_REDIRECT_URI")
-TWITTER_CONSUMER_API_KEY = config("TWITTER_CONSUMER_API_KEY")
-TWITTER_CONSUMER_API_KEY_SECRET = config("TWITTER_CONSUMER_API_KEY_SECRET")
-
 router = Router()
 
+EXPORT_FIELDS = ("id", "username", "email", "date_joined")
+
+# Seconds to wait for Twitter during the OAuth handshake
+OAUTH_TIMEOUT = 10.0
+
+
+def twitter_oauth_config():
+    """
+    The app's consumer key and secret, the OAuth callback URL and the base
+    URL of Twitter's OAuth endpoints (``TWITTER_API_BASE_URL``).
+
+    Read on first use rather than at import, so processes that never run the
+    OAuth flow do not need them. Both the sync and the async views go
+    through it, so they always talk to the same host.
+
+    Returns:
+        tuple: ``(consumer_key, consumer_secret, callback_url, base_url)``.
+    """
+    consumer_key, consumer_secret = twitter_clients.consumer_credentials
+    return (
+        consumer_key,
+        consumer_secret,
+        config("TWITTER_REDIRECT_URI"),
+        settings.TWITTER_API_BASE_URL.rstrip("/"),
+    )
+
+
+def request_token_request():
+    """
+    Sign the request that starts the OAuth 1.0a flow.
+
+    Returns:
+        tuple: ``(url, headers)`` of the POST that obtains a request token.
+    """
+    consumer_key, consumer_secret, callback_url, base_url = twitter_oauth_config()
+    oauth = OAuth1Client(
+        consumer_key, client_secret=consumer_secret, callback_uri=callback_url
+    )
+    url, headers, _ = oauth.sign(f"{base_url}/oauth/request_token", http_method="POST")
+    return url, headers
+
+
+def authorization_url(oauth_token):
+    """The page where the user authorizes the request token ``oauth_token``."""
+    base_url = twitter_oauth_config()[3]
+    return f"{base_url}/oauth/authenticate?{urlencode({'oauth_token': oauth_token})}"
+
+
+def delete_account(user):
+    """
+    Delete ``user`` and everything they own.
+
+    The SQL cascade deletes their posts but not the django-q schedules that
+    publish them, so those are cancelled first, in the same transaction.
+    """
+    user_id = user.id
+    with transaction.atomic():
+        post_ids = list(Post.objects.filter(user=user).values_list("id", flat=True))
+        # Before the delete, which would unlink the posts from their schedules
+        cancel_schedules(post_ids)
+        user.delete()
+        post_cache.invalidate(post_ids, [user_id])
+    invalidate_user(user_id)
+
 
 #  Retrieve all registered users
 @router.get("/")
+@query_budget(2)
 def get_users(request):
     """
     Retrieve all registered users.
@@ -47,8 +119,28 @@ def get_users(request):
     return list(users)
 
 
+@router.get("/export")
+@query_budget(1)
+def export_users(
+    request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+):
+    """
+    Stream every registered user as NDJSON or CSV.
+
+    Pass ``since`` to only export users who joined at or after that moment,
+    for incremental pulls.
+    """
+    users = User.objects.order_by("id")
+    if since:
+        users = users.filter(date_joined__gte=since)
+    return stream_export(users, EXPORT_FIELDS, format, "users")
+
+
 # Define a route for the root endpoint using an HTTP POST method to handle user registration
 @router.post("/", auth=None)
+@query_budget(2)
 def register_user(request: HttpRequest, payload: RegisterSchema):
     """
     Registers a new user in the system.
@@ -77,12 +169,17 @@ def register_user(request: HttpRequest, payload: RegisterSchema):
     )
 
     # Return a success message along with the newly registered user's details
-    return {"success": "User registered successfully", "user": user}
+    return {
+        "success": "User registered successfully",
+        "user": {"id": user.id, "username": user.username, "email": user.email},
+    }
 
 
 # Update user profile (requires JWT authentication)
 # Define a route for the 'update-profile' endpoint using an HTTP PUT method and require authentication via AuthBearer
 @router.put("/update-profile")
+# Two of them save the default spread window
+@query_budget(4)
 def update_profile(request: HttpRequest, payload: UpdateProfileSchema):
     # Retrieve the authenticated user from the request
     user = request.auth
@@ -102,59 +199,68 @@ def update_profile(request: HttpRequest, payload: UpdateProfileSchema):
     # Save the updated user information to the database
     user.save()
 
+    # Default spread window of the user's new posts
+    if payload.spread_window is not None:
+        SchedulingPreference.objects.update_or_create(
+            user=user, defaults={"spread_window": payload.spread_window}
+        )
+    # Authentication would otherwise keep returning the cached old profile
+    invalidate_user(user.id)
+
     # Return a success message after updating the profile
     return {"success": "Profile updated successfully"}
 
 
 # Define a route for the 'delete-user' endpoint using an HTTP DELETE method and require authentication via AuthBearer
 @router.delete("/delete-user")
+# Cancels the schedules of the user's posts, then deletes or unlinks the rows
+# of every table referencing the user
+@query_budget(20)
 def delete_user(request: HttpRequest):
     # Retrieve the authenticated user from the request
     user = request.auth
 
-    # Delete the user account from the database
-    user.delete()
+    # Delete the user account, its posts and their schedules from the database
+    delete_account(user)
 
     # Return a success message after deleting the user account
     return {"success": "User deleted successfully"}
 
 
 @router.get("/social/twitter-login")
+@query_budget(6)
 def twitter_login(request: HttpRequest):
     """
     Initiates Twitter OAuth 1.0a authentication by redirecting the user to Twitter's authorization page.
     """
     if request.user.is_authenticated:
-        oauth1_user_handler = tweepy.OAuth1UserHandler(
-            config("TWITTER_CONSUMER_API_KEY"),
-            config("TWITTER_CONSUMER_API_KEY_SECRET"),
-            callback=config("TWITTER_REDIRECT_URI"),
-        )
+        url, headers = request_token_request()
 
         try:
-            authorization_url = oauth1_user_handler.get_authorization_url(
-                signin_with_twitter=True
-            )
+            response = requests.post(url, headers=headers, timeout=OAUTH_TIMEOUT)
+            response.raise_for_status()
+            request_token = parse_qs(response.text)
 
             # Store the request token and user ID in the session
-            request.session["oauth_token"] = oauth1_user_handler.request_token[
-                "oauth_token"
-            ]
-            request.session["oauth_token_secret"] = oauth1_user_handler.request_token[
-                "oauth_token_secret"
+            request.session["oauth_token"] = request_token["oauth_token"][0]
+            request.session["oauth_token_secret"] = request_token["oauth_token_secret"][
+                0
             ]
             request.session["user_id"] = (
                 request.user.id
             )  # Store user ID instead of entire user object
 
-            return {"authorization_url": authorization_url}
-        except tweepy.TweepyException as e:
+            return {
+                "authorization_url": authorization_url(request.session["oauth_token"])
+            }
+        except (requests.RequestException, KeyError) as e:
             return 400, {"error": f"Failed to initiate Twitter login: {str(e)}"}
     else:
         return 400, {"error": "User must be logged in to initiate Twitter login."}
 
 
 @router.get("/social/twitter-callback", auth=None, response={400: Error, 200: Success})
+@query_budget(8)
 def twitter_callback(request: HttpRequest):
     """
     Handles Twitter's callback after user authorization, exchanges the authorization code for access tokens,
@@ -174,13 +280,15 @@ def twitter_callback(request: HttpRequest):
 
     try:
         # Exchange the temporary tokens for access tokens
+        consumer_key, _, _, base_url = twitter_oauth_config()
         response = requests.post(
-            url="https://api.twitter.com/oauth/access_token",
+            url=f"{base_url}/oauth/access_token",
             data={
-                "oauth_consumer_key": config("TWITTER_CONSUMER_API_KEY"),
+                "oauth_consumer_key": consumer_key,
                 "oauth_token": session_oauth_token,
                 "oauth_verifier": oauth_verifier,
             },
+            timeout=OAUTH_TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -201,6 +309,8 @@ def twitter_callback(request: HttpRequest):
                 twitter_account.access_token = access_token
                 twitter_account.access_token_secret = access_token_secret
                 twitter_account.save()
+                # Drop the client built with the previous tokens
+                twitter_clients.invalidate(twitter_account.pk)
 
                 return 200, {"message": "User Twitter account connected successfully!"}
             else:
@@ -209,5 +319,5 @@ def twitter_callback(request: HttpRequest):
         else:
             return 400, {"error": "Failed to connect to Twitter account"}
 
-    except tweepy.TweepyException as e:
+    except (requests.RequestException, KeyError) as e:
         return 400, {"error": f"Failed to get access token: {str(e)}"}
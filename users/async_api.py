@@ -0,0 +1,187 @@
+"""
+Async versions of the ``users`` endpoints, served when ``API_ASYNC_VIEWS`` is set.
+
+The OAuth handshake with Twitter goes through ``httpx.AsyncClient``, so a
+slow Twitter response parks a coroutine instead of a worker thread. Password
+hashing is CPU-bound and runs in a worker thread.
+"""
+
+from datetime import datetime
+from typing import Literal, Optional
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.http import HttpRequest
+from ninja import Router
+
+from posts.clients import twitter_clients
+from social_media.auth import invalidate_user
+from social_media.export import astream_export
+from social_media.queries import query_budget
+
+from .api import (
+    EXPORT_FIELDS,
+    OAUTH_TIMEOUT,
+    authorization_url,
+    delete_account,
+    request_token_request,
+    twitter_oauth_config,
+)
+from .models import SchedulingPreference, TwitterAccount
+from .schema import Error, RegisterSchema, Success, UpdateProfileSchema
+
+# Loading the CA bundle costs tens of milliseconds of CPU on the event loop,
+# so every handshake client shares one SSL context
+OAUTH_SSL_CONTEXT = httpx.create_ssl_context()
+
+router = Router()
+
+
+@router.get("/")
+@query_budget(2)
+async def get_users(request):
+    """Retrieve all registered users."""
+    return [user async for user in User.objects.values("id", "username", "email")]
+
+
+@router.get("/export")
+@query_budget(1)
+async def export_users(
+    request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+):
+    """Stream every registered user as NDJSON or CSV."""
+    users = User.objects.order_by("id")
+    if since:
+        users = users.filter(date_joined__gte=since)
+    return astream_export(users, EXPORT_FIELDS, format, "users")
+
+
+@router.post("/", auth=None)
+@query_budget(2)
+async def register_user(request: HttpRequest, payload: RegisterSchema):
+    """Registers a new user in the system."""
+    if await User.objects.filter(username=payload.username).aexists():
+        return {"error": "Username already taken"}
+
+    user = await sync_to_async(User.objects.create_user)(
+        username=payload.username, password=payload.password, email=payload.email
+    )
+    return {
+        "success": "User registered successfully",
+        "user": {"id": user.id, "username": user.username, "email": user.email},
+    }
+
+
+@router.put("/update-profile")
+# Two of them save the default spread window
+@query_budget(4)
+async def update_profile(request: HttpRequest, payload: UpdateProfileSchema):
+    user = request.auth
+    if payload.username:
+        user.username = payload.username
+    if payload.email:
+        user.email = payload.email
+    if payload.password:
+        await sync_to_async(user.set_password)(payload.password)
+
+    await user.asave()
+    if payload.spread_window is not None:
+        await SchedulingPreference.objects.aupdate_or_create(
+            user=user, defaults={"spread_window": payload.spread_window}
+        )
+    invalidate_user(user.id)
+    return {"success": "Profile updated successfully"}
+
+
+@router.delete("/delete-user")
+# Cancels the schedules of the user's posts, then deletes or unlinks the rows
+# of every table referencing the user
+@query_budget(20)
+async def delete_user(request: HttpRequest):
+    await sync_to_async(delete_account)(request.auth)
+    return {"success": "User deleted successfully"}
+
+
+@router.get("/social/twitter-login", response={200: dict, 400: dict})
+@query_budget(6)
+async def twitter_login(request: HttpRequest):
+    """Start the OAuth 1.0a flow and return Twitter's authorization URL."""
+    url, headers = request_token_request()
+    try:
+        async with httpx.AsyncClient(
+            timeout=OAUTH_TIMEOUT, verify=OAUTH_SSL_CONTEXT
+        ) as client:
+            response = await client.post(url, headers=headers)
+        response.raise_for_status()
+        request_token = parse_qs(response.text)
+        oauth_token = request_token["oauth_token"][0]
+        oauth_token_secret = request_token["oauth_token_secret"][0]
+    except (httpx.HTTPError, KeyError) as e:
+        return 400, {"error": f"Failed to initiate Twitter login: {str(e)}"}
+
+    await request.session.aset("oauth_token", oauth_token)
+    await request.session.aset("oauth_token_secret", oauth_token_secret)
+    await request.session.aset("user_id", request.auth.id)
+
+    return {"authorization_url": authorization_url(oauth_token)}
+
+
+@router.get("/social/twitter-callback", auth=None, response={400: Error, 200: Success})
+@query_budget(8)
+async def twitter_callback(request: HttpRequest):
+    """
+    Handle Twitter's callback: exchange the request token for access tokens
+    and save them on the user's ``TwitterAccount``.
+    """
+    oauth_verifier = request.GET.get("oauth_verifier")
+    oauth_token = request.GET.get("oauth_token")
+
+    if not oauth_verifier:
+        return 400, {"error": "Missing OAuth verifier from Twitter callback"}
+
+    session_oauth_token = await request.session.aget("oauth_token")
+    if oauth_token != session_oauth_token:
+        return 400, {"error": "Token mismatch. Authentication failed."}
+
+    try:
+        async with httpx.AsyncClient(
+            timeout=OAUTH_TIMEOUT, verify=OAUTH_SSL_CONTEXT
+        ) as client:
+            consumer_key, _, _, base_url = twitter_oauth_config()
+            response = await client.post(
+                f"{base_url}/oauth/access_token",
+                data={
+                    "oauth_consumer_key": consumer_key,
+                    "oauth_token": session_oauth_token,
+                    "oauth_verifier": oauth_verifier,
+                },
+            )
+    except httpx.HTTPError as e:
+        return 400, {"error": f"Failed to get access token: {str(e)}"}
+
+    if response.status_code != 200:
+        return 400, {"error": "Failed to connect to Twitter account"}
+
+    response_data = parse_qs(response.text)
+    access_token = response_data["oauth_token"][0]
+    access_token_secret = response_data["oauth_token_secret"][0]
+
+    await request.session.apop("oauth_token")
+    await request.session.apop("oauth_token_secret")
+    user_id = await request.session.apop("user_id", None)
+    if not user_id:
+        return 400, {"error": "User is not authenticated"}
+
+    user = await User.objects.aget(id=user_id)
+    twitter_account, _ = await TwitterAccount.objects.aget_or_create(user=user)
+    twitter_account.access_token = access_token
+    twitter_account.access_token_secret = access_token_secret
+    await twitter_account.asave()
+    # Drop the client built with the previous tokens
+    twitter_clients.invalidate(twitter_account.pk)
+
+    return 200, {"message": "User Twitter account connected successfully!"}
@@ -26,3 +26,23 @@ class TwitterAccount(models.Model):
             str: The username of the associated Django user.
         """
         return self.user.username
+
+
+class SchedulingPreference(models.Model):
+    """
+    How a user's posts are scheduled by default.
+
+    Attributes:
+        user (User): The user the preference belongs to.
+        spread_window (int): Seconds after their scheduled time the user's
+            posts may be published in, to level the load; 0 publishes them on
+            time. A post's own window takes precedence.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="scheduling_preference"
+    )
+    spread_window = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.spread_window}s spread"
@@ -1,6 +1,7 @@
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from ninja import Schema
+from posts.schema import validate_spread_window
 
 
 # Models for request data
@@ -14,10 +15,14 @@ class UpdateProfileSchema(BaseModel):
     username: Optional[str] = None
     email: Optional[str] = None
     password: Optional[str] = None
+    # Default spread window of the user's new posts, in seconds
+    spread_window: Optional[int] = None
+
+    check_spread_window = field_validator("spread_window")(validate_spread_window)
 
 
 class Error(Schema):
-    message: str
+    error: str
 
 
 class Success(Schema):
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from django_q.models import Schedule
+
+from posts.models import Post
+from posts.scheduling import schedule_posts
+
+from .api import (
+    OAUTH_TIMEOUT,
+    authorization_url,
+    delete_account,
+    request_token_request,
+)
+
+
+@override_settings(TWITTER_API_BASE_URL="https://twitter.test/")
+class TwitterOAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author")
+        self.client = Client()
+        session = self.client.session
+        session.update(
+            {
+                "oauth_token": "request",
+                "oauth_token_secret": "s",
+                "user_id": self.user.id,
+            }
+        )
+        session.save()
+
+    def callback(self):
+        return self.client.get(
+            "/api/users/social/twitter-callback?oauth_token=request&oauth_verifier=v"
+        )
+
+    def test_both_flows_use_the_configured_host(self):
+        url, headers = request_token_request()
+        self.assertEqual(url, "https://twitter.test/oauth/request_token")
+        self.assertIn("oauth_callback", headers["Authorization"])
+        self.assertEqual(
+            authorization_url("token"),
+            "https://twitter.test/oauth/authenticate?oauth_token=token",
+        )
+
+    @mock.patch("users.api.requests.post")
+    def test_callback_exchanges_the_token_with_a_timeout(self, post):
+        post.return_value = mock.Mock(
+            status_code=200, text="oauth_token=access&oauth_token_secret=secret"
+        )
+
+        self.assertEqual(self.callback().status_code, 200)
+
+        post.assert_called_once()
+        self.assertEqual(
+            post.call_args.kwargs["url"], "https://twitter.test/oauth/access_token"
+        )
+        self.assertEqual(post.call_args.kwargs["timeout"], OAUTH_TIMEOUT)
+        self.assertEqual(self.user.twitteraccount.access_token, "access")
+
+    @mock.patch("users.api.requests.post")
+    def test_callback_reports_a_failed_exchange(self, post):
+        for failure in (
+            {"side_effect": requests.ConnectionError("reset")},
+            {"return_value": mock.Mock(status_code=200, text="denied=1")},
+        ):
+            with self.subTest(**failure):
+                post.reset_mock(return_value=True, side_effect=True)
+                post.configure_mock(**failure)
+                response = self.callback()
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("Failed to get access token", response.json()["error"])
+
+
+@override_settings(POSTS_DISPATCHER_ENABLED=False)
+class DeleteAccountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author")
+        self.other = User.objects.create_user(username="other")
+        self.when = timezone.now() + timedelta(days=1)
+
+    def post(self, user):
+        return Post.objects.create(
+            user=user, content="Scheduled", scheduled_time=self.when
+        )
+
+    def test_cancels_the_user_schedules(self):
+        alone = self.post(self.user)
+        schedule_posts([(alone, self.when + timedelta(hours=1))])
+        batch = [self.post(self.user) for _ in range(2)]
+        schedule_posts([(post, self.when) for post in batch])
+
+        delete_account(self.user)
+
+        self.assertFalse(Schedule.objects.exists())
+        self.assertFalse(Post.objects.exists())
+
+    def test_rewrites_a_batch_shared_with_other_users(self):
+        mine = self.post(self.user)
+        theirs = self.post(self.other)
+        (schedule,) = schedule_posts([(mine, self.when), (theirs, self.when)])
+
+        delete_account(self.user)
+
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.args, repr([theirs.id]))
+        self.assertEqual(list(Post.objects.values_list("id", flat=True)), [theirs.id])